@@ -2,7 +2,7 @@ from tiase import alfred
 
 _usage_str = """
 Options:
-    [--execute xmlfile, --summary]
+    [--execute xmlfile [--no-cache], --summary]
 """
 
 def _usage():
@@ -13,9 +13,12 @@ if __name__ == "__main__":
     if len(sys.argv) >= 2:
         if len(sys.argv) == 2 and (sys.argv[1] == "--summary" or sys.argv[1] == "-s"):
             alfred.summary()
-        elif len(sys.argv) == 3 and (sys.argv[1] == "--execute" or sys.argv[1] == "-e"):
+        elif len(sys.argv) in [3, 4] and (sys.argv[1] == "--execute" or sys.argv[1] == "-e"):
             xmlfile = sys.argv[2]
-            alfred.execute(xmlfile)
+            if len(sys.argv) == 4 and sys.argv[3] != "--no-cache":
+                _usage()
+            else:
+                alfred.execute(xmlfile, use_cache=len(sys.argv) == 3)
         elif len(sys.argv) == 3 and (sys.argv[1] == "--details" or sys.argv[1] == "-d"):
             value = sys.argv[2]
             alfred.details_for_value(value)
@@ -1,5 +1,5 @@
 from tiase.fimport import fimport,synthetic,visu
-from tiase.findicators import findicators
+from tiase.findicators import findicators,panel
 from tiase.featureengineering import fprocessfeature
 from tiase.fdatapreprocessing import fdataprep
 import numpy as np
@@ -113,23 +113,27 @@ def check(action):
 #
 def cac40():
     directory = "./tiase/data/CAC40/"
+    dfs = {}
     for filename in os.listdir(directory):
         if filename.endswith(".csv"):
-            df = fimport.get_dataframe_from_csv(directory+"/"+filename)
-            technical_indicators = ["trend_1d","macd","rsi_30","cci_30","williams_%r","stoch_%k","stoch_%d","er","stc"]
-            technical_indicators.extend(["sma_5","sma_10","sma_20"])
-            technical_indicators.extend(["ema_5","ema_10","ema_20"])
-            technical_indicators.extend(["wma_5","wma_10","wma_20"])
-            technical_indicators.extend(["atr","adx","roc"])
-            technical_indicators.extend(["simple_rtn", "mom", "target"])
-
-            df = findicators.add_technical_indicators(df, technical_indicators)
-            trend_ratio, true_positive, true_negative, false_positive, false_negative = findicators.get_trend_info(df)
-            value = filename[:len(filename)-4]
-            print("{} ({}),{:.2f},{:.2f},{:.2f},{:.2f},{:.2f}".format(value, fimport.cac40[value], trend_ratio, true_positive, true_negative, false_positive, false_negative))
-
-            df = fdataprep.process_technical_indicators(df, ['missing_values'])
-            visu.display_histogram_from_dataframe(df, 'simple_rtn', 100, './tmp/' + value + '_close.png')
+            dfs[filename[:len(filename)-4]] = fimport.get_dataframe_from_csv(directory+"/"+filename)
+
+    technical_indicators = ["trend_1d","macd","rsi_30","cci_30","williams_%r","stoch_%k","stoch_%d","er","stc"]
+    technical_indicators.extend(["sma_5","sma_10","sma_20"])
+    technical_indicators.extend(["ema_5","ema_10","ema_20"])
+    technical_indicators.extend(["wma_5","wma_10","wma_20"])
+    technical_indicators.extend(["atr","adx","roc"])
+    technical_indicators.extend(["simple_rtn", "mom", "target"])
+    # the indicators of all the values are computed together
+    df_panel = panel.add_technical_indicators_panel(dfs, technical_indicators, output="long")
+
+    for value in dfs:
+        df = df_panel.xs(value, level="ticker")
+        trend_ratio, true_positive, true_negative, false_positive, false_negative = findicators.get_trend_info(df)
+        print("{} ({}),{:.2f},{:.2f},{:.2f},{:.2f},{:.2f}".format(value, fimport.cac40[value], trend_ratio, true_positive, true_negative, false_positive, false_negative))
+
+        df = fdataprep.process_technical_indicators(df, ['missing_values'])
+        visu.display_histogram_from_dataframe(df, 'simple_rtn', 100, './tmp/' + value + '_close.png')
 
 
 _usage_str = """
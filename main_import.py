@@ -1,4 +1,4 @@
-from tiase.fimport import fimport,synthetic,visu
+from tiase.fimport import fimport,synthetic,visu,store
 
 ###
 ### AS A SCRIPT
@@ -7,7 +7,7 @@ from tiase.fimport import fimport,synthetic,visu
 
 _usage_str = """
 Options:
-    [ --cac40, --nasdaq100]
+    [ --cac40, --nasdaq100, --store]
 """
 
 def _usage():
@@ -33,6 +33,11 @@ def _download(values):
     elif values == "nasdaq100":
         fimport.download_from_yahoo(fimport.nasdaq100.keys())
 
+def _import_to_store():
+    for folder in ["./tiase/data/CAC40", "./tiase/data/NASDAQ100"]:
+        tickers = store.import_from_csv_folder(folder, store.default_root)
+        print("{} : {} tickers imported into {}".format(folder, len(tickers), store.default_root))
+
     
 if __name__ == '__main__':
     import sys
@@ -42,5 +47,6 @@ if __name__ == '__main__':
         elif sys.argv[1] == "--test3" or sys.argv[1] == "-t3": _test3()
         elif sys.argv[1] == "--cac40" : _download('cac40')
         elif sys.argv[1] == "--nasdaq100" : _download('nasdaq100')
+        elif sys.argv[1] == "--store" : _import_to_store()
         else: _usage()
     else: _usage()
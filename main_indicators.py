@@ -1,5 +1,5 @@
 from tiase.fimport import fimport,visu
-from tiase.findicators import findicators
+from tiase.findicators import findicators,panel
 from tiase.fdatapreprocessing import fdataprep
 import pandas as pd
 import numpy as np
@@ -38,20 +38,25 @@ def various():
 #
 def cac40():
     directory = "./tiase/data/CAC40/"
+    dfs = {}
     for filename in os.listdir(directory):
         if filename.endswith(".csv"):
             value = filename[:len(filename)-4]
-            name = fimport.cac40[value]
+            dfs[value] = fimport.get_dataframe_from_csv(directory+"/"+filename)
 
-            df = fimport.get_dataframe_from_csv(directory+"/"+filename)
-            technical_indicators = ["trend_1d","macd","rsi_30","cci_30","williams_%r","stoch_%k","stoch_%d","er","stc"]
-            technical_indicators.extend(["sma_5","sma_10","sma_15","sma_20"])
-            technical_indicators.extend(["ema_10","ema_20","ema_50"])
-            technical_indicators.extend(["atr","adx","roc"])
-            df = findicators.add_technical_indicators(df, technical_indicators)
-            
-            trend_ratio, true_positive, true_negative, false_positive, false_negative = findicators.get_trend_info(df)
-            print("{} ({});{:.2f};{:.2f};{:.2f};{:.2f};{:.2f}".format(value, name, trend_ratio, true_positive, true_negative, false_positive, false_negative))
+    technical_indicators = ["trend_1d","macd","rsi_30","cci_30","williams_%r","stoch_%k","stoch_%d","er","stc"]
+    technical_indicators.extend(["sma_5","sma_10","sma_15","sma_20"])
+    technical_indicators.extend(["ema_10","ema_20","ema_50"])
+    technical_indicators.extend(["atr","adx","roc"])
+    # the indicators of all the values are computed together
+    df_panel = panel.add_technical_indicators_panel(dfs, technical_indicators, output="long")
+
+    for value in dfs:
+        name = fimport.cac40[value]
+        df = df_panel.xs(value, level="ticker")
+
+        trend_ratio, true_positive, true_negative, false_positive, false_negative = findicators.get_trend_info(df)
+        print("{} ({});{:.2f};{:.2f};{:.2f};{:.2f};{:.2f}".format(value, name, trend_ratio, true_positive, true_negative, false_positive, false_negative))
 
 
 
@@ -1,5 +1,5 @@
 import xml.etree.cElementTree as ET
-from tiase.fimport import fimport,visu
+from tiase.fimport import fimport,visu,store,datasource
 from tiase.fdatapreprocessing import fdataprep
 from tiase.featureengineering import fprocessfeature
 from tiase.findicators import findicators
@@ -9,8 +9,13 @@ import pandas as pd
 import math
 import os
 import json
+import multiprocessing
+import concurrent.futures
+import contextlib
+import threadpoolctl
+import time
 from rich import print,inspect
-from tiase.toolbox import export_csv,export_pdf,export_mail
+from tiase.toolbox import export_csv,export_pdf,export_mail,cache
 
 step_format = "bold red"
 def out(msg, format=None):
@@ -28,7 +33,472 @@ def make_report(report, filename):
     export_pdf.make_report(report, filename+'.pdf')
     export_mail.send_mail("alfred report", [filename+'.pdf'])
 
-def execute(filename):
+def get_classifier_dependencies(classifier):
+    '''
+    ids of the classifiers referenced by the "classifier" and "classifiers" parameters of a classifier node
+    '''
+    dependencies = []
+    parameters_node = classifier.find('parameters')
+    if parameters_node:
+        for parameter in parameters_node:
+            parameter_name = parameter.get("name", None)
+            parameter_value = parameter.get("value", None)
+            if parameter_value != None and parameter_name in ["classifier", "classifiers"]:
+                dependencies.extend(parameter_value.split(','))
+    return dependencies
+
+def run_dag(nodes, dependencies, task, workers=1):
+    '''
+    nodes: ids of the tasks, in the order used when several tasks are ready
+    dependencies: id -> ids of the tasks to complete before (ids not in nodes are ignored)
+    task(id) is called once the tasks of its dependencies are done, the independent tasks run concurrently in workers threads
+    return the results of the tasks and their timings (start from the beginning & elapsed time, in seconds)
+    '''
+    order = {node: position for position, node in enumerate(nodes)}
+    remaining = {node: set(dependency for dependency in dependencies.get(node, []) if dependency in order) for node in nodes}
+    dependents = {node: [] for node in nodes}
+    for node in nodes:
+        for dependency in remaining[node]:
+            dependents[dependency].append(node)
+
+    results = {}
+    timings = {}
+    origin = time.perf_counter()
+    def timed_task(node):
+        start = time.perf_counter()
+        result = task(node)
+        timings[node] = (start - origin, time.perf_counter() - start)
+        return result
+
+    def get_ready(done_node):
+        ready = []
+        for dependent in dependents[done_node]:
+            remaining[dependent].discard(done_node)
+            if len(remaining[dependent]) == 0:
+                ready.append(dependent)
+        return ready
+
+    ready = [node for node in nodes if len(remaining[node]) == 0]
+    if workers <= 1:
+        while len(ready) > 0:
+            ready.sort(key=order.get)
+            node = ready.pop(0)
+            results[node] = timed_task(node)
+            ready.extend(get_ready(node))
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            running = {}
+            while len(ready) > 0 or len(running) > 0:
+                ready.sort(key=order.get)
+                while len(ready) > 0 and len(running) < workers:
+                    node = ready.pop(0)
+                    running[executor.submit(timed_task, node)] = node
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    node = running.pop(future)
+                    results[node] = future.result()
+                    ready.extend(get_ready(node))
+
+    if len(results) != len(nodes):
+        raise ValueError("[run_dag] cyclic dependencies between {}".format([node for node in nodes if node not in results]))
+
+    timings = {node: timings[node] for node in nodes}
+    return results, timings
+
+def execute_value(ding, current_value, df, export_root="./", debug=False, stage_cache=None):
+    '''
+    indicators, preprocessing, data splitters and classifiers of the ding for one value
+    stage_cache: cache.StageCache for the results of the stages before the classifiers (no cache if None)
+    return the results of the classifiers or None if there is no data
+    '''
+    target = None
+    if stage_cache is None:
+        stage_cache = cache.StageCache(enabled=False)
+
+    def get_full_path(filename):
+        return export_root + '/' + filename
+
+    out("\U0001F7E2 dealing with {}".format(current_value))
+    if df.empty:
+        out("\U0001F4A5 Empty DataFrame")
+        return None
+    out(df)
+
+    results = {}
+    results["classifiers"] = {}
+
+    initial_columns = list(df.columns)
+    # the key of each stage depends on the key of the previous one
+    key = stage_cache.get_key("import", df)
+
+    # indicators
+    out("\U0001F449 [INDICATORS]", step_format)
+    features_node = ding.find('features')
+    if features_node is not None:
+        params = dict()
+        for name, value in features_node.attrib.items():
+            if name != "indicators" and name != "target" and name != "export":
+                params[name] = value
+                print("   {} : {}".format(name, value))
+        features = features_node.get("indicators", None)
+        target = features_node.get("target", None)
+        export_filename = features_node.get("export", None)
+
+        all_features = []
+        if features:
+            all_features = features.split(',')
+        if target != None:
+            all_features.append(target)
+
+        out("Using the following technical indicators : {}".format(all_features))
+        def compute_features(df):
+            df = findicators.add_technical_indicators(df, all_features, params)
+            features_to_remove = [feature for feature in initial_columns if feature not in all_features]
+            findicators.remove_features(df, features_to_remove)
+            return fdataprep.process_technical_indicators(df, ['missing_values'])
+        key = stage_cache.get_key(key, "features", features_node)
+        df = stage_cache.run(key, lambda: compute_features(df))
+        if export_filename:
+            df.to_csv(get_full_path(export_filename))
+            for indicator in df.columns:
+                prefix = ""
+                if current_value:
+                    prefix = current_value+'_'
+                visu.display_from_dataframe(df, indicator, get_full_path(prefix+indicator+'.png'))
+        out(df)
+
+    # preprocessing
+    out("\U0001F449 [PREPROCESSING]", step_format)
+    preprocessing_node = ding.find('preprocessing')
+    if preprocessing_node:
+        export_filename = preprocessing_node.get("export", None)
+
+        def compute_preprocessing(df):
+            for preprocess in preprocessing_node:
+                # outliers
+                if preprocess.tag == "outliers":
+                    method = preprocess.get("method", None)
+                    indicators = preprocess.get("indicators", None)
+                    if indicators:
+                        indicators = indicators.split(',')
+                    if method:
+                        out("[PREPROCESSING] outliers : {}".format(method))
+                        df = fdataprep.process_technical_indicators(df, [method], indicators)
+                        df = fdataprep.process_technical_indicators(df, ['missing_values'])
+
+                # transformation
+                elif preprocess.tag == "transformation":
+                    method = preprocess.get("method", None)
+                    indicators = preprocess.get("indicators", None)
+                    if indicators:
+                        indicators = indicators.split(',')
+                    if method is not None and indicators is not None:
+                        out("[PREPROCESSING] transformation {} for {}".format(method, indicators))
+                        df = fdataprep.process_technical_indicators(df, ["transformation_"+method], indicators)
+                        df = fdataprep.process_technical_indicators(df, ['missing_values'])
+
+                elif preprocess.tag == "discretization":
+                    # discretization
+                    indicators = preprocess.get("indicators", None)
+                    method = preprocess.get("method", None)
+                    if indicators is not None and method is not None:
+                        out("[PREPROCESSING] discretization {} for {}".format(method, indicators))
+                        indicators = indicators.split(',')
+                        df = fdataprep.process_technical_indicators(df, ["discretization_"+method], indicators)
+            return df
+        key = stage_cache.get_key(key, "preprocessing", preprocessing_node)
+        df = stage_cache.run(key, lambda: compute_preprocessing(df))
+
+        if export_filename:
+            df.to_csv(get_full_path(export_filename))
+            for indicator in df.columns:
+                visu.display_from_dataframe(df, indicator, get_full_path(current_value + '_preprocessing_'+indicator+'.png'))
+
+    # feature engineering
+    out("\U0001F449 [FEATURE ENGINEERING]", step_format)
+    featureengineering_node = ding.find('featureengineering')
+    if featureengineering_node is not None:
+        export_filename = featureengineering_node.get("export", None)
+
+        for featureengineering in featureengineering_node:
+            # reduction
+            if featureengineering.tag == "reduction":
+                method = featureengineering.get("method", None)
+                if method is not None:
+                    out("[FEATURE ENGINEERING] reduction : {}".format(method))
+
+        if export_filename:
+            df.to_csv(get_full_path(export_filename))
+            for indicator in df.columns:
+                    visu.display_from_dataframe(df, indicator, get_full_path(current_value + '_featureengineering_'+indicator+'.png'))
+
+    out("\U0001F449 [FINAL DATAFRAME]", step_format)
+    if df.empty:
+        out("\U0001F4A5 Empty DataFrame")
+        return results
+    out(df)
+
+    # target
+    out("\U0001F449 [TARGET]", step_format)
+    if target == None:
+        target_node = ding.find('target')
+        if target_node is not None:
+            target = target_node.text
+            shift = target_node.get("shift", None)
+            if shift:
+                def compute_shift(df):
+                    df = findicators.shift(df, target, shift)
+                    return fdataprep.process_technical_indicators(df, ['missing_values']) # shit happens
+                key = stage_cache.get_key(key, "target", target_node)
+                df = stage_cache.run(key, lambda: compute_shift(df))
+
+            export_filename = target_node.get("export", None)
+            if export_filename:
+                df.to_csv(get_full_path(export_filename))
+
+    if target == None:
+        out("\U0001F4A5 no target")
+        return results
+    out("target : {}".format(target))
+    out(df[target].value_counts())
+
+    # in the following, the target column should be named "target"
+    df = df.rename(columns={target: "target"})
+    target="target"
+
+    # data splitter
+    data_splitters_node = ding.find('data_splitters')
+    def compute_data_splitters(df):
+        library_data_splitters = {}
+        if data_splitters_node:
+            for data_splitter_node in data_splitters_node:
+                if data_splitter_node.tag != "data_splitter":
+                    continue
+                data_splitter_id = data_splitter_node.get("id", None)
+                data_splitter_type = data_splitter_node.get("type", None)
+                data_splitter_seq_len = int(data_splitter_node.get('sequence_length', math.nan))
+                if data_splitter_id == None or data_splitter_type == None or math.isnan(data_splitter_seq_len):
+                    continue
+
+                if data_splitter_type == "simple":
+                    index = float(data_splitter_node.get('index', math.nan))
+                    if math.isnan(index) == False:
+                        ds = data_splitter.DataSplitterTrainTestSimple(df, target=target, seq_len=data_splitter_seq_len)
+                        # lazy="1" : the windows are built by batches when the classifier needs them
+                        ds.split(index, lazy=data_splitter_node.get("lazy", "0") == "1")
+                    else:
+                        continue
+                elif data_splitter_type == "cross_validation":
+                    nb_splits = int(data_splitter_node.get('nb_splits', math.nan))
+                    max_train_size = int(data_splitter_node.get('max_train_size', math.nan))
+                    test_size = int(data_splitter_node.get('test_size', math.nan))
+                    if math.isnan(nb_splits) == False and math.isnan(max_train_size) == False and math.isnan(test_size) == False:
+                        gap = int(data_splitter_node.get('gap', 0))
+                        ds = data_splitter.DataSplitterForCrossValidation(df.copy(), nb_splits, max_train_size, test_size, gap)
+                        ds.split()
+                    else:
+                        continue
+                else:
+                    continue
+
+                library_data_splitters[data_splitter_id] = ds
+        return library_data_splitters
+    key = stage_cache.get_key(key, "data_splitters", target, data_splitters_node)
+    library_data_splitters = stage_cache.run(key, lambda: compute_data_splitters(df))
+
+    # dump data splitters library
+    out("\U0001F449 [DATA SPLITTERS LIBRARY]", step_format)
+    #print(library_data_splitters)
+    for data_splitter_id, data_splitter_item in library_data_splitters.items():
+        if isinstance(data_splitter_item, data_splitter.DataSplitterTrainTestSimple):
+            print("DataSplitterTrainTestSimple {}".format(data_splitter_id))
+            #data_splitter_item.dump()
+        if isinstance(data_splitter_item, data_splitter.DataSplitterForCrossValidation):
+            print("DataSplitterForCrossValidation {}".format(data_splitter_id))
+
+    # learning model
+    out("\U0001F449 [CLASSIFIERS]", step_format)
+    classifiers_node = ding.find('classifiers')
+    if classifiers_node:
+        library_models = {}
+        test_vs_pred = []
+
+        # the classifiers referenced by "classifier" or "classifiers" parameters (grid search, voting) are trained first,
+        # the others are independent and can be trained concurrently
+        classifier_nodes = {classifier.get("id", None): classifier for classifier in classifiers_node}
+        dependencies = {classifier_id: get_classifier_dependencies(classifier) for classifier_id, classifier in classifier_nodes.items()}
+
+        def train(classifier_id):
+            classifier = classifier_nodes[classifier_id]
+            out("[CLASSIFIER] Treating {}".format(classifier_id), "red")
+            classifier_type = classifier.get("type", None)
+            data_splitter_id = classifier.get("data_splitter_id", None)
+
+            parameters_node = classifier.find('parameters')
+            params = {}
+            if parameters_node:
+                for parameter in parameters_node:
+                    parameter_name = parameter.get("name", None)
+                    parameter_value = parameter.get("value", None)
+                    if parameter_name != None and parameter_value != None:
+
+                        def get_classifier_from_name(classifier_name):
+                            classifier_value = library_models.get(classifier_name, None)
+                            if classifier_value != None:
+                                out("{} found ({})".format(classifier_name, classifier_value))
+                            else:
+                                out("!!! {} not found !!!".format(parameter_value))
+                            return classifier_value
+
+                        # replace classifier name with classifier model
+                        if parameter_name == "classifier":
+                            parameter_value = get_classifier_from_name(parameter_value)
+
+                        elif parameter_name == "classifiers":
+                            classifier_names = parameter_value.split(',')
+                            parameter_value = [(classifier_name, get_classifier_from_name(classifier_name)) for classifier_name in classifier_names]
+                            out(parameter_value)
+                        
+                        elif parameter_name == "param_grid":
+                            parameter_value = parameter_value.replace("'", "\"")
+                            parameter_value = json.loads(parameter_value)
+
+                        if parameter_value:
+                            params[parameter_name] = parameter_value
+            
+            model = None
+            current_data_splitter = library_data_splitters.get(data_splitter_id, None)
+            if current_data_splitter:
+                model = classifiers_factory.ClassifiersFactory.get_classifier(type=classifier_type, params=params)
+                if model == None:
+                    out("!!! model {} ({}) is None".format(classifier_id, classifier_type))
+                    return None
+                if isinstance(current_data_splitter, data_splitter.DataSplitterTrainTestSimple):
+                    model.fit(current_data_splitter)
+                elif isinstance(current_data_splitter, data_splitter.DataSplitterForCrossValidation):
+                    model.evaluate_cross_validation(current_data_splitter, target, debug)
+                library_models[classifier_id] = model
+            else:
+                out("!!! can't find data splitter {}".format(data_splitter_id))
+            return model
+
+        workers = int(classifiers_node.get("workers", 1))
+        models, timings = run_dag(list(classifier_nodes.keys()), dependencies, train, workers)
+
+        out("\U0001F449 [CLASSIFIERS TIMINGS]", step_format)
+        for classifier_id, (start, elapsed) in timings.items():
+            out("{} : start {:.2f}s, elapsed {:.2f}s (depends on {})".format(classifier_id, start, elapsed, dependencies[classifier_id]))
+        results["timings"] = timings
+
+        # analysis and exports in the order of the file
+        for classifier_id, classifier in classifier_nodes.items():
+            model = models[classifier_id]
+            if model == None:
+                continue
+            export_filename = classifier.get("export", None)
+
+            model_analysis = model.get_analysis()
+
+            out("Accuracy : {:.2f}".format(model_analysis["accuracy"]))
+            out("Precision : {:.2f}".format(model_analysis["precision"]))
+            out("Recall : {:.2f}".format(model_analysis["recall"]))
+            out("f1_score : {:.2f}".format(model_analysis["f1_score"]))
+
+            if export_filename:
+                prefix = ""
+                if current_value:
+                    prefix = current_value+'_'
+                model.save(get_full_path(prefix+classifier_id))
+
+            test_vs_pred.append(analysis.testvspred(classifier_id, model_analysis["y_test"], model_analysis["y_test_prob"]))
+
+            roc_curve_filename = export_root + "/" + current_value + "_" + classifier_id + "_roc_curve.png"
+            analysis.export_roc_curve(model_analysis["y_test"], model_analysis["y_test_prob"], roc_curve_filename)
+            model_analysis["roc_curve_filename"] = roc_curve_filename
+
+            confusion_matrix_filename = export_root + "/" + current_value + "_" + classifier_id + "_confusion_matrix.png"
+            analysis.export_confusion_matrix(model_analysis["confusion_matrix"], confusion_matrix_filename)
+            model_analysis["confusion_matrix_filename"] = confusion_matrix_filename
+
+            if "history" in model_analysis.keys():
+                history_filename = export_root + "/" + current_value + "_" + classifier_id
+                analysis.export_history(history_filename, model_analysis["history"])
+                model_analysis["history_accuracy_filename"] = history_filename + "_accuracy.png"
+                model_analysis["history_loss_filename"] = history_filename + "_loss.png"
+
+            results["classifiers"][classifier_id] = model_analysis
+
+        analysis.export_roc_curves(test_vs_pred, export_root + "/"+current_value+"_roc_curves.png", current_value)
+        results["roc_curves_filename"] = export_root + "/"+current_value+"_roc_curves.png"
+
+    return results
+
+g_threads_variables = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS"]
+
+def init_worker(threads):
+    '''
+    limit the threads used by each worker so that the workers don't oversubscribe the cores
+    the libraries already loaded by the worker (numpy, scikit-learn, ...) are limited with threadpoolctl
+    '''
+    threadpoolctl.threadpool_limits(threads)
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+@contextlib.contextmanager
+def get_workers_pool(workers, threads):
+    '''
+    process pool of workers using threads threads each
+    the variables read by the thread pools of the libraries when they are loaded are set in the environment
+    inherited by the spawned workers, and restored once the pool is shut down
+    '''
+    environ = {variable: os.environ.get(variable) for variable in g_threads_variables}
+    os.environ.update({variable: str(threads) for variable in g_threads_variables})
+    try:
+        # spawn rather than fork : tensorflow is not fork safe once initialized
+        context = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker, initargs=(threads,)) as executor:
+            yield executor
+    finally:
+        for variable, value in environ.items():
+            if value is None:
+                os.environ.pop(variable, None)
+            else:
+                os.environ[variable] = value
+
+def execute_value_from_xml(ding_xml, current_value, df, export_root, debug, stage_cache):
+    return execute_value(ET.fromstring(ding_xml), current_value, df, export_root, debug, stage_cache)
+
+def execute_values(ding, dict_values, export_root="./", debug=False, workers=1, threads=None, stage_cache=None):
+    '''
+    stage_cache: cache.StageCache shared by the values (no cache if None)
+    workers: number of processes used to deal with the values concurrently
+    threads: number of threads per worker (cores / workers by default)
+    the results are collected in the order of dict_values whatever the order of completion
+    '''
+    values_classifiers_results = {}
+    if workers <= 1 or len(dict_values) <= 1:
+        for current_value, df in dict_values.items():
+            results = execute_value(ding, current_value, df, export_root, debug, stage_cache)
+            if results is not None:
+                values_classifiers_results[current_value] = results
+        return values_classifiers_results
+
+    if threads is None:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+    ding_xml = ET.tostring(ding)
+    with get_workers_pool(workers, threads) as executor:
+        futures = {current_value: executor.submit(execute_value_from_xml, ding_xml, current_value, df, export_root, debug, stage_cache) for current_value, df in dict_values.items()}
+        for current_value, future in futures.items():
+            results = future.result()
+            if results is not None:
+                values_classifiers_results[current_value] = results
+    return values_classifiers_results
+
+def execute(filename, use_cache=True):
+    '''
+    use_cache: reuse the results of the stages (features, preprocessing, target, data splitters) computed by previous executions
+    '''
     tree = ET.parse(filename)
     root = tree.getroot()
     
@@ -44,7 +514,6 @@ def execute(filename):
     for ding in root.findall('ding'):
         # global variables for the current ding execution
         debug = ding.get("debug", False)
-        target = None
 
         export_root = ding.get("export", "./")
         if export_root and not os.path.isdir(export_root):
@@ -73,6 +542,14 @@ def execute(filename):
                     params[param] = import_node.get(param)
             import_filename = import_node.get("filename", None)
             export_filename = import_node.get("export", None)
+            store_root = import_node.get("store", None)
+            source = None
+            source_name = import_node.get("source", None)
+            if source_name:
+                # the store is updated from the source before reading
+                source = datasource.get_data_source(source_name, {"folder": import_node.get("folder", "./")})
+                if not store_root:
+                    store_root = store.default_root
 
             if values:
                 if "cac40" in values:
@@ -83,7 +560,15 @@ def execute(filename):
 
                 for value in values:
                     out("value : {}".format(value))
-                    df = fimport.get_dataframe_from_yahoo(value, params)
+                    if store_root:
+                        try:
+                            df = store.get_dataframe_from_store(value, params, store_root, source)
+                        except ValueError as error:
+                            # the data of the source doesn't match the store (columns)
+                            out("\U0001F4A5 {}".format(error))
+                            continue
+                    else:
+                        df = fimport.get_dataframe_from_yahoo(value, params)
 
                     if not isinstance(df, pd.DataFrame):
                         out("\U0001F4A5 no input data for {}".format(value))
@@ -114,284 +599,16 @@ def execute(filename):
             
         out("dict_values : {}".format(dict_values.keys()))
 
-        values_classifiers_results = {}
-        for key in dict_values:
-            current_value = key
-            df = dict_values[key]
-            out("\U0001F7E2 dealing with {}".format(current_value))
-            if df.empty:
-                out("\U0001F4A5 Empty DataFrame")
-                continue
-            out(df)
-
-            values_classifiers_results[current_value] = {}
-            values_classifiers_results[current_value]["classifiers"] = {}
-
-            initial_columns = list(df.columns)
-
-            # indicators
-            out("\U0001F449 [INDICATORS]", step_format)
-            features_node = ding.find('features')
-            if features_node is not None:
-                params = dict()
-                for name, value in features_node.attrib.items():
-                    if name != "indicators" and name != "target" and name != "export":
-                        params[name] = value
-                        print("   {} : {}".format(name, value))
-                features = features_node.get("indicators", None)
-                target = features_node.get("target", None)
-                export_filename = features_node.get("export", None)
-
-                all_features = []
-                if features:
-                    all_features = features.split(',')
-                if target != None:
-                    all_features.append(target)
-
-                out("Using the following technical indicators : {}".format(all_features))
-                df = findicators.add_technical_indicators(df, all_features, params)
-                features_to_remove = [feature for feature in initial_columns if feature not in all_features]
-                findicators.remove_features(df, features_to_remove)
-                df = fdataprep.process_technical_indicators(df, ['missing_values'])
-                if export_filename:
-                    df.to_csv(get_full_path(export_filename))
-                    for indicator in df.columns:
-                        prefix = ""
-                        if current_value:
-                            prefix = current_value+'_'
-                        visu.display_from_dataframe(df, indicator, get_full_path(prefix+indicator+'.png'))
-                out(df)
-
-            # preprocessing
-            out("\U0001F449 [PREPROCESSING]", step_format)
-            preprocessing_node = ding.find('preprocessing')
-            if preprocessing_node:
-                export_filename = preprocessing_node.get("export", None)
-                
-                for preprocess in preprocessing_node:
-                    # outliers
-                    if preprocess.tag == "outliers":
-                        method = preprocess.get("method", None)
-                        indicators = preprocess.get("indicators", None)
-                        if indicators:
-                            indicators = indicators.split(',')
-                        if method:
-                            out("[PREPROCESSING] outliers : {}".format(method))
-                            df = fdataprep.process_technical_indicators(df, [method], indicators)
-                            df = fdataprep.process_technical_indicators(df, ['missing_values'])
-
-                    # transformation
-                    elif preprocess.tag == "transformation":
-                        method = preprocess.get("method", None)
-                        indicators = preprocess.get("indicators", None)
-                        if indicators:
-                            indicators = indicators.split(',')
-                        if method is not None and indicators is not None:
-                            out("[PREPROCESSING] transformation {} for {}".format(method, indicators))
-                            df = fdataprep.process_technical_indicators(df, ["transformation_"+method], indicators)
-                            df = fdataprep.process_technical_indicators(df, ['missing_values'])
-
-                    elif preprocess.tag == "discretization":
-                        # discretization
-                        indicators = preprocess.get("indicators", None)
-                        method = preprocess.get("method", None)
-                        if indicators is not None and method is not None:
-                            out("[PREPROCESSING] discretization {} for {}".format(method, indicators))
-                            indicators = indicators.split(',')
-                            df = fdataprep.process_technical_indicators(df, ["discretization_"+method], indicators)
-
-                if export_filename:
-                    df.to_csv(get_full_path(export_filename))
-                    for indicator in df.columns:
-                        visu.display_from_dataframe(df, indicator, get_full_path(value + '_preprocessing_'+indicator+'.png'))
-
-            # feature engineering
-            out("\U0001F449 [FEATURE ENGINEERING]", step_format)
-            featureengineering_node = ding.find('featureengineering')
-            if featureengineering_node is not None:
-                export_filename = featureengineering_node.get("export", None)
-
-                for featureengineering in featureengineering_node:
-                    # reduction
-                    if featureengineering.tag == "reduction":
-                        method = featureengineering.get("method", None)
-                        if method is not None:
-                            out("[FEATURE ENGINEERING] reduction : {}".format(method))
-
-                if export_filename:
-                    df.to_csv(get_full_path(export_filename))
-                    for indicator in df.columns:
-                            visu.display_from_dataframe(df, indicator, get_full_path(value + '_featureengineering_'+indicator+'.png'))
-
-            out("\U0001F449 [FINAL DATAFRAME]", step_format)
-            if df.empty:
-                out("\U0001F4A5 Empty DataFrame")
-                continue
-            out(df)
-
-            # target
-            out("\U0001F449 [TARGET]", step_format)
-            if target == None:
-                target_node = ding.find('target')
-                if target_node is not None:
-                    target = target_node.text
-                    shift = target_node.get("shift", None)
-                    if shift:
-                        df = findicators.shift(df, target, shift)
-                        df = fdataprep.process_technical_indicators(df, ['missing_values']) # shit happens
-                        
-                    export_filename = target_node.get("export", None)
-                    if export_filename:
-                        df.to_csv(get_full_path(export_filename))
-
-            if target == None:
-                out("\U0001F4A5 no target")
-                continue
-            out("target : {}".format(target))
-            out(df[target].value_counts())
-
-            # in the following, the target column should be named "target"
-            df = df.rename(columns={target: "target"})
-            target="target"
-
-            # data splitter
-            library_data_splitters = {}
-            data_splitters_node = ding.find('data_splitters')
-            if data_splitters_node:
-                for data_splitter_node in data_splitters_node:
-                    if data_splitter_node.tag != "data_splitter":
-                        continue
-                    data_splitter_id = data_splitter_node.get("id", None)
-                    data_splitter_type = data_splitter_node.get("type", None)
-                    data_splitter_seq_len = int(data_splitter_node.get('sequence_length', math.nan))
-                    if data_splitter_id == None or data_splitter_type == None or math.isnan(data_splitter_seq_len):
-                        continue
-
-                    if data_splitter_type == "simple":
-                        index = float(data_splitter_node.get('index', math.nan))
-                        if math.isnan(index) == False:
-                            ds = data_splitter.DataSplitterTrainTestSimple(df, target=target, seq_len=data_splitter_seq_len)
-                            ds.split(index)
-                        else:
-                            continue
-                    elif data_splitter_type == "cross_validation":
-                        nb_splits = int(data_splitter_node.get('nb_splits', math.nan))
-                        max_train_size = int(data_splitter_node.get('max_train_size', math.nan))
-                        test_size = int(data_splitter_node.get('test_size', math.nan))
-                        if math.isnan(nb_splits) == False and math.isnan(max_train_size) == False and math.isnan(test_size) == False:
-                            ds = data_splitter.DataSplitterForCrossValidation(df.copy(), nb_splits, max_train_size, test_size)
-                            ds.split()
-                        else:
-                            continue
-                    else:
-                        continue
-
-                    library_data_splitters[data_splitter_id] = ds
-
-            # dump data splitters library
-            out("\U0001F449 [DATA SPLITTERS LIBRARY]", step_format)
-            #print(library_data_splitters)
-            for data_splitter_id, data_splitter_item in library_data_splitters.items():
-                if isinstance(data_splitter_item, data_splitter.DataSplitterTrainTestSimple):
-                    print("DataSplitterTrainTestSimple {}".format(data_splitter_id))
-                    #data_splitter_item.dump()
-                if isinstance(data_splitter_item, data_splitter.DataSplitterForCrossValidation):
-                    print("DataSplitterForCrossValidation {}".format(data_splitter_id))
-    
-            # learning model
-            out("\U0001F449 [CLASSIFIERS]", step_format)
-            classifiers_node = ding.find('classifiers')
-            if classifiers_node:
-                library_models = {}
-                test_vs_pred = []
-                for classifier in classifiers_node:
-                    classifier_id = classifier.get("id", None)
-                    out("[CLASSIFIER] Treating {}".format(classifier_id), "red")
-                    classifier_type = classifier.get("type", None)
-                    data_splitter_id = classifier.get("data_splitter_id", None)
-                    export_filename = classifier.get("export", None)
-
-                    parameters_node = classifier.find('parameters')
-                    params = {}
-                    if parameters_node:
-                        for parameter in parameters_node:
-                            parameter_name = parameter.get("name", None)
-                            parameter_value = parameter.get("value", None)
-                            if parameter_name != None and parameter_value != None:
-
-                                def get_classifier_from_name(classifier_name):
-                                    classifier_value = library_models[classifier_name]
-                                    if classifier_value != None:
-                                        out("{} found ({})".format(classifier_name, classifier_value))
-                                    else:
-                                        out("!!! {} not found !!!".format(parameter_value))
-                                    return classifier_value
-
-                                # replace classifier name with classifier model
-                                if parameter_name == "classifier":
-                                    parameter_value = get_classifier_from_name(parameter_value)
-
-                                elif parameter_name == "classifiers":
-                                    classifier_names = parameter_value.split(',')
-                                    parameter_value = [(classifier_name, get_classifier_from_name(classifier_name)) for classifier_name in classifier_names]
-                                    out(parameter_value)
-                                
-                                elif parameter_name == "param_grid":
-                                    parameter_value = parameter_value.replace("'", "\"")
-                                    parameter_value = json.loads(parameter_value)
-
-                                if parameter_value:
-                                    params[parameter_name] = parameter_value
-                    
-                    model = None
-                    current_data_splitter = library_data_splitters[data_splitter_id]
-                    if current_data_splitter:
-                        model = classifiers_factory.ClassifiersFactory.get_classifier(type=classifier_type, params=params)
-                        if model == None:
-                            out("!!! model {} ({}) is None".format(classifier_id, classifier_type))
-                            continue
-                        if isinstance(current_data_splitter, data_splitter.DataSplitterTrainTestSimple):
-                            model.fit(current_data_splitter)
-                        elif isinstance(current_data_splitter, data_splitter.DataSplitterForCrossValidation):
-                            model.evaluate_cross_validation(current_data_splitter, target, debug)
-                        library_models[classifier_id] = model
-                    else:
-                        out("!!! can't find data splitter {}".format(data_splitter_id))
-
-                    model_analysis = model.get_analysis()
-
-                    out("Accuracy : {:.2f}".format(model_analysis["accuracy"]))
-                    out("Precision : {:.2f}".format(model_analysis["precision"]))
-                    out("Recall : {:.2f}".format(model_analysis["recall"]))
-                    out("f1_score : {:.2f}".format(model_analysis["f1_score"]))
-
-                    if export_filename:
-                        prefix = ""
-                        if current_value:
-                            prefix = current_value+'_'
-                        model.save(get_full_path(prefix+classifier_id))
-
-                    test_vs_pred.append(analysis.testvspred(classifier_id, model_analysis["y_test"], model_analysis["y_test_prob"]))
-
-                    roc_curve_filename = export_root + "/" + current_value + "_" + classifier_id + "_roc_curve.png"
-                    analysis.export_roc_curve(model_analysis["y_test"], model_analysis["y_test_prob"], roc_curve_filename)
-                    model_analysis["roc_curve_filename"] = roc_curve_filename
-
-                    confusion_matrix_filename = export_root + "/" + current_value + "_" + classifier_id + "_confusion_matrix.png"
-                    analysis.export_confusion_matrix(model_analysis["confusion_matrix"], confusion_matrix_filename)
-                    model_analysis["confusion_matrix_filename"] = confusion_matrix_filename
+        workers = int(ding.get("workers", 1))
+        threads = ding.get("threads", None)
+        if threads:
+            threads = int(threads)
+        # cache="0" on the ding disables the cache, cache_size is in MB
+        cache_root = ding.get("cache", cache.default_root)
+        cache_size = int(ding.get("cache_size", cache.default_max_size))
+        stage_cache = cache.StageCache(cache_root, cache_size, use_cache and cache_root != "0")
+        values_classifiers_results = execute_values(ding, dict_values, export_root, debug, workers, threads, stage_cache)
 
-                    if "history" in model_analysis.keys():
-                        history_filename = export_root + "/" + current_value + "_" + classifier_id
-                        analysis.export_history(history_filename, model_analysis["history"])
-                        model_analysis["history_accuracy_filename"] = history_filename + "_accuracy.png"
-                        model_analysis["history_loss_filename"] = history_filename + "_loss.png"
-
-                    values_classifiers_results[current_value]["classifiers"][classifier_id] = model_analysis
-
-                analysis.export_roc_curves(test_vs_pred, export_root + "/"+current_value+"_roc_curves.png", current_value)
-                values_classifiers_results[current_value]["roc_curves_filename"] = export_root + "/"+current_value+"_roc_curves.png"
-            
         final_report = {}
         final_report["xmlfile"] = filename
         final_report["values_classifiers_results"] = values_classifiers_results
@@ -2,6 +2,6 @@
 data preprocessing
 """
 
-__all__ = ["fdataprep", "fprep", "fdiscretize"]
+__all__ = ["fdataprep", "fprep", "fdiscretize", "fpipeline"]
 __version__ = '0.1'
 __author__ = 'ced'
@@ -5,161 +5,81 @@ from sklearn.preprocessing import KBinsDiscretizer
 from ..featureengineering import fselection
 
 
-def data_discretization(df, columns):
+# rules of the supervised discretization (1 for a buy signal, 0 otherwise)
+# thresholds : 1 if the value is under low or rising, unless it is over high or falling
+# rising : 1 if the value is rising
+# below : 1 if the value is below the reference column
+# prefix : the rule applies to the columns starting with its name
+g_discretization_rules = {
+    "rsi_30": {"test": "thresholds", "low": 30, "high": 70},
+    "roc": {"test": "thresholds", "low": 0, "high": 0},
+    "adx": {"test": "thresholds", "low": 30, "high": 70},
+    "stc": {"test": "thresholds", "low": 25, "high": 75},
+    "cci_30": {"test": "thresholds", "low": -200, "high": 200},
+    "atr": {"test": "rising"},
+    "williams_%r": {"test": "rising"},
+    "stoch_%d": {"test": "rising"},
+    "stoch_%k": {"test": "rising"},
+    "er": {"test": "rising"},
+    "macd": {"test": "rising"},
+    "mom": {"test": "rising"},
+    "sma": {"test": "below", "reference": "close", "prefix": True},
+    "ema": {"test": "below", "reference": "close", "prefix": True},
+    "wma": {"test": "below", "reference": "close", "prefix": True},
+}
+
+def get_discretization_rules(df, columns, rules=None):
+    '''
+    rules: rules added to (or replacing) the ones of g_discretization_rules
+    return a dict column of df -> rule for the columns
+    '''
+    all_rules = dict(g_discretization_rules, **(rules or {}))
+    columns_rules = {}
     for col in columns:
-        if col == "rsi_30":
-            d1 = pd.DataFrame(df[col])
-            d1["rsi_t"] = d1[col].copy()
-            d1["rsi_t-1"] = d1["rsi_t"].shift(1)
-
-            condition1 = (d1['rsi_t'] < 30) | (d1['rsi_t'] > d1['rsi_t-1'])
-            condition2 = (d1['rsi_t'] > 70) | (d1['rsi_t'] < d1['rsi_t-1'])
-
-            d1['dis_' + col] = np.where(condition1, 1, d1['rsi_t'])
-            d1['dis_' + col] = np.where((d1['dis_' + col] != 1) | condition2, 0, d1['dis_' + col])
-            df[col] = d1["dis_" + col].copy().astype(int)
-
-        if col == "roc":
-            d1 = pd.DataFrame(df[col])
-            d1["roc_t"] = d1[col].copy()
-            d1["roc_t-1"] = d1["roc_t"].shift(1)
-
-            condition1 = (d1['roc_t'] < 0) | (d1['roc_t'] > d1['roc_t-1'])
-            condition2 = (d1['roc_t'] > 0) | (d1['roc_t'] < d1['roc_t-1'])
-
-            d1['dis_' + col] = np.where(condition1, 1, d1['roc_t'])
-            d1['dis_' + col] = np.where((d1['dis_' + col] != 1) | condition2, 0, d1['dis_' + col])
-            df[col] = d1["dis_" + col].copy().astype(int)
-
-        if col == "adx":
-            d1 = pd.DataFrame(df[col])
-            d1["adx_t"] = d1[col].copy()
-            d1["adx_t-1"] = d1["adx_t"].shift(1)
-
-            condition1 = (d1['adx_t'] < 30) | (d1['adx_t'] > d1['adx_t-1'])
-            condition2 = (d1['adx_t'] > 70) | (d1['adx_t'] < d1['adx_t-1'])
-
-            d1['dis_' + col] = np.where(condition1, 1, d1['adx_t'])
-            d1['dis_' + col] = np.where((d1['dis_' + col] != 1) | condition2, 0, d1['dis_' + col])
-            df[col] = d1["dis_" + col].copy().astype(int)
-
-        if col == "stc":
-            d1 = pd.DataFrame(df[col])
-            d1["stc_t"] = d1[col].copy()
-            d1["stc_t-1"] = d1["stc_t"].shift(1)
-
-            condition1 = (d1['stc_t'] < 25) | (d1['stc_t'] > d1['stc_t-1'])
-            condition2 = (d1['stc_t'] > 75) | (d1['stc_t'] < d1['stc_t-1'])
-
-            d1['dis_' + col] = np.where(condition1, 1, d1['stc_t'])
-            d1['dis_' + col] = np.where((d1['dis_' + col] != 1) | condition2, 0, d1['dis_' + col])
-            df[col] = d1["dis_" + col].copy().astype(int)
-
-        if col == "cci_30":
-            d1 = pd.DataFrame(df[col])
-            d1["cci_t"] = d1[col].copy()
-            d1["cci_t-1"] = d1["cci_t"].shift(1)
-
-            condition1 = (d1['cci_t'] < -200) | (d1['cci_t'] > d1['cci_t-1'])
-            condition2 = (d1['cci_t'] > 200) | (d1['cci_t'] < d1['cci_t-1'])
-
-            d1['dis_' + col] = np.where(condition1, 1, d1['cci_t'])
-            d1['dis_' + col] = np.where((d1['dis_' + col] != 1) | condition2, 0, d1['dis_' + col])
-            df[col] = d1["dis_" + col].copy().astype(int)
-
-        if col == "atr":
-            d1 = pd.DataFrame(df[col])
-            d1["atr_t"] = d1[col].copy()
-            d1["atr_t-1"] = d1["atr_t"].shift(1)
-
-            condition = (d1['atr_t'] > d1['atr_t-1'])
-            d1['dis_' + col] = np.where(condition, 1, 0)
-            df[col] = d1["dis_" + col].copy().astype(int)
-
-        if col == "williams_%r":
-            d1 = pd.DataFrame(df[col])
-            d1["wr_t"] = d1[col].copy()
-            d1["wr_t-1"] = d1["wr_t"].shift(1)
-
-            condition = (d1['wr_t'] > d1['wr_t-1'])
-            d1['dis_' + col] = np.where(condition, 1, 0)
-            df[col] = d1["dis_" + col].copy().astype(int)
-
-        if col == "stoch_%d":
-            d1 = pd.DataFrame(df[col])
-            d1["d_t"] = d1[col].copy()
-            d1["d_t-1"] = d1["d_t"].shift(1)
-
-            condition = (d1['d_t'] > d1['d_t-1'])
-            d1['dis_' + col] = np.where(condition, 1, 0)
-            df[col] = d1["dis_" + col].copy().astype(int)
-
-        if col == "stoch_%k":
-            d1 = pd.DataFrame(df[col])
-            d1["k_t"] = d1[col].copy()
-            d1["k_t-1"] = d1["k_t"].shift(1)
-
-            condition = (d1['k_t'] > d1['k_t-1'])
-            d1['dis_' + col] = np.where(condition, 1, 0)
-            df[col] = d1["dis_" + col].copy().astype(int)
-
-        if col == "er":
-            d1 = pd.DataFrame(df[col])
-            d1["er_t"] = d1[col].copy()
-            d1["er_t-1"] = d1["er_t"].shift(1)
-
-            condition = (d1['er_t'] > d1['er_t-1'])
-            d1['dis_' + col] = np.where(condition, 1, 0)
-            df[col] = d1["dis_" + col].copy().astype(int)
-
-        if col == "macd":
-            d1 = pd.DataFrame(df[col])
-            d1["macd_t"] = d1[col].copy()
-            d1["macd_t-1"] = d1["macd_t"].shift(1)
-
-            condition = (d1['macd_t'] > d1['macd_t-1'])
-            d1['dis_' + col] = np.where(condition, 1, 0)
-            df[col] = d1["dis_" + col].copy().astype(int)
-
-        if col == "mom":
-            d1 = pd.DataFrame(df[col])
-            d1["mom_t"] = d1[col].copy()
-            d1["mom_t-1"] = d1["mom_t"].shift(1)
-
-            condition = (d1['mom_t'] > d1['mom_t-1'])
-            d1['dis_' + col] = np.where(condition, 1, 0)
-            df[col] = d1["dis_" + col].copy().astype(int)
-
-        if col == "sma":
-            col_sma_lst = [item for item in df.columns if item.startswith(col)]
-            d1 = pd.DataFrame(df[col_sma_lst])
-            d1["close_t"] = df["close"].copy()
-            for col_sma in col_sma_lst:
-                d1[col_sma + "_t"] = d1[col_sma].copy()
-                condition = (d1["close_t"] > d1[col_sma + "_t"])
-                d1["dis_" + col_sma] = np.where(condition, 1, 0)
-                df[col_sma] = d1["dis_" + col_sma].copy().astype(int)
-
-        if col == "ema":
-            col_ema_lst = [item for item in df.columns if item.startswith(col)]
-            d1 = pd.DataFrame(df[col_ema_lst])
-            d1["close_t"] = df["close"].copy()
-            for col_ema in col_ema_lst:
-                d1[col_ema + "_t"] = d1[col_ema].copy()
-                condition = (d1["close_t"] > d1[col_ema + "_t"])
-                d1["dis_" + col_ema] = np.where(condition, 1, 0)
-                df[col_ema] = d1["dis_" + col_ema].copy().astype(int)
-
-        if col == "wma":
-            col_wma_lst = [item for item in df.columns if item.startswith(col)]
-            d1 = pd.DataFrame(df[col_wma_lst])
-            d1["close_t"] = df["close"].copy()
-            for col_wma in col_wma_lst:
-                d1[col_wma + "_t"] = d1[col_wma].copy()
-                condition = (d1["close_t"] > d1[col_wma + "_t"])
-                d1["dis_" + col_wma] = np.where(condition, 1, 0)
-                df[col_wma] = d1["dis_" + col_wma].copy().astype(int)
-
+        rule = all_rules.get(col)
+        if rule is None:
+            continue
+        if rule.get("prefix", False):
+            for item in df.columns:
+                if item.startswith(col):
+                    columns_rules[item] = rule
+        elif col in df.columns:
+            columns_rules[col] = rule
+    return columns_rules
+
+def data_discretization(df, columns, rules=None):
+    '''
+    replace the columns by 0 or 1 according to their rules, the columns being discretized together
+    rules: rules added to (or replacing) the ones of g_discretization_rules
+    '''
+    columns_rules = get_discretization_rules(df, columns, rules)
+    if len(columns_rules) == 0:
+        return df
+
+    discretized = list(columns_rules.keys())
+    tests = np.array([rule["test"] for rule in columns_rules.values()])
+    values = df[discretized].to_numpy(dtype=float)
+    previous = np.full(values.shape, np.nan)
+    previous[1:] = values[:-1]
+    result = np.zeros(values.shape, dtype=bool)
+
+    with np.errstate(invalid='ignore'):
+        positions = np.flatnonzero(tests == "thresholds")
+        if len(positions) > 0:
+            x, x_1 = values[:, positions], previous[:, positions]
+            low = np.array([columns_rules[discretized[position]]["low"] for position in positions], dtype=float)
+            high = np.array([columns_rules[discretized[position]]["high"] for position in positions], dtype=float)
+            result[:, positions] = ((x < low) | (x > x_1) | (x == 1)) & ~((x > high) | (x < x_1))
+
+        positions = np.flatnonzero(tests == "rising")
+        result[:, positions] = values[:, positions] > previous[:, positions]
+
+        positions = np.flatnonzero(tests == "below")
+        if len(positions) > 0:
+            references = df[[columns_rules[discretized[position]]["reference"] for position in positions]].to_numpy(dtype=float)
+            result[:, positions] = values[:, positions] < references
+
+    df[discretized] = result.astype(int)
     return df
 
 
@@ -0,0 +1,214 @@
+"""
+Fitted preprocessing : the statistics of the steps (cutoffs, quantiles, bins, scales) are learnt once on the training data
+and applied as they are to new data, down to a single row
+"""
+from abc import ABCMeta, abstractmethod
+import hashlib
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.preprocessing import KBinsDiscretizer
+
+from ..featureengineering import fselection
+from . import fprep
+
+class PreprocessingStep(metaclass = ABCMeta):
+    '''
+    the state learnt by fit is a dict, transform_values applies it to an array (..., features)
+    '''
+    def __init__(self, features):
+        self.features = list(features)
+        self.state = None
+
+    def get_features(self, df):
+        # columns of df transformed by the step
+        return [feature for feature in self.features if feature in df.columns]
+
+    def get_params(self):
+        # parameters identifying the step (with its features)
+        return {key: value for key, value in self.__dict__.items() if key != "state"}
+
+    def fit(self, df):
+        '''
+        df: the features of the step
+        return the state learnt on df
+        '''
+        return {}
+
+    @abstractmethod
+    def transform_values(self, values):
+        pass
+
+class StdCutoff(PreprocessingStep):
+    # fprep.normalize_outliers_std_cutoff
+    def __init__(self, features, n_sigmas=2):
+        super().__init__(features)
+        self.n_sigmas = n_sigmas
+
+    def fit(self, df):
+        lower, upper = fprep.get_std_cutoff_bounds(df.to_numpy(dtype=float), self.n_sigmas)
+        return {"lower": lower, "upper": upper}
+
+    def transform_values(self, values):
+        return np.minimum(np.maximum(values, self.state["lower"]), self.state["upper"])
+
+class Winsorize(PreprocessingStep):
+    # fprep.normalize_outliers_winsorize
+    def __init__(self, features, outlier_cutoff=0.03):
+        super().__init__(features)
+        self.outlier_cutoff = outlier_cutoff
+
+    def fit(self, df):
+        lower, upper = fprep.get_quantile_bounds(df.to_numpy(dtype=float), self.outlier_cutoff)
+        return {"lower": lower, "upper": upper}
+
+    def transform_values(self, values):
+        return np.minimum(np.maximum(values, self.state["lower"]), self.state["upper"])
+
+class LogTransformation(PreprocessingStep):
+    # fprep.data_log_transformation
+    def transform_values(self, values):
+        return np.log1p(values)
+
+class X2Transformation(PreprocessingStep):
+    # fprep.data_x2_transformation
+    def transform_values(self, values):
+        return values ** 2
+
+class KBinsDiscretization(PreprocessingStep):
+    # fdiscretize.data_discretization_unsupervized
+    def __init__(self, features, nb_bins=5, strategy='uniform'):
+        super().__init__(features)
+        self.nb_bins = nb_bins
+        self.strategy = strategy
+
+    def get_features(self, df):
+        return [feature for feature in fselection.get_sma_ema_wma(df, self.features) if feature in df.columns]
+
+    def fit(self, df):
+        kbins = KBinsDiscretizer(n_bins=self.nb_bins, encode='ordinal', strategy=self.strategy)
+        kbins.fit(df)
+        # inner edges of the features (features, bins - 1), padded with inf when a feature has less bins
+        inner_edges = [bin_edges[1:-1] for bin_edges in kbins.bin_edges_]
+        edges = np.full((len(inner_edges), max([len(bin_edges) for bin_edges in inner_edges], default=0)), np.inf)
+        for position, bin_edges in enumerate(inner_edges):
+            edges[position, :len(bin_edges)] = bin_edges
+        return {"edges": edges}
+
+    def transform_values(self, values):
+        # number of inner edges under each value, as KBinsDiscretizer.transform
+        return (values[..., None] >= self.state["edges"]).sum(axis=-1).astype(float)
+
+class MinMaxNormalization(PreprocessingStep):
+    # MinMaxScaler of the data splitters and of fselection.pca_reduction
+    def fit(self, df):
+        minimum = df.min().to_numpy()
+        data_range = df.max().to_numpy() - minimum
+        scale = 1. / np.where(data_range == 0., 1., data_range)
+        return {"scale": scale, "min": -minimum * scale}
+
+    def transform_values(self, values):
+        return values * self.state["scale"] + self.state["min"]
+
+# preprocessing of fdataprep.process_technical_indicators with their default parameters
+g_steps = {
+    'outliers_normalize_stdcutoff': lambda features: StdCutoff(features, 2),
+    'outliers_normalize_winsorize': lambda features: Winsorize(features, 0.03),
+    'transformation_log': LogTransformation,
+    'transformation_x2': X2Transformation,
+    'discretization_unsupervised': lambda features: KBinsDiscretization(features, 5, 'uniform'),
+    'normalization_minmax': MinMaxNormalization
+}
+
+def get_fingerprint(step, values):
+    content = type(step).__name__ + repr(sorted(step.get_params().items())) + str(values.shape)
+    return hashlib.sha1(content.encode() + np.ascontiguousarray(values).tobytes()).hexdigest()
+
+class Pipeline:
+    '''
+    steps: PreprocessingStep fitted in order, each one on the output of the previous ones
+    states_cache: optional dict fingerprint of a step and of its input -> state, shared by the fits (on several folds,
+    by several pipelines) : only the steps whose parameters or input data changed are fitted again
+    the pipeline keeps only the states of its last fit, the cache isn't saved with it
+    '''
+    def __init__(self, steps, states_cache=None):
+        self.steps = steps
+        self.columns = None
+        self.steps_positions = None
+        self.states_cache = states_cache
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["states_cache"] = None
+        return state
+
+    def fit(self, df):
+        self.columns = []
+        self.steps_positions = []
+        for step in self.steps:
+            features = step.get_features(df)
+            self.columns.extend([feature for feature in features if feature not in self.columns])
+            self.steps_positions.append(np.array([self.columns.index(feature) for feature in features], dtype=int))
+
+        values = df[self.columns].to_numpy(dtype=float)
+        for step, positions in zip(self.steps, self.steps_positions):
+            step_values = values[:, positions]
+            fit = lambda: step.fit(pd.DataFrame(step_values, index=df.index, columns=[self.columns[position] for position in positions]))
+            if self.states_cache is None:
+                step.state = fit()
+            else:
+                fingerprint = get_fingerprint(step, step_values)
+                if fingerprint not in self.states_cache:
+                    self.states_cache[fingerprint] = fit()
+                step.state = self.states_cache[fingerprint]
+            values[:, positions] = step.transform_values(step_values)
+        return self
+
+    def transform_values(self, values):
+        '''
+        values: array (..., columns) : rows or a single row of the columns
+        '''
+        values = np.array(values, dtype=float)
+        for step, positions in zip(self.steps, self.steps_positions):
+            values[..., positions] = step.transform_values(values[..., positions])
+        return values
+
+    def transform(self, df):
+        '''
+        return a copy of df with the columns transformed
+        '''
+        df = df.copy()
+        df[self.columns] = self.transform_values(df[self.columns].to_numpy(dtype=float))
+        return df
+
+    def fit_transform(self, df):
+        return self.fit(df).transform(df)
+
+    def transform_row(self, row):
+        '''
+        row: dict, Series or array of the columns
+        return the array of the transformed columns
+        '''
+        if isinstance(row, (dict, pd.Series)):
+            row = [row[column] for column in self.columns]
+        return self.transform_values(row)
+
+    def save(self, filename):
+        joblib.dump(self, filename)
+
+    @staticmethod
+    def load(filename):
+        return joblib.load(filename)
+
+def get_pipeline(preprocessing, features=[], states_cache=None):
+    '''
+    pipeline of the preprocessing names of fdataprep.process_technical_indicators which can be fitted
+    states_cache: see Pipeline
+    '''
+    steps = []
+    for preprocess in preprocessing:
+        if preprocess in g_steps:
+            steps.append(g_steps[preprocess](features))
+        else:
+            print("Warning : preprocessing {} can't be fitted".format(preprocess))
+    return Pipeline(steps, states_cache)
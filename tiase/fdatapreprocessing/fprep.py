@@ -1,22 +1,37 @@
+import warnings
 import numpy as np
 import pandas as pd
 from sklearn.preprocessing import FunctionTransformer
 from ..fimport import visu
+from ..findicators import streaming
 from rich import print,inspect
 
-def missing_values(df):
-    df['inf'] = 0
-    for col in df.columns:
-        df['inf'] = np.where((df[col] == np.inf) | (df[col] == -np.inf), 1, df['inf'])
-
-    df = df.drop(df[df.inf == 1].index)
-    df = df.drop(['inf'], axis=1)
-
-    df.replace([np.inf, -np.inf], np.nan)
-    # Drop the NaNs
-    df.dropna(axis=0, how='any', inplace=True)
-
-    return df
+def missing_values(df, report=False):
+    '''
+    drop the rows with a missing or infinite value (df is unchanged)
+    report: if True, return also a dict with the number of rows dropped and, for each column with such values,
+            the number of missing and infinite values
+    '''
+    # one mask over the float block, the integer and boolean columns can't have such values
+    kinds = df.dtypes.map(lambda dtype: dtype.kind)
+    float_columns = df.columns[kinds.isin(["f", "c"]).to_numpy()]
+    other_columns = df.columns[~kinds.isin(["f", "c", "i", "u", "b"]).to_numpy()]
+    not_finite = ~np.isfinite(df[float_columns].to_numpy())
+    other_nans = df[other_columns].isna().to_numpy()
+
+    dropped = not_finite.any(axis=1) | other_nans.any(axis=1)
+    result = df.take(np.flatnonzero(~dropped))
+
+    if not report:
+        return result
+
+    columns = {}
+    for position in np.flatnonzero(not_finite.any(axis=0)):
+        n_infs = int(np.isinf(df[float_columns[position]].to_numpy()).sum())
+        columns[float_columns[position]] = {"nan": int(not_finite[:, position].sum()) - n_infs, "inf": n_infs}
+    for position in np.flatnonzero(other_nans.any(axis=0)):
+        columns[other_columns[position]] = {"nan": int(other_nans[:, position].sum()), "inf": 0}
+    return result, {"rows": len(df), "dropped_rows": int(dropped.sum()), "columns": columns}
 
 
 def drop_duplicates(df):
@@ -28,90 +43,81 @@ def drop_duplicates(df):
 #
 # reference : https://python.plainenglish.io/identifying-outliers-part-one-c0a31d9faefa
 #
-def normalize_outliers_std_cutoff(df, features, n_sigmas):
-    for feature in features:
-        feature_info = df[feature].agg(['mean', 'std'])
-        mu = feature_info['mean']
-        sigma = feature_info['std']
-        df[feature] = df[feature].clip(lower = mu - sigma * n_sigmas, upper = mu + sigma * n_sigmas)
-        
+def _get_values(df, features):
+    features = list(dict.fromkeys(features))
+    return features, df[features].to_numpy(dtype=float)
+
+def _get_bounds(lower, upper):
+    # a missing bound doesn't clip, as pandas clip
+    return np.where(np.isnan(lower), -np.inf, lower), np.where(np.isnan(upper), np.inf, upper)
+
+def get_std_cutoff_bounds(values, n_sigmas):
+    '''
+    values: array (rows, features)
+    return the arrays of the lower and upper bounds mean -/+ n_sigmas * std of each feature (missing values skipped,
+    infinite bounds for a feature with less than two values)
+    '''
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mu = np.nanmean(values, axis=0)
+        sigma = np.nanstd(values, axis=0, ddof=1)
+    return _get_bounds(mu - sigma * n_sigmas, mu + sigma * n_sigmas)
+
+def get_quantile_bounds(values, outlier_cutoff):
+    '''
+    values: array (rows, features)
+    return the arrays of the quantiles outlier_cutoff and 1 - outlier_cutoff of each feature (missing values skipped,
+    infinite bounds for a feature without values)
+    '''
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        lower, upper = np.nanquantile(values, [outlier_cutoff, 1 - outlier_cutoff], axis=0)
+    return _get_bounds(lower, upper)
+
+def _clip(df, features, values, lower, upper):
+    # only the features with values beyond their bounds are written back, the others keep their dtype
+    clipped = ((values < lower) | (values > upper)).any(axis=0)
+    if clipped.any():
+        values = values[:, clipped]
+        np.clip(values, lower[clipped], upper[clipped], out=values)
+        df[[feature for feature, clip in zip(features, clipped) if clip]] = values
     return df
 
+def normalize_outliers_std_cutoff(df, features, n_sigmas):
+    features, values = _get_values(df, features)
+    lower, upper = get_std_cutoff_bounds(values, n_sigmas)
+    return _clip(df, features, values, lower, upper)
+
 def cut_outliers_std_cutoff(df, features, n_sigmas):
-    for feature in features:
-        feature_mean = df[feature].agg(['mean', 'std'])
-        mu = feature_mean['mean']
-        sigma = feature_mean['std']
-        cond = (df[feature] > mu + sigma * n_sigmas) | (df[feature] < mu - sigma * n_sigmas)
-        df = df.drop(df[cond].index)
-    
-    return df
+    '''
+    drop the rows with a feature beyond mean -/+ n_sigmas * std
+    the statistics of all the features are computed on all the rows : with several features, the rows dropped
+    differ from the previous versions, which computed the statistics of a feature on the rows left by the
+    cuts of the previous features
+    '''
+    features, values = _get_values(df, features)
+    lower, upper = get_std_cutoff_bounds(values, n_sigmas)
+    cond = ((values > upper) | (values < lower)).any(axis=1)
+    return df.take(np.flatnonzero(~cond))
 
 # reference : https://python.plainenglish.io/identifying-outliers-part-one-c0a31d9faefa
 def normalize_outliers_winsorize(df, features, outlier_cutoff):
-    for feature in features:
-        df_tmp = pd.DataFrame(df[feature].copy())
-        df_tmp.pipe(lambda x: x.clip(lower=x.quantile(outlier_cutoff),
-                                upper=x.quantile(1 - outlier_cutoff),
-                                axis=1, inplace=True))
-        df[feature] = df_tmp[feature]
+    features, values = _get_values(df, features)
+    lower, upper = get_quantile_bounds(values, outlier_cutoff)
+    return _clip(df, features, values, lower, upper)
 
+def _normalize_outliers(df, n_sigmas, moments):
+    df['close'], df['simple_rtn'] = streaming.OutlierFilter(n_sigmas, moments).filter(df['close'].to_numpy(dtype=float))
     return df
 
 def normalize_outliers_mam(df, n_sigmas):
     # Using Moving Average Mean and Standard Deviation as the Boundary
-    d1 = pd.DataFrame(df['close'].copy())
-    d1['simple_rtn'] = d1.close.pct_change()
-
-    d1[['mean', 'std']] = d1['simple_rtn'].rolling(window=21).agg(['mean', 'std'])
-
-    cond = (d1['simple_rtn'] > d1['mean'] + d1['std'] * n_sigmas) \
-           | (d1['simple_rtn'] < d1['mean'] - d1['std'] * n_sigmas)
-    d1['outliers'] = np.where(cond, 1, 0)
-
-    nb_outliers = d1.outliers.value_counts()
-    print(nb_outliers)
-
-    d1['sign_simple_rtn'] = np.where(d1['simple_rtn'] > 0, 1, -1)
-    d1['new_simple_rtn'] = np.where(d1['outliers'] == 1, d1['mean'] + d1['std'] * n_sigmas * d1['sign_simple_rtn'],
-                                    d1['simple_rtn'])
-
-    d1['close_shift'] = d1['close'].shift(1)
-    d1['new_rtn'] = (d1['close'] - d1['close_shift']) / d1['close_shift']
-    d1['new_close'] = d1['close_shift'] + d1['new_simple_rtn'] * d1['close_shift']
-    d1['new_close'][0] = d1['close'][0]
-
-    df['close'] = d1['new_close'].copy()
-    df['simple_rtn'] = d1['new_rtn'].copy()
-
-    return df
+    return _normalize_outliers(df, n_sigmas, "mam")
 
 # ref : https://medium.com/swlh/identifying-outliers-part-three-257b09f5940b
 def normalize_outliers_ema(df, n_sigmas):
     # Using EMA and Standard Deviation as the Boundary
-    d1 = pd.DataFrame(df['close'].copy())
-    d1['simple_rtn'] = d1.close.pct_change()
-    d1[['mean', 'std']] = d1['simple_rtn'].ewm(span=21).agg(['mean', 'std'])
-
-    condition = (d1['simple_rtn'] > d1['mean'] + d1['std'] * n_sigmas) | (
-            d1['simple_rtn'] < d1['mean'] - d1['std'] * n_sigmas)
-    d1['outliers'] = np.where(condition, 1, 0)
-
-    nb_outliers = d1.outliers.value_counts()
-    print(nb_outliers)
-
-    d1['sign_simple_rtn'] = np.where(d1['simple_rtn'] > 0, 1, -1)
-    d1['new_simple_rtn'] = np.where(d1['outliers'] == 1, d1['mean'] + d1['std'] * n_sigmas * d1['sign_simple_rtn'],
-                                    d1['simple_rtn'])
-
-    d1['close_shift'] = d1['close'].shift(1)
-    d1['new_rtn'] = (d1['close'] - d1['close_shift']) / d1['close_shift']
-    d1['new_close'] = d1['close_shift'] + d1['new_simple_rtn'] * d1['close_shift']
-    d1['new_close'][0] = d1['close'][0]
-    df['close'] = d1['new_close'].copy()
-    df['simple_rtn'] = d1['new_rtn'].copy()
-
-    return df
+    return _normalize_outliers(df, n_sigmas, "ema")
 
 
 def feature_encoding(df):
@@ -5,7 +5,12 @@ def process_features(df, featureengineering, params=None):
     # process data indicators
     for process in featureengineering:
         if process == 'correlation_reduction':
-            df = fselection.correlation_reduction(df)
+            threshold = 0.95
+            method = 'pearson' # 'spearman'
+            if params:
+                threshold = float(params.get("correlation_threshold", threshold))
+                method = params.get("correlation_method", method)
+            df = fselection.correlation_reduction(df, threshold, method)
         elif process == 'pca_reduction':
             coef_pca = 0.99
             df = fselection.pca_reduction(df, coef_pca)
@@ -29,7 +34,7 @@ def process_features(df, featureengineering, params=None):
         elif process == 'vsa_reduction':
             df = fselection.vsa_corr_selection(df)
         elif process == 'stationary_transform':
-            df = fstationary.stationary_transform(df)
+            df = fstationary.stationary_transform(df, params)
         elif process == 'sort_df_by_corr':
             col = 'close'
             method = 'corr'
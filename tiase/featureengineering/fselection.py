@@ -72,36 +72,64 @@ def kbest_reduction(df, score_func_name, k=0.5, verbose=False):
 
     return df_result
 
+def _get_standardized(df, method):
+    # float32 columns centered with a unit norm (the dot product of two columns is their correlation),
+    # the missing values are replaced by the mean
+    if method == "spearman":
+        df = df.rank()
+    elif method != "pearson":
+        raise ValueError("unknown correlation method : {}".format(method))
+    values = df.to_numpy(dtype=np.float32, copy=True)
+    values -= np.nanmean(values, axis=0, dtype=np.float64).astype(np.float32)
+    np.nan_to_num(values, copy=False)
+    norm = np.sqrt(np.einsum('ij,ij->j', values, values, dtype=np.float64))
+    values /= np.where(norm == 0., 1., norm).astype(np.float32)
+    return values
+
+def get_correlated_features(df, threshold=0.95, method="pearson", block_size=256):
+    '''
+    greedy clustering of the columns of df : in order, a column is kept unless its absolute correlation with one
+    of the columns kept before is greater than threshold
+    method: "pearson" or "spearman"
+    the correlations are computed by blocks of block_size columns against the previous ones
+    return the list of the kept columns and the dict dropped column -> most correlated kept column
+    '''
+    values = _get_standardized(df, method)
+    columns = df.columns.to_list()
+    kept = np.zeros(len(columns), dtype=bool)
+    dropped = {}
+    for start in range(0, len(columns), block_size):
+        block = values[:, start:start + block_size]
+        corr = np.abs(block.T @ values[:, :start + block.shape[1]])
+        for position in range(block.shape[1]):
+            feature = start + position
+            candidates = np.where(kept[:feature], corr[position, :feature], 0.)
+            if feature > 0 and candidates.max() > threshold:
+                dropped[columns[feature]] = columns[np.argmax(candidates)]
+            else:
+                kept[feature] = True
+    return [column for column, keep in zip(columns, kept) if keep], dropped
+
 '''
 Ref :
 https://chrisalbon.com/code/machine_learning/feature_selection/drop_highly_correlated_features/
 https://newbedev.com/python-check-correlation-of-x-train-with-y-train-code-example
 '''
-def correlation_reduction(df):
+def correlation_reduction(df, threshold=0.95, method="pearson", report=False):
+    '''
+    drop the features (other than simple_rtn and target) correlated with a feature kept before them
+    (get_correlated_features)
+    report: if True, return also the dict dropped feature -> kept feature
+    '''
     list_features = df.columns.to_list()
     list_features.remove('simple_rtn')
     list_features.remove('target')
 
-    df_copy_simple_rtn = df['simple_rtn'].copy()
-    df_copy_target = df['target'].copy()
-
-    df_for_feature_eng = df[list_features]
-
-    # Create correlation matrix
-    corr_matrix = df_for_feature_eng.corr().abs()
-
-    # Select upper triangle of correlation matrix
-    upper = corr_matrix.where(np.triu(np.ones(corr_matrix.shape), k=1).astype(np.bool))
-
-    # Find index of feature columns with correlation greater than 0.95
-    to_drop = [column for column in upper.columns if any(upper[column] > 0.95)]
-
-    # Drop features
-    selected_features = df_for_feature_eng.drop(df_for_feature_eng[to_drop], axis=1)
-
-    frames = [df_copy_simple_rtn, df_copy_target, selected_features]
-    df_result = pd.concat(frames, axis=1).reindex(df.index)
+    selected_features, dropped = get_correlated_features(df[list_features], threshold, method)
 
+    df_result = df[['simple_rtn', 'target'] + selected_features].copy()
+    if report:
+        return df_result, dropped
     return df_result
 
 
@@ -3,11 +3,19 @@
     https://medium.com/swlh/fractionally-differentiated-features-9c1947ed2b55
 """
 import os
+import functools
+import contextlib
+import multiprocessing
+import concurrent.futures
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from scipy import signal
 from statsmodels.tsa.stattools import adfuller
 
+# windows up to this width are applied as a sum of shifted columns, the larger ones with a fft convolution
+g_direct_width = 32
+
 def plotWeights(w, v, filename):
     OUT_DIR = "./tmp_plotweights/"
     if (os.path.isdir(OUT_DIR) == False):
@@ -54,12 +62,10 @@ def getWeights(d, size):
     w:weight assigned to each samples
 
     '''
-    # thres>0 drops insignificant weights
-    w = [1.]
-    for k in range(1, size):
-        w_ = -w[-1] / k * (d - k + 1)
-        w.append(w_)
-    w = np.array(w[::-1]).reshape(-1, 1)  # sort and reshape the w
+    # w[k] = -w[k-1] / k * (d - k + 1)
+    k = np.arange(1, size)
+    w = np.concatenate([[1.], np.cumprod(-(d - k + 1) / k)])
+    w = w[::-1].reshape(-1, 1)  # sort and reshape the w
     return w
 
 
@@ -92,6 +98,10 @@ def get_skip(series, d=0.1, thres=.01):
 
     # 1) Compute weights for the longest series
     w = getWeights(d, series.shape[0])
+    return _get_skip(w, thres)
+
+
+def _get_skip(w, thres):
     # 2) Determine initial calcs to be skipped based on weight-loss threshold
     w_ = np.cumsum(abs(w))
     w_ /= w_[-1]
@@ -100,84 +110,207 @@ def get_skip(series, d=0.1, thres=.01):
     return skip
 
 
-def transfor_data_by_frac_diff(col, d=0.1, thres=.01):
-    # 3) Apply weights to values
-    df = pd.Series()
-    skip = get_skip(col)
+def get_frac_diff(values, d=0.1, thres=.01):
+    '''
+    values: array (rows, ...) of the series along the axis 0
+    return the expanding window fracdiff of the rows from the skip-th one (get_skip), computed with one fft convolution
+    with the weights of the whole series (nan from the first missing value)
+    '''
+    values = np.asarray(values, dtype=float)
+    w = getWeights(d, values.shape[0])
+    skip = _get_skip(w, thres)
 
-    for i in range(skip, col.shape[0]):
-        i_index = col.index[i]
-        data = np.dot(w[-(i + 1):, :].T, col.loc[:i_index])[0]
+    missing = np.isnan(values)
+    if missing.any():
+        values = np.where(missing, 0., values)
 
-        df[i_index] = data
+    # 3) Apply weights to values : the row i is the dot product of its i + 1 last weights and the i + 1 first values
+    kernel = w[::-1, 0].reshape((-1,) + (1,) * (values.ndim - 1))
+    result = signal.fftconvolve(values, kernel, mode='full', axes=0)[skip:values.shape[0]]
 
-    return df
+    if missing.any():
+        result[np.maximum.accumulate(missing, axis=0)[skip:]] = np.nan
+    return result
 
 
-def trans_a_bunch_of_data(df, d=0.1, thres=.01):
-    a_bunch_of_trans_data = pd.DataFrame()
+def transfor_data_by_frac_diff(col, d=0.1, thres=.01):
+    skip = get_skip(col, d, thres)
+    return pd.Series(get_frac_diff(col.to_numpy(), d, thres), index=col.index[skip:])
 
-    for col in df.columns:
-        trans_data = transfor_data_by_frac_diff(df[col], d=d, thres=thres)
-        a_bunch_of_trans_data[col] = trans_data
 
-    return a_bunch_of_trans_data
+def trans_a_bunch_of_data(df, d=0.1, thres=.01):
+    # all the columns are transformed together
+    skip = get_skip(df, d, thres)
+    return pd.DataFrame(get_frac_diff(df.to_numpy(dtype=float), d, thres), index=df.index[skip:], columns=df.columns)
 
 
-def getWeights_FFD(d=0.1, thres=1e-5):
+@functools.lru_cache(maxsize=None)
+def _get_weights_FFD(d, thres):
     w, k = [1.], 1
     while True:
         w_ = -w[-1] / k * (d - k + 1)
         if abs(w_) < thres: break
         w.append(w_)
         k += 1
-    return np.array(w[::-1]).reshape(-1, 1)
+    w = np.array(w[::-1]).reshape(-1, 1)
+    w.flags.writeable = False
+    return w
 
 
-def transfer_data_by_frac_diff_FFD(col, d=0.1, thres=1e-4):
-    # 3) Apply weights to values
-    w = getWeights_FFD(d, thres)
-    width = len(w) - 1
+def getWeights_FFD(d=0.1, thres=1e-5):
+    # the weights are memoized by (d, thres)
+    return _get_weights_FFD(float(d), float(thres)).copy()
 
-    df = pd.Series()
+
+def get_width_FFD(d=0.1, thres=1e-4):
+    # number of rows before the first one with a full window of weights
+    return len(_get_weights_FFD(float(d), float(thres))) - 1
+
+
+def get_frac_diff_FFD(values, d=0.1, thres=1e-4):
+    '''
+    values: array (rows, ...) of the series along the axis 0
+    return the fixed-width window fracdiff of the rows from the width-th one (nan for the windows with missing values)
+    a ValueError is raised if the window is as long as the series
+    '''
+    w = _get_weights_FFD(float(d), float(thres))[::-1, 0]  # w[k] is the weight of the value k rows before
+    width = len(w) - 1
+    values = np.asarray(values, dtype=float)
     # widow size can't be larger than the size of data
-    if width >= col.shape[0]: raise Exception("width is oversize")
+    if width >= values.shape[0]:
+        raise ValueError("width is oversize")
+    n_rows = values.shape[0] - width
+
+    missing = np.isnan(values)
+    if missing.any():
+        values = np.where(missing, 0., values)
+
+    if len(w) <= g_direct_width:
+        result = w[0] * values[width:]
+        for k in range(1, len(w)):
+            result += w[k] * values[width - k:width - k + n_rows]
+    else:
+        kernel = w.reshape((-1,) + (1,) * (values.ndim - 1))
+        result = signal.fftconvolve(values, kernel, mode='valid', axes=0)
 
-    for i in range(width, col.shape[0]):
-        i_0_index, i_1_index = col.index[i - width], col.index[i]
-        data = np.dot(w.T, col.loc[i_0_index:i_1_index])[0]
+    if missing.any():
+        counts = np.concatenate([np.zeros((1,) + missing.shape[1:]), np.cumsum(missing, axis=0)])
+        result[counts[width + 1:] - counts[:n_rows] > 0] = np.nan
+    return result
 
-        df[i_1_index] = data
 
-    return df
+def transfer_data_by_frac_diff_FFD(col, d=0.1, thres=1e-4):
+    # 3) Apply weights to values
+    width = get_width_FFD(d, thres)
+    return pd.Series(get_frac_diff_FFD(col.to_numpy(), d, thres), index=col.index[width:])
 
 
 def trans_a_bunch_of_data_FFD(df, d=0.1, thres=1e-4):
-    a_bunch_of_trans_data = pd.DataFrame()
+    # all the columns are transformed together
+    width = get_width_FFD(d, thres)
+    return pd.DataFrame(get_frac_diff_FFD(df.to_numpy(dtype=float), d, thres), index=df.index[width:], columns=df.columns)
+
+
+def get_adf_stats(values, d, thres=1e-4, reference=None):
+    '''
+    adf test of the fracdiff of values (1d array) : adfStat, pVal, lags, nObs, 95% conf and correlation with reference (values by default)
+    '''
+    if reference is None:
+        reference = values
+    width = get_width_FFD(d, thres)
+    trans = get_frac_diff_FFD(values, d=d, thres=thres)
+    valid = ~np.isnan(trans) & ~np.isnan(reference[width:])
+    corr = np.corrcoef(reference[width:][valid], trans[valid])[0, 1]
+    adf = adfuller(trans[valid], maxlag=1, regression='c', autolag=None)
+    return list(adf[:4]) + [adf[4]['5%']] + [corr]
+
+
+def _get_executor(workers):
+    if workers <= 1:
+        return contextlib.nullcontext(None)
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
 
-    for col in df.columns:
-        trans_data = transfer_data_by_frac_diff_FFD(df[col], d=d, thres=thres)
-        a_bunch_of_trans_data[col] = trans_data
 
-    return a_bunch_of_trans_data
+def _evaluate(executor, function, tasks):
+    # results of function(*task) for the tasks, in the process pool if any
+    if executor is None or len(tasks) == 0:
+        return [function(*task) for task in tasks]
+    return list(executor.map(function, *zip(*tasks)))
 
 
-def get_adf_corr(price):
+def get_adf_corr(price, workers=1):
+    '''
+    workers: number of processes evaluating the values of d concurrently
+    '''
     out = pd.DataFrame(columns=['adfStat', 'pVal', 'lags', 'nObs', '95% conf', 'corr'])
 
     price_log = np.log(price)
     # price_log = np.log(price[['Close']]).resample('1D').last()  # downcast to daily obs
 
-    for d in np.linspace(0, 1, 11):
-        price_trans = transfer_data_by_frac_diff_FFD(price_log, d=d, thres=1e-4)
-        # price_trans = transfer_data_by_frac_diff_FFD(price_log, d=d, thres=.01)
-        corr = np.corrcoef(price.loc[price_trans.index], price_trans)[0, 1]
-        adf = adfuller(price_trans, maxlag=1, regression='c', autolag=None)
-        out.loc[d] = list(adf[:4]) + [adf[4]['5%']] + [corr]
+    d_values = np.linspace(0, 1, 11)
+    values, reference = price_log.to_numpy(dtype=float), price.to_numpy(dtype=float)
+    with _get_executor(workers) as executor:
+        results = _evaluate(executor, get_adf_stats, [(values, d, 1e-4, reference) for d in d_values])
+    for d, result in zip(d_values, results):
+        out.loc[d] = result
 
     # with critical value
     return out
 
+
+def _get_p_value(values, d, thres):
+    # a d whose window is too long for the series (no row or too few rows for the adf test) isn't evaluable :
+    # the fracdiff is considered as not stationary
+    if get_width_FFD(d, thres) >= len(values):
+        return 1.
+    try:
+        return get_adf_stats(values, d, thres)[1]
+    except ValueError:
+        return 1.
+
+
+def get_min_d_FFD(df, p_value=0.05, precision=0.01, d_range=(0., 1.), thres=1e-4, workers=1):
+    '''
+    smallest d of d_range making the fracdiff of each column of df stationary (pVal <= p_value), up to precision
+    the stationarity is assumed to be reached for a threshold of d : the bracket of the threshold is reduced
+    by evaluating candidates spread in it, the candidates of all the columns being evaluated by workers processes
+    (bisection with a single worker)
+    return a dict column -> d (None if the column isn't stationary for the largest d)
+    '''
+    values = {column: df[column].to_numpy(dtype=float) for column in df.columns}
+    min_d = {}
+    with _get_executor(workers) as executor:
+        # bounds of the range
+        tasks = [(values[column], d, thres) for column in values for d in d_range]
+        results = _evaluate(executor, _get_p_value, tasks)
+        brackets = {}
+        for position, column in enumerate(values):
+            lower, upper = results[2 * position:2 * position + 2]
+            if lower <= p_value:
+                min_d[column] = d_range[0]
+            elif upper > p_value:
+                print("[get_min_d_FFD] {} isn't stationary for d = {}".format(column, d_range[1]))
+                min_d[column] = None
+            else:
+                brackets[column] = list(d_range)
+
+        while len(brackets) > 0:
+            # the brackets reduced to precision are done
+            for column in [column for column in brackets if brackets[column][1] - brackets[column][0] <= precision]:
+                min_d[column] = brackets.pop(column)[1]
+            n_candidates = max(1, workers // max(1, len(brackets)))
+            candidates = {column: np.linspace(low, high, n_candidates + 2)[1:-1] for column, (low, high) in brackets.items()}
+            tasks = [(values[column], d, thres) for column in candidates for d in candidates[column]]
+            results = iter(_evaluate(executor, _get_p_value, tasks))
+            for column in candidates:
+                for d, result in zip(candidates[column], [next(results) for _ in candidates[column]]):
+                    if result <= p_value:
+                        brackets[column][1] = min(brackets[column][1], d)
+                    elif d < brackets[column][1]:
+                        brackets[column][0] = max(brackets[column][0], d)
+
+    return {column: min_d[column] for column in values}
+
 def select_d_FFD(df, select_best_corr=True):
     df_index = df.index
     index_rounded = []
@@ -199,21 +332,32 @@ def select_d_FFD(df, select_best_corr=True):
     return df.index[0]
 
 
-def stationary_transform(df):
-    columns = ['open', 'close', 'high', 'low', 'volume']
-    df_stock = df[columns].copy()
-    price = df['close'].copy()
-
-    out = get_adf_corr(price)
-    plotWeights(out, "FFD_d")
-
-    df_FFD_transformed = trans_a_bunch_of_data_FFD(df_stock, d=0.1, thres=1e-4)
-
-    print('FF shape:', w_FFD.shape)
-
-    price_trans = transfer_data_by_frac_diff_FFD(price)
-    print('FFD price shape: ', price.shape)
-    print('FFD price shape: ', price_trans.shape)
+def stationary_transform(df, params=None):
+    '''
+    replace the open, close, high, low and volume columns by their fracdiff with the smallest d making them stationary
+    the first rows, without a full window of weights, are removed
+    params: stationary_p_value (0.05), stationary_precision (0.01), stationary_thres (1e-4), stationary_workers (1)
+    '''
+    p_value, precision, thres, workers = 0.05, 0.01, 1e-4, 1
+    if params:
+        p_value = float(params.get("stationary_p_value", p_value))
+        precision = float(params.get("stationary_precision", precision))
+        thres = float(params.get("stationary_thres", thres))
+        workers = int(params.get("stationary_workers", workers))
+
+    columns = [column for column in ['open', 'close', 'high', 'low', 'volume'] if column in df.columns]
+    min_d = get_min_d_FFD(df[columns], p_value=p_value, precision=precision, thres=thres, workers=workers)
+
+    df = df.copy()
+    width = 0
+    for column, d in min_d.items():
+        if d is None:
+            continue
+        w_FFD = _get_weights_FFD(float(d), float(thres))
+        width = max(width, len(w_FFD) - 1)
+        df[column] = np.concatenate([np.full(len(w_FFD) - 1, np.nan), get_frac_diff_FFD(df[column].to_numpy(), d, thres)])
+
+    return df.iloc[width:]
 
     """
     w = getWeights(0.1, price.shape[0])
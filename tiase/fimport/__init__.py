@@ -2,6 +2,6 @@
 fimport
 """
 
-__all__ = ["fimport","synthetic","visu"]
+__all__ = ["fimport","synthetic","visu","store","datasource"]
 __version__ = '0.1'
 __author__ = 'ced'
@@ -0,0 +1,59 @@
+"""
+Data sources used to fill and update the store
+"""
+import os
+from abc import ABCMeta, abstractmethod
+import yfinance as yf
+import pandas as pd
+from . import fimport
+
+class DataSource(metaclass = ABCMeta):
+
+    @abstractmethod
+    def get_history(self, value, start=None):
+        '''
+        value: ticker
+        start: first date to get (included), the whole history if None
+        return a dataframe indexed by date or None if the value is unknown
+        '''
+        pass
+
+class DataSourceYahoo(DataSource):
+    '''
+    raw prices with Adj Close (no dividends nor splits), as the csv files of fimport.download_from_yahoo
+    '''
+
+    def get_history(self, value, start=None):
+        result = yf.Ticker(value)
+        if result == None or result.ticker != value:
+            return None
+        if start:
+            return result.history(start=start, auto_adjust=False, actions=False)
+        return result.history(period="max", auto_adjust=False, actions=False)
+
+class DataSourceCsv(DataSource):
+    '''
+    local stand-in for the remote data sources : one csv file per value in folder
+    '''
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def get_history(self, value, start=None):
+        csvfile = os.path.join(self.folder, value + ".csv")
+        if not os.path.isfile(csvfile):
+            return None
+        df = fimport.get_dataframe_from_csv(csvfile)
+        if start:
+            df = df.loc[pd.Timestamp(start):]
+        return df
+
+def get_data_source(name, params=None):
+    if name == "yahoo":
+        return DataSourceYahoo()
+    elif name == "csv":
+        folder = "./"
+        if params:
+            folder = params.get("folder", folder)
+        return DataSourceCsv(folder)
+    return None
@@ -0,0 +1,288 @@
+"""
+Columnar on-disk store for OHLCV data
+one folder per ticker with one .npy file per column, read by ranges of rows :
+root/
+    AI.PA/
+        meta.json   number of rows, columns, dtypes, offsets of the data in the .npy files & index name
+        index.npy   dates (datetime64[ns], sorted)
+        0.npy       first column
+        1.npy       ...
+new rows are appended at the end of the .npy files and meta.json, written last, gives the number of valid rows
+"""
+import os
+import io
+import json
+import glob
+import hashlib
+import numpy as np
+import pandas as pd
+from . import fimport
+
+default_root = "./tiase/data/store"
+
+def get_data_offset(npyfile):
+    with open(npyfile, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            np.lib.format.read_array_header_1_0(f)
+        else:
+            np.lib.format.read_array_header_2_0(f)
+        return f.tell()
+
+def get_npy_header(dtype, length):
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (length,)})
+    return header.getvalue()
+
+def append_to_npy(npyfile, file_meta, length, values):
+    '''
+    append values after the length first rows of npyfile
+    return the offset of the data in the file
+    '''
+    dtype = np.dtype(file_meta["dtype"])
+    values = np.ascontiguousarray(values, dtype=dtype)
+    header = get_npy_header(dtype, length + len(values))
+    if len(header) != file_meta["offset"]:
+        # the new shape doesn't fit in the header : rewrite the whole file
+        data = np.fromfile(npyfile, dtype=dtype, count=length, offset=file_meta["offset"])
+        np.save(npyfile, np.concatenate([data, values]), allow_pickle=False)
+        return get_data_offset(npyfile)
+
+    with open(npyfile, "r+b") as f:
+        # the rows after length come from an interrupted append, they are overwritten
+        f.truncate(file_meta["offset"] + length * dtype.itemsize)
+        f.seek(0, os.SEEK_END)
+        f.write(values.tobytes())
+        f.seek(0)
+        f.write(header)
+    return file_meta["offset"]
+
+def get_checksum(df, decimals=4):
+    '''
+    checksum of the dates and the rounded values of df, used to detect restatements of the history
+    '''
+    checksum = hashlib.sha1()
+    checksum.update(get_datetime_index(df).values.astype('datetime64[ns]').tobytes())
+    checksum.update(np.round(df.to_numpy(dtype=float), decimals).tobytes())
+    return checksum.hexdigest()
+
+def get_datetime_index(df):
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index
+
+class Store:
+
+    def __init__(self, root=default_root):
+        self.root = root
+
+    def get_folder(self, ticker):
+        return os.path.join(self.root, ticker)
+
+    def get_tickers(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted([ticker for ticker in os.listdir(self.root) if self.has(ticker)])
+
+    def has(self, ticker):
+        return os.path.isfile(os.path.join(self.get_folder(ticker), "meta.json"))
+
+    def read_meta(self, ticker):
+        if not self.has(ticker):
+            return None
+        with open(os.path.join(self.get_folder(ticker), "meta.json")) as f:
+            return json.load(f)
+
+    def write_meta(self, ticker, meta):
+        meta_file = os.path.join(self.get_folder(ticker), "meta.json")
+        with open(meta_file + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_file + ".tmp", meta_file)
+
+    def load_rows(self, ticker, file_meta, first, last):
+        '''
+        read the rows [first, last[ of a column without reading the rest of the file
+        '''
+        dtype = np.dtype(file_meta["dtype"])
+        filename = os.path.join(self.get_folder(ticker), file_meta["file"])
+        return np.fromfile(filename, dtype=dtype, count=max(last - first, 0), offset=file_meta["offset"] + first * dtype.itemsize)
+
+    def write(self, ticker, df):
+        '''
+        replace the data of ticker with df (datetime index, numeric columns)
+        '''
+        folder = self.get_folder(ticker)
+        os.makedirs(folder, exist_ok=True)
+
+        index = get_datetime_index(df)
+        order = np.argsort(index.values, kind='stable')
+
+        # meta.json is removed first and written last so that an interrupted write is not seen as valid data
+        meta_file = os.path.join(folder, "meta.json")
+        if os.path.isfile(meta_file):
+            os.remove(meta_file)
+        for npy_file in glob.glob(os.path.join(folder, "*.npy")):
+            os.remove(npy_file)
+
+        def save(filename, values):
+            values = np.ascontiguousarray(values)
+            np.save(os.path.join(folder, filename), values, allow_pickle=False)
+            return {"file": filename, "dtype": values.dtype.str, "offset": get_data_offset(os.path.join(folder, filename))}
+
+        index_meta = save("index.npy", index.values.astype('datetime64[ns]')[order])
+        columns_meta = []
+        for position, column in enumerate(df.columns):
+            column_meta = save(str(position) + ".npy", df[column].to_numpy()[order])
+            column_meta["name"] = str(column)
+            columns_meta.append(column_meta)
+
+        meta = {"length": len(index), "index": index_meta, "columns": columns_meta, "index_name": df.index.name}
+        self.write_meta(ticker, meta)
+
+    def append(self, ticker, df):
+        '''
+        append the rows of df (same columns, dates after the last stored one) to the data of ticker
+        '''
+        meta = self.read_meta(ticker)
+        if meta is None:
+            self.write(ticker, df)
+            return
+
+        index = get_datetime_index(df)
+        length = meta["length"]
+        if length > 0 and len(index) > 0:
+            last_date = self.load_rows(ticker, meta["index"], length - 1, length)[0]
+            if index.values.min() <= last_date:
+                raise ValueError("[Store.append] {} : the dates should be after {}".format(ticker, last_date))
+
+        # the .npy files are extended first, meta.json is written last
+        folder = self.get_folder(ticker)
+        order = np.argsort(index.values, kind='stable')
+        meta["index"]["offset"] = append_to_npy(os.path.join(folder, meta["index"]["file"]), meta["index"], length, index.values.astype('datetime64[ns]')[order])
+        for column_meta in meta["columns"]:
+            values = df[column_meta["name"]].to_numpy()[order]
+            column_meta["offset"] = append_to_npy(os.path.join(folder, column_meta["file"]), column_meta, length, values)
+
+        meta["length"] = length + len(index)
+        self.write_meta(ticker, meta)
+
+    def read(self, ticker, start=None, end=None, columns=None, dropna=False):
+        '''
+        start, end: bounds of the dates, both included (as in DataFrame.loc)
+        columns: subset of the columns to load (all the columns if None)
+        dropna: drop the rows with a NaN value
+        only the rows between start and end are read from the disk
+        '''
+        meta = self.read_meta(ticker)
+        if meta is None:
+            return None
+
+        index = self.load_rows(ticker, meta["index"], 0, meta["length"])
+        first = 0
+        last = len(index)
+        if start:
+            first = np.searchsorted(index, np.datetime64(pd.Timestamp(start)), side='left')
+        if end:
+            last = np.searchsorted(index, np.datetime64(pd.Timestamp(end)), side='right')
+
+        data = {}
+        for column_meta in meta["columns"]:
+            if columns is None or column_meta["name"] in columns:
+                data[column_meta["name"]] = self.load_rows(ticker, column_meta, first, last)
+
+        index = pd.DatetimeIndex(index[first:last], name=meta["index_name"])
+        if dropna:
+            # remove incoherent values (null, NaN, ...) before building the dataframe
+            mask = np.ones(len(index), dtype=bool)
+            for values in data.values():
+                if values.dtype.kind == 'f':
+                    mask &= ~np.isnan(values)
+            if not mask.all():
+                index = index[mask]
+                data = {column: values[mask] for column, values in data.items()}
+
+        return pd.DataFrame(data, index=index)
+
+    def read_tail(self, ticker, nb_rows):
+        '''
+        read the nb_rows last rows of ticker
+        '''
+        meta = self.read_meta(ticker)
+        if meta is None or meta["length"] == 0:
+            return None
+        start = self.load_rows(ticker, meta["index"], max(meta["length"] - nb_rows, 0), meta["length"])[0]
+        return self.read(ticker, start=start)
+
+def import_from_csv_folder(folder, root=default_root):
+    '''
+    one-shot import of the csv files (as written by fimport.download_from_yahoo) of folder into the store
+    the ticker is the name of the file without the extension
+    '''
+    store = Store(root)
+    tickers = []
+    for csvfile in sorted(glob.glob(os.path.join(folder, "*.csv"))):
+        ticker = os.path.splitext(os.path.basename(csvfile))[0]
+        df = fimport.get_dataframe_from_csv(csvfile)
+        store.write(ticker, df)
+        tickers.append(ticker)
+    return tickers
+
+def check_columns(value, df, columns):
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise ValueError("[update] {} : the columns {} of the store are missing in the data of the source (columns {})".format(value, missing, list(df.columns)))
+
+def update(value, source, root=default_root, overlap=5):
+    '''
+    add to the store the bars of value it doesn't have yet
+    source: datasource.DataSource, it should give the columns (and the adjustment) of the stored data,
+            a ValueError is raised if some columns are missing
+    overlap: number of stored bars requested again to the source to check that the history hasn't been restated
+    return "created", "appended", "up to date", "refreshed" (full download after a restatement)
+    or None if the source has no data for value
+    '''
+    store = Store(root)
+    df_stored = store.read_tail(value, overlap)
+    columns = None
+    if df_stored is not None:
+        df = source.get_history(value, start=df_stored.index[0])
+        if df is None:
+            return None
+        df.index = get_datetime_index(df)
+
+        columns = list(df_stored.columns)
+        check_columns(value, df, columns)
+        df_overlap = df.loc[:df_stored.index[-1], columns]
+        if get_checksum(df_overlap) == get_checksum(df_stored):
+            df_new = df.loc[df.index > df_stored.index[-1], columns]
+            if df_new.empty:
+                return "up to date"
+            store.append(value, df_new)
+            return "appended"
+
+    # new value or restated history (split, dividend, ...) : full download
+    df = source.get_history(value)
+    if df is None or df.empty:
+        return None
+    if columns is not None:
+        # the stored schema is kept
+        check_columns(value, df, columns)
+        df = df[columns]
+    store.write(value, df)
+    if df_stored is None:
+        return "created"
+    return "refreshed"
+
+def get_dataframe_from_store(value, params=None, root=default_root, source=None):
+    '''
+    source: datasource.DataSource used to update the store before reading (no update if None)
+    '''
+    start = None
+    end = None
+    if params:
+        start = params.get("start", start)
+        end = params.get("end", end)
+    if source:
+        update(value, source, root)
+    return Store(root).read(value, start, end, dropna=True)
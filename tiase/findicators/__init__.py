@@ -2,6 +2,6 @@
 findicators
 """
 
-__all__ = ["findicators","flabeling","vsa"]
+__all__ = ["findicators","flabeling","vsa","registry","streaming","panel"]
 __version__ = '0.1'
 __author__ = 'ced'
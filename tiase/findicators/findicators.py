@@ -1,16 +1,10 @@
-from parse import parse
 import numpy as np
 
 import pandas as pd
 
 from . import vsa
 from . import flabeling
-
-# https://pythondata.com/stockstats-python-module-various-stock-market-statistics-indicators/
-from stockstats import StockDataFrame as Sdf
-
-# https://github.com/peerchemist/finta
-from finta import TA
+from . import registry
 
 def normalize_column_headings(df):
     # Change all column headings to be lower case, and remove spacing
@@ -74,142 +68,86 @@ def get_all_default_technical_indicators():
     technical_indicators.extend(["labeling"])
     return technical_indicators
 
-def add_technical_indicators(df, indicators, params=None):
+def add_registry_indicators(df, outputs, dtype=float):
+    '''
+    compute the columns outputs of the registry, the float ones being written in one block of type dtype
+    attached to the dataframe without copy
+    '''
+    block, block_columns, others = registry.compute(lambda source: df[source].to_numpy(dtype=float), outputs, dtype)
+
+    new_columns = [column for column in block_columns if column not in df.columns]
+    for position, column in enumerate(block_columns):
+        if column in df.columns:
+            df[column] = block[:, position]
+    if len(new_columns) == len(block_columns):
+        df = pd.concat([df, pd.DataFrame(block, index=df.index, columns=block_columns)], axis=1, copy=False)
+    elif len(new_columns) > 0:
+        positions = [block_columns.index(column) for column in new_columns]
+        df = pd.concat([df, pd.DataFrame(block[:, positions], index=df.index, columns=new_columns)], axis=1, copy=False)
+
+    for column, values in others.items():
+        df[column] = values
+    return df
+
+def add_technical_indicators(df, indicators, params=None, dtype=float):
     """
     calculate technical indicators
-    use stockstats package to add technical indicators
+    the indicators of the registry are computed together so that their intermediate results are shared
     :param data: (df) pandas dataframe
+    :param dtype: type of the columns of the indicators of the registry (np.float32 to halve their memory)
     :return: (df) pandas dataframe
     """
 
     df = normalize_column_headings(df)
+    columns = list(df.columns)
+
+    # columns added by each indicator, to keep the order of the indicators
+    indicators_columns = {}
+    for indicator in indicators:
+        outputs = registry.get_outputs(indicator)
+        if outputs:
+            missing = [source for output in outputs for source in registry.get_missing_sources(output, df.columns)]
+            if len(missing) > 0:
+                # the other indicators are still computed
+                print("!!! add_technical_indicators !!! {} indicator : can't be evaluated without {}".format(indicator, ", ".join(dict.fromkeys(missing))))
+                indicators_columns[indicator] = []
+                continue
+            indicators_columns[indicator] = outputs
+    registry_outputs = list(dict.fromkeys([output for outputs in indicators_columns.values() for output in outputs]))
+    if len(registry_outputs) > 0:
+        df = add_registry_indicators(df, registry_outputs, dtype)
+
+    # add the other indicators to the dataframe
+    for indicator in indicators:
+        if indicator in indicators_columns:
+            continue
+        previous_columns = list(df.columns)
+
+        try:
+            if indicator == 'labeling':
+                df = flabeling.data_labeling(df, params)
 
-    # call stockstats
-    stock = Sdf.retype(df.copy())
+            elif indicator == 'vsa':
+                days = [1, 2, 3, 5, 20, 40, 60]
+                df = vsa.create_bunch_of_vsa_features(df, days)
+                df['outcomes_vsa'] = df.close.pct_change(-1)
 
-    # add indicators to the dataframe
+            else:
+                print("!!! add_technical_indicators !!! unknown indicator : {}".format(indicator))
+        except KeyError as column:
+            # the other indicators are still computed
+            print("!!! add_technical_indicators !!! {} indicator : can't be evaluated without {}".format(indicator, column))
+
+        indicators_columns[indicator] = [column for column in df.columns if column not in previous_columns]
+
+    # some indicators (vsa) remove columns
+    ordered_columns = [column for column in columns if column in df.columns]
     for indicator in indicators:
+        ordered_columns.extend([column for column in indicators_columns.get(indicator, []) if column in df.columns and column not in ordered_columns])
+    ordered_columns.extend([column for column in df.columns if column not in ordered_columns])
+    if ordered_columns != list(df.columns):
+        df = df[ordered_columns]
 
-        trend_parsed = parse('trend_{}d', indicator)
-        sma_parsed = parse('sma_{}', indicator)
-        ema_parsed = parse('ema_{}', indicator)
-        wma_parsed = parse('wma_{}', indicator)
-
-        if trend_parsed != None and trend_parsed[0].isdigit():
-            seq = int(trend_parsed[0])
-            diff = df["close"] - df["close"].shift(seq)
-            df["trend_"+str(seq)+"d"] = diff.gt(0).map({False: 0, True: 1})
-
-        elif sma_parsed != None and sma_parsed[0].isdigit():
-            seq = int(sma_parsed[0])
-            df["sma_"+str(seq)] = TA.SMA(stock, seq).copy()
-
-        elif ema_parsed != None and ema_parsed[0].isdigit():
-            period = int(ema_parsed[0])
-            df["ema_"+str(period)] = TA.EMA(stock, period = period).copy()
-
-        elif wma_parsed != None and wma_parsed[0].isdigit():
-            period = int(wma_parsed[0])
-            df["wma_"+str(period)] = TA.WMA(stock, period = period).copy()
-
-        elif indicator == "on_balance_volume":
-            # ref : https://medium.com/analytics-vidhya/analysis-of-stock-price-predictions-using-lstm-models-f993faa524c4
-
-            if "volume" not in df.columns or ("adj_close" not in df.columns and "close" not in df.columns):
-                print("!!! add_technical_indicators !!! on_balance_volume indicator : can't be evaluated")
-                return df
-
-            new_balance_volume = [0]
-            tally = 0
-            adj_close = "adj_close"
-            if adj_close not in df.columns:
-                adj_close = "close"
-
-            for i in range(1, len(df)):
-                if (df[adj_close][i] > df[adj_close][i - 1]):
-                    tally += df['volume'][i]
-                elif (df[adj_close][i] < df[adj_close][i - 1]):
-                    tally -= df['volume'][i]
-                new_balance_volume.append(tally)
-
-            df['on_balance_volume'] = new_balance_volume
-            minimum = min(df['on_balance_volume'])
-
-            df['on_balance_volume'] = df['on_balance_volume'] - minimum
-            df['on_balance_volume'] = (df['on_balance_volume']+1).transform(np.log)
-     
-        elif indicator == 'macd':
-            df['macd'] = stock.get('macd').copy() # from stockstats
-            #df['macd'] = TA.MACD(stock)['MACD'].copy() # from finta
-
-        elif indicator == 'macds':
-            df['macds'] = stock.get('macds').copy() # from stockstats
-
-        elif indicator == 'macdh':
-            df['macdh'] = stock.get('macdh').copy() # from stockstats
-
-        elif indicator == 'bbands':
-            bbands = TA.BBANDS(stock).copy()
-            df = pd.concat([df, bbands], axis = 1)
-            df.rename(columns={'BB_UPPER': 'bb_upper'}, inplace=True)
-            df.rename(columns={'BB_MIDDLE': 'bb_middle'}, inplace=True)
-            df.rename(columns={'BB_LOWER': 'bb_lower'}, inplace=True)
-
-        elif indicator == 'rsi_30':
-            df['rsi_30'] = stock.get('rsi_30').copy()
-        
-        elif indicator == 'cci_30':
-            df['cci_30'] = stock.get('cci_30').copy()
-        
-        elif indicator == 'dx_30':
-            df['dx_30'] = stock.get('dx_30').copy()
-        
-        elif indicator == 'williams_%r':
-            df['williams_%r'] = TA.WILLIAMS(stock).copy()
-
-        elif indicator == 'stoch_%k':
-            df['stoch_%k'] = TA.STOCH(stock).copy()
-
-        elif indicator == 'stoch_%d':
-            df['stoch_%d'] = TA.STOCHD(stock).copy()
-           
-        elif indicator == 'er':
-            df['er'] = TA.ER(stock).copy()
-           
-        elif indicator == 'stc':
-            df['stc'] = TA.STC(stock).copy()
-           
-        elif indicator == 'atr':
-            df['atr'] = TA.ATR(stock).copy()
-           
-        elif indicator == 'adx':
-            df['adx'] = TA.ADX(stock).copy()
-           
-        elif indicator == 'roc':
-            df['roc'] = TA.ROC(stock).copy()
-
-        elif indicator == 'mom':
-            df['mom'] = TA.MOM(stock).copy()
-
-        elif indicator == 'simple_rtn':
-            df['simple_rtn'] = df['close'].pct_change()
-
-        elif indicator == 'labeling':
-            df = flabeling.data_labeling(df, params)
-
-        elif indicator == 'vsa':
-            days = [1, 2, 3, 5, 20, 40, 60]
-            df = vsa.create_bunch_of_vsa_features(df, days)
-            df['outcomes_vsa'] = df.close.pct_change(-1)
-
-        # 'target' is trend_1d with a shift applied in order tp place on the same row the features and the expected trend for the next day
-        elif indicator == 'target':
-            diff = df["close"] - df["close"].shift(1)
-            df["target"] = diff.gt(0).map({False: 0, True: 1}).shift(-1)
-            
-        else:
-            print("!!! add_technical_indicators !!! unknown indicator : {}".format(indicator))
-    
     return df
 
 def shift(df, indicator, shift):
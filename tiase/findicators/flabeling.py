@@ -80,42 +80,80 @@ def get_daily_volatility_for_daily_data(close,span0=20):
     df0.dropna(inplace=True)
     return df0
 
-def get_3_barriers(prices, high, low, daily_volatility, t_final, upper_lower_multipliers):
-    #create a container
-    barriers = pd.DataFrame(columns=['days_passed', 'price', 'high', 'low', 'vert_barrier', 'top_barrier', 'bottom_barrier'],
-                            index = daily_volatility.index)
-    for day, vol in daily_volatility.iteritems():
-        days_passed = len(daily_volatility.loc[daily_volatility.index[0] : day])
-        #set the vertical barrier
-        if (days_passed + t_final < len(daily_volatility.index) and t_final != 0):
-            vert_barrier = daily_volatility.index[days_passed + t_final]
-        else:
-            # Labeling with nan ending
-            vert_barrier = np.nan
-            decreasing = False
-            if decreasing:
-                # Labeling with decreasing ending
-                vert_barrier = daily_volatility.index[len(daily_volatility.index) - 1]
-        #set the top barrier
-        if upper_lower_multipliers[0] > 0:
-            top_barrier = prices.loc[day] + prices.loc[day] * upper_lower_multipliers[0] * vol
-        else:
-            #set it to NaNs
-            top_barrier = pd.Series(index=prices.index)
-        #set the bottom barrier
-        if upper_lower_multipliers[1] > 0:
-            bottom_barrier = prices.loc[day] - prices.loc[day] * upper_lower_multipliers[1] * vol
+def get_windows(values, width):
+    '''
+    values: 1D array
+    width: number of values in a window
+    return a read-only view on the sliding windows, one row per window start (no copy)
+    '''
+    values = np.ascontiguousarray(values, dtype=float)
+    nb_windows = max(len(values) - width + 1, 0)
+    stride = values.strides[0]
+    return np.lib.stride_tricks.as_strided(values, shape=(nb_windows, width), strides=(stride, stride), writeable=False)
+
+def get_first_touch(values, barriers, width, upward=True):
+    '''
+    values: prices compared to the barriers (close, high or low)
+    barriers: barrier for each window start (nan if there is no barrier)
+    width: number of bars in a window, the starting bar included
+    upward: True if the barrier is touched from below (top barrier), False otherwise
+    return the offset of the first bar touching the barrier in each window, width if it is never touched
+    '''
+    windows = get_windows(values, width)
+    barriers = np.asarray(barriers, dtype=float)[:len(windows), np.newaxis]
+    with np.errstate(invalid='ignore'):
+        if upward:
+            touched = windows >= barriers
         else:
-            #set it to NaNs
-            bottom_barrier = pd.Series(index=prices.index)
+            touched = windows <= barriers
+    first_touch = touched.argmax(axis=1)
+    first_touch[~touched.any(axis=1)] = width
+    return first_touch
+
+def get_horizontal_barrier(price, vol, multiplier, upward=True):
+    '''
+    price: price of each day
+    vol: daily volatility of each day
+    multiplier: width of the barrier in volatility units (no barrier if <= 0)
+    upward: True for the top barrier (profit taking), False for the bottom barrier (stop loss)
+    '''
+    if multiplier <= 0:
+        #set it to NaNs
+        return np.full(len(price), np.nan)
+    if upward:
+        return price + price * multiplier * vol
+    return price - price * multiplier * vol
+
+def get_3_barriers(prices, high, low, daily_volatility, t_final, upper_lower_multipliers):
+    index = daily_volatility.index
+    nb_days = len(index)
+    vol = daily_volatility.to_numpy(dtype=float)
+    price = prices.loc[index].to_numpy(dtype=float)
+
+    days_passed = np.arange(1, nb_days + 1)
+
+    #set the vertical barrier, nan when the window goes beyond the data (labeling with nan ending)
+    vert_positions = days_passed + t_final
+    has_vert_barrier = (vert_positions < nb_days) & (t_final != 0)
+    vert_barrier = pd.Series(index[np.minimum(vert_positions, nb_days - 1)], index=index).where(has_vert_barrier)
+
+    top_barrier = get_horizontal_barrier(price, vol, upper_lower_multipliers[0], upward=True)
+    bottom_barrier = get_horizontal_barrier(price, vol, upper_lower_multipliers[1], upward=False)
 
-        barriers.loc[day, ['days_passed', 'price', 'high', 'low', 'vert_barrier','top_barrier', 'bottom_barrier']] = days_passed, prices.loc[day], high.loc[day], low.loc[day], vert_barrier, top_barrier, bottom_barrier
+    barriers = pd.DataFrame({'days_passed': days_passed,
+                             'price': price,
+                             'high': high.loc[index].to_numpy(dtype=float),
+                             'low': low.loc[index].to_numpy(dtype=float),
+                             'vert_barrier': vert_barrier,
+                             'top_barrier': top_barrier,
+                             'bottom_barrier': bottom_barrier},
+                            index = index)
 
-    barriers['out'] = None
+    barriers['out'] = np.nan
     return barriers
 
 
-def get_labels(barriers, label_below=0, label_middle=1, label_above=2, use_high_low=False):
+def get_labels(barriers, label_below=0, label_middle=1, label_above=2, use_high_low=False, floating=False):
     '''
     start: first day of the window
     end:last day of the window
@@ -125,127 +163,190 @@ def get_labels(barriers, label_below=0, label_middle=1, label_above=2, use_high_
     bottom_barrier:stop loss limt
     condition_pt:top_barrier touching conditon
     condition_sl:bottom_barrier touching conditon
+    floating: label with the final return relative to the barriers when none of them is touched
     '''
-    floating = False
-    for i in range(len(barriers.index)):
-        start = barriers.index[i]
-        end = barriers.vert_barrier[i]
-        if pd.notna(end):
-            # assign the top and bottom barriers
-            top_barrier = barriers.top_barrier[i]
-            bottom_barrier = barriers.bottom_barrier[i]
-            #set the profit taking and stop loss conditons
-            if use_high_low == True:
-                high_price = barriers.high[start: end].copy()
-                low_price = barriers.low[start: end].copy()
-            else:
-                high_price = barriers.price[start: end].copy()
-                low_price = barriers.price[start: end].copy()
-
-            condition_pt = (high_price >= top_barrier).any()
-            condition_sl = (low_price <= bottom_barrier).any()
-            #set the first to reach the barrier
-            if condition_pt and condition_sl:
-                cpt_date = barriers.index[i]
-                condition_pt_loc = False
-                j=1
-                while (cpt_date <= end) and (condition_pt_loc == False):
-                    if(high_price[cpt_date] >= top_barrier):
-                        condition_pt_loc = cpt_date
-                    else:
-                        cpt_date = barriers.index[i+j]
-                        j=j+1
-                cpt_date = barriers.index[i]
-                condition_sl_loc = False
-                j=1
-                while (cpt_date <= end) and (condition_sl_loc == False):
-                    if(low_price[cpt_date] <= bottom_barrier):
-                        condition_sl_loc = cpt_date
-                    else:
-                        cpt_date = barriers.index[i+j]
-                        j=j+1
-                if condition_pt_loc < condition_sl_loc:
-                    condition_sl = False
-                else:
-                    condition_pt = False
-            #assign the labels
-            if condition_pt:
-                barriers['out'][i] = label_above
-            elif condition_sl:
-                barriers['out'][i] = label_below
-            else:
-                if not floating:
-                    barriers['out'][i] = label_middle
-                else:
-                    price_initial = barriers.price[start]
-                    price_final = barriers.price[end]
-                    barriers['out'][i] = max([(price_final - price_initial) / (top_barrier - price_initial),
-                                            (price_final - price_initial) / (price_initial - bottom_barrier)],
-                                            key=abs)
+    price = barriers.price.to_numpy(dtype=float)
+    if use_high_low == True:
+        high_price = barriers.high.to_numpy(dtype=float)
+        low_price = barriers.low.to_numpy(dtype=float)
+    else:
+        high_price = price
+        low_price = price
+    top_barrier = barriers.top_barrier.to_numpy(dtype=float)
+    bottom_barrier = barriers.bottom_barrier.to_numpy(dtype=float)
+
+    out = np.full(len(barriers.index), np.nan)
+
+    vert_barrier = barriers.vert_barrier
+    start = np.flatnonzero(vert_barrier.notna().to_numpy())
+    end = barriers.index.get_indexer(vert_barrier.iloc[start])
+    widths = end - start + 1
+
+    # the windows have the same width (t_final + 2) except if the barriers have been built by hand
+    for width in np.unique(widths):
+        start_width = start[widths == width]
+
+        #set the profit taking and stop loss conditons
+        first_pt = get_first_touch(high_price, top_barrier, width, upward=True)[start_width]
+        first_sl = get_first_touch(low_price, bottom_barrier, width, upward=False)[start_width]
+        condition_pt = first_pt < width
+        condition_sl = first_sl < width
+
+        #set the first to reach the barrier
+        condition_pt_first = condition_pt & (first_pt < first_sl)
+        condition_sl_first = condition_sl & ~condition_pt_first
+
+        #assign the labels
+        labels = np.full(len(start_width), label_middle, dtype=float)
+        if floating:
+            price_initial = price[start_width]
+            price_final = price[start_width + width - 1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio_top = (price_final - price_initial) / (top_barrier[start_width] - price_initial)
+                ratio_bottom = (price_final - price_initial) / (price_initial - bottom_barrier[start_width])
+            labels = np.where(np.abs(ratio_top) >= np.abs(ratio_bottom), ratio_top, ratio_bottom)
+        labels[condition_sl_first] = label_below
+        labels[condition_pt_first] = label_above
+
+        out[start_width] = labels
+
+    barriers['out'] = out
     return barriers
 
-def is_in_half_brackets(df, limit_high, limit_low):
-    if ((df.out.sum() <= limit_high) and (df.out.sum() >= limit_low)):
-        return True
+def get_top_barrier_reach(barriers, use_high_low=False):
+    '''
+    path-dependent information needed to label the bars for any top barrier, the bottom barrier being fixed :
+    reach: highest price reached in the window before the bottom barrier is touched (nan if the bar has no vertical barrier)
+    bottom_touched: True if the bottom barrier is touched in the window
+    a bar is labeled above for a given top barrier if and only if reach >= top_barrier
+    '''
+    price = barriers.price.to_numpy(dtype=float)
+    if use_high_low == True:
+        high_price = barriers.high.to_numpy(dtype=float)
+        low_price = barriers.low.to_numpy(dtype=float)
     else:
-        return False
+        high_price = price
+        low_price = price
+    bottom_barrier = barriers.bottom_barrier.to_numpy(dtype=float)
 
-def is_over_brackets(df, limit_high):
-    if (df.out.sum() >= limit_high):
-        return True
-    else:
-        return False
+    reach = np.full(len(barriers.index), np.nan)
+    bottom_touched = np.full(len(barriers.index), False)
 
-def is_under_brackets(df, limit_low):
-    if (df.out.sum() <= limit_low):
-        return True
-    else:
-        return False
+    vert_barrier = barriers.vert_barrier
+    start = np.flatnonzero(vert_barrier.notna().to_numpy())
+    end = barriers.index.get_indexer(vert_barrier.iloc[start])
+    widths = end - start + 1
 
-def get_balanced_upper_multiplier(prices, highs, lows,
-                                  daily_volatility, t_final,
-                                  upper_multiplier, lower_multiplier,
-                                  label_below, label_middle, label_above, use_high_low):
+    for width in np.unique(widths):
+        start_width = start[widths == width]
+
+        first_sl = get_first_touch(low_price, bottom_barrier, width, upward=False)[start_width]
+
+        # running max of the highs in each window, read just before the bottom barrier is touched
+        running_max = np.maximum.accumulate(get_windows(high_price, width)[start_width], axis=1)
+        reach_width = np.take_along_axis(running_max, np.maximum(first_sl - 1, 0)[:, np.newaxis], axis=1)[:, 0]
+        reach_width[first_sl == 0] = -np.inf
+
+        reach[start_width] = reach_width
+        bottom_touched[start_width] = first_sl < width
+
+    return reach, bottom_touched
+
+def get_labels_sum(reach, bottom_touched, top_barrier, label_below=0, label_middle=1, label_above=2):
+    '''
+    sum of the labels (same as get_labels(barriers).out.sum()) computed from get_top_barrier_reach
+    '''
+    labeled = ~np.isnan(reach)
+    with np.errstate(invalid='ignore'):
+        above = labeled & (reach >= top_barrier)
+    below = labeled & ~above & bottom_touched
+    middle = labeled & ~above & ~bottom_touched
+    return label_above * above.sum() + label_below * below.sum() + label_middle * middle.sum()
+
+def search_balanced_upper_multiplier(prices, highs, lows,
+                                     daily_volatility, t_final,
+                                     upper_multiplier, lower_multiplier,
+                                     label_below, label_middle, label_above, use_high_low,
+                                     max_iterations=50):
+    '''
+    bisection on upper_multiplier so that the sum of the labels is half the number of prices
+    the path of each bar is scanned once, each candidate is then scored in O(n) without relabeling
+    return the upper_multiplier and a report on the convergence
+    '''
     min_max_range = 0.5          # Range between the max upper_multiplier and min upper_multiplier
     coef_threshold = 0.001       # Balance +/- coef precision
-    
+
     upper_multiplier_max = upper_multiplier + upper_multiplier * min_max_range
     upper_multiplier_min = upper_multiplier - upper_multiplier * min_max_range
     high_threshold = int(len(prices) * 0.5 + len(prices) * coef_threshold)
     low_threshold = int(len(prices) * 0.5 - len(prices) * coef_threshold)
 
-    barriers = get_3_barriers(prices, highs, lows, daily_volatility, t_final, [upper_multiplier_max, lower_multiplier])
-    barriers = get_labels(barriers, label_below, label_middle, label_above, use_high_low)
+    barriers = get_3_barriers(prices, highs, lows, daily_volatility, t_final, [upper_multiplier, lower_multiplier])
+    reach, bottom_touched = get_top_barrier_reach(barriers, use_high_low)
+    price = barriers.price.to_numpy(dtype=float)
+    vol = daily_volatility.to_numpy(dtype=float)
 
-    if is_in_half_brackets(barriers, high_threshold, low_threshold):
-        return barriers
-    else:
-        if is_over_brackets(barriers, high_threshold):
-            # upper_multiplier over boundaries
-            return barriers
+    report = {"low_threshold": low_threshold, "high_threshold": high_threshold, "history": []}
 
-    barriers = get_3_barriers(prices, highs, lows, daily_volatility, t_final, [upper_multiplier_min, lower_multiplier])
-    barriers = get_labels(barriers, label_below, label_middle, label_above, use_high_low)
+    def get_sum(current_upper_multiplier):
+        top_barrier = get_horizontal_barrier(price, vol, current_upper_multiplier, upward=True)
+        labels_sum = get_labels_sum(reach, bottom_touched, top_barrier, label_below, label_middle, label_above)
+        report["history"].append((current_upper_multiplier, labels_sum))
+        return labels_sum
 
-    if is_in_half_brackets(barriers, high_threshold, low_threshold):
-        return barriers
-    else:
-        if is_under_brackets(barriers, low_threshold):
-            # upper_multiplier under boundaries
-            return barriers
-    while True:
+    def done(current_upper_multiplier, status):
+        report["upper_multiplier"] = current_upper_multiplier
+        report["iterations"] = len(report["history"])
+        report["status"] = status
+        report["converged"] = status == "balanced"
+        return current_upper_multiplier, report
+
+    labels_sum = get_sum(upper_multiplier_max)
+    if low_threshold <= labels_sum <= high_threshold:
+        return done(upper_multiplier_max, "balanced")
+    elif labels_sum >= high_threshold:
+        # upper_multiplier over boundaries
+        return done(upper_multiplier_max, "over boundaries")
+
+    labels_sum = get_sum(upper_multiplier_min)
+    if low_threshold <= labels_sum <= high_threshold:
+        return done(upper_multiplier_min, "balanced")
+    elif labels_sum <= low_threshold:
+        # upper_multiplier under boundaries
+        return done(upper_multiplier_min, "under boundaries")
+
+    while len(report["history"]) < max_iterations:
         upper_multiplier_step = upper_multiplier_min + (upper_multiplier_max - upper_multiplier_min) * 0.5
-        barriers = get_3_barriers(prices, highs, lows, daily_volatility, t_final, [upper_multiplier_step, lower_multiplier])
-        barriers = get_labels(barriers, label_below, label_middle, label_above, use_high_low)
+        labels_sum = get_sum(upper_multiplier_step)
 
-        if is_in_half_brackets(barriers, high_threshold, low_threshold):
-            print("Upper multiplier coef: ",upper_multiplier_step)
-            return barriers
+        if low_threshold <= labels_sum <= high_threshold:
+            return done(upper_multiplier_step, "balanced")
+        elif labels_sum <= low_threshold:
+            upper_multiplier_max = upper_multiplier_step
         else:
-            if is_under_brackets(barriers, low_threshold):
-                upper_multiplier_max = upper_multiplier_step
-            else:
-                upper_multiplier_min = upper_multiplier_step
+            upper_multiplier_min = upper_multiplier_step
+
+    # no balanced multiplier found : keep the closest one
+    balance = (low_threshold + high_threshold) * 0.5
+    closest_upper_multiplier, _ = min(report["history"], key=lambda item: abs(item[1] - balance))
+    return done(closest_upper_multiplier, "max iterations")
+
+def get_balanced_upper_multiplier(prices, highs, lows,
+                                  daily_volatility, t_final,
+                                  upper_multiplier, lower_multiplier,
+                                  label_below, label_middle, label_above, use_high_low,
+                                  max_iterations=50, debug=False):
+    upper_multiplier, report = search_balanced_upper_multiplier(prices, highs, lows,
+                                                                daily_volatility, t_final,
+                                                                upper_multiplier, lower_multiplier,
+                                                                label_below, label_middle, label_above, use_high_low,
+                                                                max_iterations)
+    if report["status"] != "balanced" or debug:
+        print("Upper multiplier coef: {} ({} after {} iterations)".format(upper_multiplier, report["status"], report["iterations"]))
+
+    barriers = get_3_barriers(prices, highs, lows, daily_volatility, t_final, [upper_multiplier, lower_multiplier])
+    barriers = get_labels(barriers, label_below, label_middle, label_above, use_high_low)
+    return barriers
 
 def data_labeling(df, params = None):
     debug = False
@@ -257,6 +358,8 @@ def data_labeling(df, params = None):
     label_above = 2
     use_balanced_upper_multiplier = False
     use_high_low = False
+    floating = False
+    balanced_max_iterations = 50
     if params:
         debug = params.get('labeling_debug', debug)
         t_final = params.get('labeling_t_final', t_final)
@@ -283,6 +386,12 @@ def data_labeling(df, params = None):
         use_high_low = params.get('use_high_low', use_high_low)
         if isinstance(use_high_low, str):
             use_high_low = bool(use_high_low)
+        floating = params.get('labeling_floating', floating)
+        if isinstance(floating, str):
+            floating = bool(floating)
+        balanced_max_iterations = params.get('labeling_balanced_max_iterations', balanced_max_iterations)
+        if isinstance(balanced_max_iterations, str):
+            balanced_max_iterations = int(balanced_max_iterations)
 
     price = df["close"].copy()
     high = df["high"].copy()
@@ -301,10 +410,11 @@ def data_labeling(df, params = None):
         barriers = get_balanced_upper_multiplier(prices, highs, lows,
                                                 daily_volatility, t_final,
                                                 upper_multiplier, lower_multiplier,
-                                                label_below, label_middle, label_above, use_high_low)
+                                                label_below, label_middle, label_above, use_high_low,
+                                                balanced_max_iterations, debug)
     else:
         barriers = get_3_barriers(prices, highs, lows, daily_volatility, t_final, [upper_multiplier, lower_multiplier])
-        barriers = get_labels(barriers, label_below, label_middle, label_above)
+        barriers = get_labels(barriers, label_below, label_middle, label_above, floating=floating)
 
     if debug:
         plot_barriers_out(barriers, filename="./tmp/labeling_barriers_out")
@@ -0,0 +1,123 @@
+"""
+Technical indicators of several tickers computed together on (rows, tickers) arrays
+each node of the registry is computed once for all the tickers
+the column of a ticker holds its own rows, from its first to its last close, so its values are the ones of
+add_technical_indicators on its dataframe whatever the calendars of the other tickers ; they are scattered back
+on the union of the dates of the tickers
+"""
+import numpy as np
+import pandas as pd
+
+from . import registry
+
+def _get_sources(df):
+    # source -> column of df, rows of df from its first to its last close
+    columns = {}
+    for column in df.columns:
+        source = str(column).lower().replace(' ', '_')
+        if source in registry.g_sources and source not in columns:
+            columns[source] = column
+    if "close" not in columns:
+        return columns, 0, len(df.index)
+    valid = np.flatnonzero(~np.isnan(df[columns["close"]].to_numpy(dtype=float)))
+    if len(valid) == 0:
+        return columns, 0, 0
+    return columns, valid[0], valid[-1] + 1
+
+def get_panel(dfs):
+    '''
+    dfs: dict ticker -> dataframe indexed by date (open, high, low, close, volume)
+    return the union of the dates, the tickers, a dict source -> (rows, tickers) array where the column of a ticker
+    holds its rows from its first to its last close, padded with missing values, and the (rows, tickers) array of
+    the positions of these rows in the dates (-1 for the padding)
+    '''
+    tickers = list(dfs.keys())
+    index = None
+    for df in dfs.values():
+        index = df.index if index is None else index.union(df.index)
+    index = index.sort_values()
+
+    ranges = {ticker: _get_sources(dfs[ticker]) for ticker in tickers}
+    nb_rows = max([last - first for _, first, last in ranges.values()], default=0)
+    positions = np.full((nb_rows, len(tickers)), -1, dtype=np.int64)
+    sources = {}
+    for position, ticker in enumerate(tickers):
+        columns, first, last = ranges[ticker]
+        df = dfs[ticker].iloc[first:last]
+        positions[:last - first, position] = index.get_indexer(df.index)
+        for source, column in columns.items():
+            if source not in sources:
+                sources[source] = np.full((nb_rows, len(tickers)), np.nan)
+            sources[source][:last - first, position] = df[column].to_numpy(dtype=float)
+    return index, tickers, sources, positions
+
+def get_ranges(values):
+    '''
+    first row and number of rows from the first to the last valid value of each column
+    '''
+    valid = ~np.isnan(values)
+    has_values = valid.any(axis=0)
+    starts = np.where(has_values, valid.argmax(axis=0), 0)
+    ends = np.where(has_values, len(values) - valid[::-1].argmax(axis=0), 0)
+    return starts, ends - starts
+
+def compute_panel(sources, indicators, dtype=float):
+    '''
+    sources: dict source -> (rows, tickers) array, the rows of a ticker being consecutive bars
+    dtype: type of the result (np.float32 to halve its memory)
+    return the (rows, columns, tickers) block with the sources and the columns of the indicators and the names of the columns
+    '''
+    outputs = []
+    for indicator in indicators:
+        indicator_outputs = registry.get_outputs(indicator)
+        if indicator_outputs is None:
+            print("!!! compute_panel !!! unsupported indicator : {}".format(indicator))
+            continue
+        missing = [source for output in indicator_outputs for source in registry.get_missing_sources(output, sources.keys())]
+        if len(missing) > 0:
+            print("!!! compute_panel !!! {} indicator : can't be evaluated without {}".format(indicator, ", ".join(dict.fromkeys(missing))))
+            continue
+        outputs.extend([output for output in indicator_outputs if output not in outputs])
+
+    # the outputs are written in the result, after the sources
+    reference = sources["close"] if "close" in sources else next(iter(sources.values()))
+    columns = list(sources.keys()) + outputs
+    result = np.empty((reference.shape[0], len(columns), reference.shape[1]), dtype=dtype)
+    for position, source in enumerate(sources.keys()):
+        result[:, position] = sources[source]
+    registry.compute(lambda source: sources[source], outputs, dtype, out=result[:, len(sources):])
+    _, nodes = registry.get_graph(outputs)
+
+    # rows of each ticker : from its first to its last close
+    starts, lengths = get_ranges(reference)
+    rows = np.arange(len(reference))[:, None]
+    before = rows < starts
+    for position, output in enumerate(outputs, len(sources)):
+        outside = before | (rows >= starts + lengths - registry.get_lookahead(output, nodes))
+        result[:, position][outside] = np.nan
+    return result, columns
+
+def add_technical_indicators_panel(dfs, indicators, output="wide", dtype=float):
+    '''
+    dfs: dict ticker -> dataframe indexed by date
+    dtype: type of the values of the result
+    output: "wide" : dataframe indexed by date with (column, ticker) columns, missing values at the dates a ticker doesn't have
+            "long" : dataframe indexed by (date, ticker) with one column per indicator, with the rows of the dates of each ticker
+    '''
+    index, tickers, sources, positions = get_panel(dfs)
+    result, columns = compute_panel(sources, indicators, dtype)
+
+    # rows of the tickers sorted by (date, ticker)
+    rows, ticker_positions = np.nonzero(positions >= 0)
+    dates = positions[rows, ticker_positions]
+    order = np.lexsort((ticker_positions, dates))
+    rows, ticker_positions, dates = rows[order], ticker_positions[order], dates[order]
+
+    if output == "long":
+        long_index = pd.MultiIndex.from_arrays([index[dates], np.array(tickers, dtype=object)[ticker_positions]], names=[index.name, "ticker"])
+        return pd.DataFrame(result[rows, :, ticker_positions], index=long_index, columns=columns)
+
+    wide = np.full((len(index), len(columns), len(tickers)), np.nan, dtype=dtype)
+    wide[dates, :, ticker_positions] = result[rows, :, ticker_positions]
+    wide_columns = pd.MultiIndex.from_product([columns, tickers])
+    return pd.DataFrame(wide.reshape(len(index), len(columns) * len(tickers)), index=index, columns=wide_columns)
@@ -0,0 +1,398 @@
+"""
+Registry of the technical indicators computed on numpy arrays
+each node declares the nodes it is computed from : the graph of the requested indicators is built
+so that the intermediate nodes (emas, true range, rolling extrema, directional moves...) are computed once
+the results are the ones of stockstats (macd, rsi, cci, dx) and finta (the other indicators)
+"""
+import warnings
+import numpy as np
+import pandas as pd
+from scipy import signal
+from parse import parse
+
+g_sources = ["open", "high", "low", "close", "adj_close", "volume"]
+
+# source used when a source is missing
+g_fallbacks = {"adj_close": "close"}
+
+# number of values of the temporary arrays of the rolling windows
+g_chunk_size = 1 << 22
+
+class Node:
+    def __init__(self, inputs, compute, dtype=float, lookahead=0):
+        '''
+        inputs: names of the nodes given to compute
+        compute: function of the values of the inputs
+        lookahead: number of next rows used by the node (nan on the last rows of a series)
+        '''
+        self.inputs = inputs
+        self.compute = compute
+        self.dtype = dtype
+        self.lookahead = lookahead
+
+#
+# helpers on the values of the nodes (arrays along the time axis)
+#
+def _pandas(values):
+    if values.ndim == 2:
+        return pd.DataFrame(values, copy=False)
+    return pd.Series(values, copy=False)
+
+def _ewm(values, span=None, alpha=None):
+    '''
+    exponentially weighted mean as pandas ewm(adjust=True)
+    for 2d values : ratio of the decayed sums of the values and of the weights, filtered on all the columns together
+    '''
+    if values.ndim == 1:
+        return _pandas(values).ewm(span=span, alpha=alpha).mean().to_numpy()
+    if alpha is None:
+        alpha = 2. / (span + 1.)
+    valid = ~np.isnan(values)
+    weighted_sum = signal.lfilter([1.], [1., alpha - 1.], np.where(valid, values, 0.), axis=0)
+    weights = signal.lfilter([1.], [1., alpha - 1.], valid.astype(float), axis=0)
+    return _divide(weighted_sum, np.where(weights > 0., weights, np.nan))
+
+def _rolling(values, window, method, min_periods=None):
+    '''
+    method: mean, sum, min, max or std of the rolling windows
+    the columns of 2d values are reduced together on views of their windows
+    '''
+    if values.ndim == 1 or (min_periods is not None and method != "mean"):
+        return getattr(_pandas(values).rolling(window=window, min_periods=min_periods), method)().to_numpy()
+    if min_periods is not None:
+        # mean of the valid values of the windows, the first windows being padded with missing values
+        valid = ~np.isnan(values)
+        padding = np.zeros((window - 1,) + values.shape[1:])
+        sums = _reduce_windows(np.concatenate([padding, np.where(valid, values, 0.)]), window, lambda x: x.sum(axis=1))[window - 1:]
+        counts = _reduce_windows(np.concatenate([padding, valid]), window, lambda x: x.sum(axis=1))[window - 1:]
+        return np.where(counts >= min_periods, _divide(sums, counts), np.nan)
+    if method == "std":
+        return _reduce_windows(values, window, lambda x: x.std(axis=1, ddof=1))
+    return _reduce_windows(values, window, lambda x: getattr(x, method)(axis=1))
+
+def _reduce_windows(values, window, function):
+    '''
+    function reduces a (rows, window, ...) view of the windows along the axis 1 : nan for the first window - 1 rows
+    the windows are reduced by chunks of rows to bound the size of the temporary arrays
+    '''
+    result = np.full(values.shape, np.nan)
+    windows = _windows(values, window)
+    chunk = max(1, g_chunk_size // (window * int(np.prod(values.shape[1:]))))
+    for first in range(0, len(windows), chunk):
+        result[window - 1 + first:window - 1 + first + chunk] = function(windows[first:first + chunk])
+    return result
+
+def _shift(values, periods):
+    result = np.full(values.shape, np.nan)
+    if periods < len(values):
+        result[periods:] = values[:len(values) - periods]
+    return result
+
+def _diff(values, periods=1):
+    return values - _shift(values, periods)
+
+def _windows(values, window):
+    # (rows - window + 1, window, ...) view of the full windows
+    n_windows = max(len(values) - window + 1, 0)
+    return np.lib.stride_tricks.as_strided(values, shape=(n_windows, window) + values.shape[1:],
+                                           strides=(values.strides[0],) + values.strides, writeable=False)
+
+def _divide(a, b):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return a / b
+
+def _wma(close, period):
+    weights = np.arange(1, period + 1, dtype=float)
+    return _reduce_windows(close, period, lambda x: np.einsum('ij...,j->i...', x, weights) / (period * (period + 1) / 2))
+
+def _mean_deviation(values, window):
+    '''
+    rolling mean of |x - mean(x)| with min_periods=1, the missing values being ignored
+    '''
+    result = _reduce_windows(values, window, lambda x: np.fabs(x - x.mean(axis=1, keepdims=True)).mean(axis=1))
+
+    # first rows and windows with missing values
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        for i in range(min(window - 1, len(values))):
+            x = values[:i + 1]
+            result[i] = np.nanmean(np.fabs(x - np.nanmean(x, axis=0)), axis=0)
+        # the windows before the first value stay nan
+        missing = np.isnan(result) & np.maximum.accumulate(~np.isnan(values), axis=0)
+        missing[:window - 1] = False
+        if missing.any():
+            positions = np.nonzero(missing)
+            x = np.moveaxis(_windows(values, window), 1, -1)[(positions[0] - window + 1,) + positions[1:]]
+            result[positions] = np.nanmean(np.fabs(x - np.nanmean(x, axis=1, keepdims=True)), axis=1)
+    return result
+
+def _true_range(high, low, prev_close):
+    # max of the three ranges, the missing ones being ignored
+    return np.fmax(np.fmax(np.abs(high - low), np.abs(high - prev_close)), np.abs(prev_close - low))
+
+def _true_range_filled(high, low, prev_close, close, started):
+    # stockstats : no absolute value on high - low and the first previous close is the first close
+    first = started.copy()
+    first[1:] &= ~started[:-1]
+    prev_close = np.where(first, close, prev_close)
+    return np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+
+def _rsi(close_diff, started, window):
+    change = np.where(started & np.isnan(close_diff), 0., close_diff)
+    p_ema = _ewm((change + np.abs(change)) / 2, alpha=1. / window)
+    n_ema = _ewm((-change + np.abs(change)) / 2, alpha=1. / window)
+    return 100 - _divide(100, 1. + _divide(p_ema, n_ema))
+
+def _cci(typical_price, window):
+    tp_sma = _rolling(typical_price, window, "mean", min_periods=1)
+    return _divide(typical_price - tp_sma, .015 * _mean_deviation(typical_price, window))
+
+def _dx(plus_dm, minus_dm, tr_filled, window):
+    atr = _ewm(tr_filled, alpha=1. / window)
+    pdi = _divide(_ewm(plus_dm, span=window), atr) * 100
+    mdi = _divide(_ewm(minus_dm, span=window), atr) * 100
+    return _divide(np.abs(pdi - mdi), pdi + mdi) * 100
+
+def _directional_move(move, opposite_move, started):
+    # move if it is the greater one and positive, 0 otherwise (0 for the missing values)
+    with np.errstate(invalid='ignore'):
+        return np.where((move > opposite_move) & (move > 0), move, np.where(started, 0., np.nan))
+
+def _sign(values):
+    # 1, -1 or 0, nan for the missing values
+    return np.sign(values)
+
+def _trend(close, seq):
+    with np.errstate(invalid='ignore'):
+        return (_diff(close, seq) > 0).astype(np.int64)
+
+def _fill(values):
+    # last valid value along the time axis
+    valid = ~np.isnan(values)
+    rows = np.where(valid, np.arange(len(values)).reshape((-1,) + (1,) * (values.ndim - 1)), 0)
+    rows = np.maximum.accumulate(rows, axis=0)
+    if values.ndim == 1:
+        return values[rows]
+    return np.take_along_axis(values, rows, axis=0)
+
+def _simple_return(close):
+    # pandas pct_change : the missing values are filled with the previous ones
+    filled = _fill(close)
+    return _divide(filled, _shift(filled, 1)) - 1
+
+def _on_balance_volume(sign, volume):
+    '''
+    cumulated volume, added when the price goes up and removed when it goes down,
+    shifted by its minimum and log scaled
+    '''
+    with np.errstate(invalid='ignore'):
+        tally = np.cumsum(np.where(sign > 0, volume, np.where(sign < 0, -volume, 0.)), axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return np.log(tally - np.nanmin(tally, axis=0) + 1)
+
+def _stc(macd):
+    k_min = _rolling(macd, 10, "min")
+    k_max = _rolling(macd, 10, "max")
+    stoch_k = _divide(macd - k_min, k_max - k_min) * 100
+    stoch_d = _rolling(stoch_k, 3, "mean")
+    return _rolling(stoch_d, 3, "mean")
+
+def _target(trend):
+    result = np.full(trend.shape, np.nan)
+    result[:-1] = trend[1:]
+    return result
+
+#
+# fixed nodes
+#
+g_nodes = {
+    "close_diff": Node(["close"], lambda close: _diff(close)),
+    "close_sign": Node(["close_diff"], _sign),
+    "adj_close_sign": Node(["adj_close"], lambda adj_close: _sign(_diff(adj_close))),
+    "prev_close": Node(["close"], lambda close: _shift(close, 1)),
+    # rows from the first close : the missing values are filled from there (the series of a panel start at different rows)
+    "started": Node(["close"], lambda close: np.maximum.accumulate(~np.isnan(close), axis=0), dtype=bool),
+    "typical_price": Node(["close", "high", "low"], lambda close, high, low: (close + high + low) / 3.),
+
+    "macd": Node(["ema_12", "ema_26"], lambda ema_12, ema_26: ema_12 - ema_26),
+    "macds": Node(["macd"], lambda macd: _ewm(macd, span=9)),
+    "macdh": Node(["macd", "macds"], lambda macd, macds: macd - macds),
+
+    "close_std_20": Node(["close"], lambda close: _rolling(close, 20, "std")),
+    "bb_upper": Node(["sma_20", "close_std_20"], lambda sma, std: sma + 2 * std),
+    "bb_middle": Node(["sma_20"], lambda sma: sma),
+    "bb_lower": Node(["sma_20", "close_std_20"], lambda sma, std: sma - 2 * std),
+
+    "highest_high_14": Node(["high"], lambda high: _rolling(high, 14, "max")),
+    "lowest_low_14": Node(["low"], lambda low: _rolling(low, 14, "min")),
+    "williams_%r": Node(["highest_high_14", "lowest_low_14", "close"],
+                        lambda hh, ll, close: _divide(hh - close, hh - ll) * -100),
+    "stoch_%k": Node(["highest_high_14", "lowest_low_14", "close"],
+                     lambda hh, ll, close: _divide(close - ll, hh - ll) * 100),
+    "stoch_%d": Node(["stoch_%k"], lambda stoch_k: _rolling(stoch_k, 3, "mean")),
+
+    "er": Node(["close", "close_diff"],
+               lambda close, close_diff: _divide(np.abs(_diff(close, 10)), _rolling(np.abs(close_diff), 10, "sum"))),
+
+    "macd_stc": Node(["ema_23", "ema_50"], lambda ema_23, ema_50: ema_23 - ema_50),
+    "stc": Node(["macd_stc"], lambda macd: _stc(macd)),
+
+    "tr": Node(["high", "low", "prev_close"], _true_range),
+    "tr_filled": Node(["high", "low", "prev_close", "close", "started"], _true_range_filled),
+    "atr": Node(["tr"], lambda tr: _rolling(tr, 14, "mean")),
+    "plus_dm": Node(["high", "low", "started"], lambda high, low, started: _directional_move(_diff(high), -_diff(low), started)),
+    "minus_dm": Node(["high", "low", "started"], lambda high, low, started: _directional_move(-_diff(low), _diff(high), started)),
+    "di_plus": Node(["plus_dm", "atr"], lambda plus_dm, atr: 100 * _ewm(_divide(plus_dm, atr), alpha=1. / 14)),
+    "di_minus": Node(["minus_dm", "atr"], lambda minus_dm, atr: 100 * _ewm(_divide(minus_dm, atr), alpha=1. / 14)),
+    "adx": Node(["di_plus", "di_minus"],
+                lambda dip, dim: 100 * _ewm(_divide(np.abs(dip - dim), dip + dim), alpha=1. / 14)),
+
+    "roc": Node(["close"], lambda close: _divide(_diff(close, 12), _shift(close, 12)) * 100),
+    "mom": Node(["close"], lambda close: _diff(close, 10)),
+    "simple_rtn": Node(["close"], _simple_return),
+    # ref : https://medium.com/analytics-vidhya/analysis-of-stock-price-predictions-using-lstm-models-f993faa524c4
+    "on_balance_volume": Node(["adj_close_sign", "volume"], _on_balance_volume),
+
+    # trend_1d shifted to place on the same row the features and the trend of the next day
+    "target": Node(["trend_1d"], lambda trend: _target(trend), lookahead=1),
+}
+
+#
+# parameterized nodes : pattern of the name, function of the parameter returning the node
+#
+g_parameterized_nodes = [
+    ("sma_{}", lambda seq: Node(["close"], lambda close: _rolling(close, seq, "mean"))),
+    ("ema_{}", lambda period: Node(["close"], lambda close: _ewm(close, span=period))),
+    ("wma_{}", lambda period: Node(["close"], lambda close: _wma(close, period))),
+    ("trend_{}d", lambda seq: Node(["close_sign"], lambda sign: (sign > 0).astype(np.int64), dtype=np.int64) if seq == 1
+                              else Node(["close"], lambda close: _trend(close, seq), dtype=np.int64)),
+    ("rsi_{}", lambda window: Node(["close_diff", "started"], lambda close_diff, started: _rsi(close_diff, started, window))),
+    ("cci_{}", lambda window: Node(["typical_price"], lambda tp: _cci(tp, window))),
+    ("dx_{}", lambda window: Node(["plus_dm", "minus_dm", "tr_filled"], lambda pdm, mdm, tr: _dx(pdm, mdm, tr, window))),
+]
+
+# indicators with several output columns
+g_outputs = {
+    "bbands": ["bb_upper", "bb_middle", "bb_lower"]
+}
+
+def get_node(name):
+    if name in g_nodes:
+        return g_nodes[name]
+    for pattern, factory in g_parameterized_nodes:
+        parsed = parse(pattern, name)
+        if parsed != None and parsed[0].isdigit() and int(parsed[0]) > 0:
+            return factory(int(parsed[0]))
+    return None
+
+def get_outputs(indicator):
+    '''
+    return the columns computed for indicator or None if the indicator is not in the registry
+    '''
+    if indicator in g_outputs:
+        return g_outputs[indicator]
+    if indicator in g_sources or get_node(indicator) is None:
+        return None
+    return [indicator]
+
+def get_graph(outputs):
+    '''
+    return the nodes needed to compute outputs, each node being after its inputs, and the nodes of the graph
+    '''
+    order = []
+    nodes = {}
+    visiting = set()
+
+    def visit(name):
+        if name in nodes:
+            return
+        if name in visiting:
+            raise ValueError("[get_graph] cycle on {}".format(name))
+        if name in g_sources:
+            nodes[name] = None
+            order.append(name)
+            return
+        node = get_node(name)
+        if node is None:
+            raise ValueError("[get_graph] unknown node {}".format(name))
+        visiting.add(name)
+        for node_input in node.inputs:
+            visit(node_input)
+        visiting.remove(name)
+        nodes[name] = node
+        order.append(name)
+
+    for output in outputs:
+        visit(output)
+    return order, nodes
+
+def get_missing_sources(output, available):
+    '''
+    available: names of the available sources
+    return the sources needed to compute output which are not available (nor their fallback)
+    '''
+    order, nodes = get_graph([output])
+    return [name for name in order if nodes[name] is None and name not in available and g_fallbacks.get(name) not in available]
+
+def get_lookahead(name, nodes):
+    '''
+    number of next rows used to compute the node name (nodes from get_graph)
+    '''
+    if nodes[name] is None:
+        return 0
+    return nodes[name].lookahead + max([get_lookahead(node_input, nodes) for node_input in nodes[name].inputs], default=0)
+
+def compute(sources, outputs, dtype=float, out=None):
+    '''
+    sources: function returning the values (float array) of a source column (close, high...),
+             raising KeyError if the source is missing (the fallback source is then used)
+    outputs: names of the nodes to compute
+    dtype: type of the block (float32 to halve its size, the nodes being computed in float64)
+    out: preallocated block (rows, len(outputs), ...) receiving all the outputs, used as the returned block
+    return the float outputs written in one block (rows, n_float_outputs), the names of its columns,
+    and a dict with the values of the other outputs
+    '''
+    order, nodes = get_graph(outputs)
+
+    # number of nodes still to compute that use each node : the intermediate values are released when unused
+    consumers = dict.fromkeys(order, 0)
+    for name in order:
+        if nodes[name]:
+            for node_input in nodes[name].inputs:
+                consumers[node_input] += 1
+
+    values = {}
+    block = out
+    if out is None:
+        block_columns = [output for output in outputs if output in g_sources or nodes[output].dtype == float]
+    else:
+        block_columns = list(outputs)
+    others = {}
+    for name in order:
+        if nodes[name] is None:
+            try:
+                value = sources(name)
+            except KeyError:
+                if name not in g_fallbacks:
+                    raise
+                value = sources(g_fallbacks[name])
+        else:
+            value = nodes[name].compute(*[values[node_input] for node_input in nodes[name].inputs])
+            for node_input in nodes[name].inputs:
+                consumers[node_input] -= 1
+                if consumers[node_input] == 0:
+                    del values[node_input]
+
+        if name in block_columns:
+            if block is None:
+                block = np.empty((len(value), len(block_columns)) + value.shape[1:], dtype=dtype)
+            block[:, block_columns.index(name)] = value
+            if block.dtype == value.dtype:
+                value = block[:, block_columns.index(name)]
+        elif name in outputs:
+            others[name] = value
+        if consumers[name] > 0:
+            values[name] = value
+
+    return block, block_columns, others
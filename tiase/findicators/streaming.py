@@ -0,0 +1,516 @@
+"""
+Streaming technical indicators
+the state of each indicator is updated in constant time with each new bar (no recomputation of the history)
+the values after a bar are the ones of add_technical_indicators on the history up to this bar
+the states of all the tickers can be saved to disk and reloaded to resume the updates
+"""
+import os
+import math
+import json
+from collections import deque
+from parse import parse
+
+#
+# components : state updated with each new value
+#
+class Component:
+
+    def get_state(self):
+        state = {}
+        for key, value in vars(self).items():
+            if isinstance(value, Component):
+                value = value.get_state()
+            elif isinstance(value, deque):
+                value = list(value)
+            state[key] = value
+        return state
+
+    def set_state(self, state):
+        for key, value in state.items():
+            current = getattr(self, key)
+            if isinstance(current, Component):
+                current.set_state(value)
+            elif isinstance(current, deque):
+                setattr(self, key, deque([tuple(item) if isinstance(item, list) else item for item in value], maxlen=current.maxlen))
+            else:
+                setattr(self, key, value)
+
+class Ewm(Component):
+    '''
+    exponentially weighted mean (as pandas ewm with adjust=True), the missing values only decay the weights
+    '''
+    def __init__(self, span=None, alpha=None):
+        if alpha is None:
+            alpha = 2. / (span + 1.)
+        self.decay = 1. - alpha
+        self.weighted_sum = 0.
+        self.weights = 0.
+
+    def update(self, x):
+        self.weighted_sum *= self.decay
+        self.weights *= self.decay
+        if not math.isnan(x):
+            self.weighted_sum += x
+            self.weights += 1.
+        if self.weights == 0.:
+            return math.nan
+        return self.weighted_sum / self.weights
+
+class Rolling(Component):
+    '''
+    sum of the last size values, nan until size values are available or if one of them is missing
+    '''
+    def __init__(self, size):
+        self.size = size
+        self.values = deque(maxlen=size)
+        self.sum = 0.
+        self.missing = 0
+
+    def update(self, x):
+        if len(self.values) == self.size:
+            oldest = self.values[0]
+            if math.isnan(oldest):
+                self.missing -= 1
+            else:
+                self.sum -= oldest
+        self.values.append(x)
+        if math.isnan(x):
+            self.missing += 1
+        else:
+            self.sum += x
+        if len(self.values) < self.size or self.missing > 0:
+            return math.nan
+        return self.sum
+
+    def mean(self, x):
+        return self.update(x) / self.size
+
+class RollingExtremum(Component):
+    '''
+    max (or min) of the last size values with a monotonic queue, nan as Rolling
+    '''
+    def __init__(self, size, maximum=True):
+        self.size = size
+        self.sign = 1. if maximum else -1.
+        self.queue = deque()
+        self.count = 0
+        self.last_missing = -size
+
+    def update(self, x):
+        position = self.count
+        self.count += 1
+        if math.isnan(x):
+            self.last_missing = position
+        else:
+            while self.queue and self.queue[-1][1] * self.sign <= x * self.sign:
+                self.queue.pop()
+            self.queue.append((position, x))
+        while self.queue and self.queue[0][0] <= position - self.size:
+            self.queue.popleft()
+        if self.count < self.size or self.last_missing > position - self.size or not self.queue:
+            return math.nan
+        return self.queue[0][1]
+
+class Lag(Component):
+    '''
+    value of size bars ago
+    '''
+    def __init__(self, size):
+        self.values = deque(maxlen=size + 1)
+
+    def update(self, x):
+        self.values.append(x)
+        if len(self.values) < self.values.maxlen:
+            return math.nan
+        return self.values[0]
+
+class RollingMoments(Component):
+    '''
+    mean and standard deviation (ddof=1) of the last size values with Welford's updates, nan as Rolling
+    '''
+    def __init__(self, size):
+        self.size = size
+        self.values = deque(maxlen=size)
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.
+        self.missing = 0
+
+    def update(self, x):
+        if len(self.values) == self.size:
+            oldest = self.values[0]
+            if math.isnan(oldest):
+                self.missing -= 1
+            else:
+                self.count -= 1
+                if self.count == 0:
+                    self.mean = 0.
+                    self.m2 = 0.
+                else:
+                    delta = oldest - self.mean
+                    self.mean -= delta / self.count
+                    self.m2 -= delta * (oldest - self.mean)
+        self.values.append(x)
+        if math.isnan(x):
+            self.missing += 1
+        else:
+            self.count += 1
+            delta = x - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (x - self.mean)
+        if len(self.values) < self.size or self.missing > 0:
+            return math.nan, math.nan
+        if self.count < 2:
+            return self.mean, math.nan
+        return self.mean, math.sqrt(max(self.m2, 0.) / (self.count - 1))
+
+class EwmMoments(Component):
+    '''
+    exponentially weighted mean and standard deviation, the updates of pandas ewm (adjust=True) mean and std
+    '''
+    def __init__(self, span=None, alpha=None):
+        if alpha is None:
+            alpha = 2. / (span + 1.)
+        self.decay = 1. - alpha
+        self.mean = math.nan
+        self.cov = 0.
+        self.sum_weights = 1.
+        self.sum_squared_weights = 1.
+        self.old_weight = 1.
+
+    def update(self, x):
+        if not math.isnan(self.mean):
+            self.sum_weights *= self.decay
+            self.sum_squared_weights *= self.decay * self.decay
+            self.old_weight *= self.decay
+            if not math.isnan(x):
+                old_mean = self.mean
+                if self.mean != x:
+                    self.mean = (self.old_weight * old_mean + x) / (self.old_weight + 1.)
+                self.cov = (self.old_weight * (self.cov + (old_mean - self.mean) * (old_mean - self.mean))
+                            + (x - self.mean) * (x - self.mean)) / (self.old_weight + 1.)
+                self.sum_weights += 1.
+                self.sum_squared_weights += 1.
+                self.old_weight += 1.
+        elif not math.isnan(x):
+            self.mean = x
+        numerator = self.sum_weights * self.sum_weights
+        denominator = numerator - self.sum_squared_weights
+        if denominator <= 0.:
+            return self.mean, math.nan
+        return self.mean, math.sqrt(max(numerator / denominator * self.cov, 0.))
+
+def divide(a, b):
+    if b == 0. or math.isnan(a) or math.isnan(b):
+        if b == 0. and not math.isnan(a) and a != 0.:
+            return math.copysign(math.inf, a) * math.copysign(1., b)
+        return math.nan
+    return a / b
+
+#
+# indicators : update with a bar and return the values of their outputs
+#
+class Sma(Component):
+    def __init__(self, seq):
+        self.name = "sma_" + str(seq)
+        self.rolling = Rolling(seq)
+
+    def update(self, bar):
+        return {self.name: self.rolling.mean(bar["close"])}
+
+class Ema(Component):
+    def __init__(self, period):
+        self.name = "ema_" + str(period)
+        self.ewm = Ewm(span=period)
+
+    def update(self, bar):
+        return {self.name: self.ewm.update(bar["close"])}
+
+class Wma(Component):
+    '''
+    the weighted sum is updated with the sum of the previous window : wsum += period * x - sum
+    '''
+    def __init__(self, period):
+        self.name = "wma_" + str(period)
+        self.period = period
+        self.rolling = Rolling(period)
+        self.weighted_sum = 0.
+
+    def update(self, bar):
+        x = bar["close"]
+        full = len(self.rolling.values) == self.period and self.rolling.missing == 0
+        previous_sum = self.rolling.sum
+        self.rolling.update(x)
+        if len(self.rolling.values) < self.period or self.rolling.missing > 0:
+            self.weighted_sum = math.nan
+            return {self.name: math.nan}
+        if full:
+            self.weighted_sum += self.period * x - previous_sum
+        else:
+            # first full window of valid values
+            self.weighted_sum = sum([(i + 1) * value for i, value in enumerate(self.rolling.values)])
+        return {self.name: self.weighted_sum / (self.period * (self.period + 1) / 2)}
+
+class Macd(Component):
+    def __init__(self):
+        self.ema_12 = Ewm(span=12)
+        self.ema_26 = Ewm(span=26)
+        self.signal = Ewm(span=9)
+
+    def update(self, bar):
+        macd = self.ema_12.update(bar["close"]) - self.ema_26.update(bar["close"])
+        macds = self.signal.update(macd)
+        return {"macd": macd, "macds": macds, "macdh": macd - macds}
+
+class Rsi(Component):
+    def __init__(self, window):
+        self.name = "rsi_" + str(window)
+        self.previous_close = math.nan
+        self.gains = Ewm(alpha=1. / window)
+        self.losses = Ewm(alpha=1. / window)
+
+    def update(self, bar):
+        change = bar["close"] - self.previous_close
+        if math.isnan(change):
+            change = 0.
+        self.previous_close = bar["close"]
+        p_ema = self.gains.update((change + abs(change)) / 2)
+        n_ema = self.losses.update((-change + abs(change)) / 2)
+        return {self.name: 100 - divide(100, 1. + divide(p_ema, n_ema))}
+
+class Extrema(Component):
+    '''
+    stochastic oscillator and williams %r, from the extrema of the last 14 bars
+    '''
+    def __init__(self):
+        self.highest_high = RollingExtremum(14, maximum=True)
+        self.lowest_low = RollingExtremum(14, maximum=False)
+        self.stoch_d = Rolling(3)
+
+    def update(self, bar):
+        hh = self.highest_high.update(bar["high"])
+        ll = self.lowest_low.update(bar["low"])
+        stoch_k = divide(bar["close"] - ll, hh - ll) * 100
+        return {"stoch_%k": stoch_k, "stoch_%d": self.stoch_d.mean(stoch_k),
+                "williams_%r": divide(hh - bar["close"], hh - ll) * -100}
+
+class Adx(Component):
+    def __init__(self):
+        self.previous = None
+        self.atr = Rolling(14)
+        self.di_plus = Ewm(alpha=1. / 14)
+        self.di_minus = Ewm(alpha=1. / 14)
+        self.adx = Ewm(alpha=1. / 14)
+
+    def update(self, bar):
+        high, low = bar["high"], bar["low"]
+        tr = abs(high - low)
+        plus_dm = 0.
+        minus_dm = 0.
+        if self.previous:
+            previous_high, previous_low, previous_close = self.previous
+            tr = max([value for value in [tr, abs(high - previous_close), abs(previous_close - low)] if not math.isnan(value)], default=math.nan)
+            up_move = high - previous_high
+            down_move = previous_low - low
+            if up_move > down_move and up_move > 0:
+                plus_dm = up_move
+            if down_move > up_move and down_move > 0:
+                minus_dm = down_move
+        self.previous = (high, low, bar["close"])
+
+        atr = self.atr.mean(tr)
+        dip = 100 * self.di_plus.update(divide(plus_dm, atr))
+        dim = 100 * self.di_minus.update(divide(minus_dm, atr))
+        adx = 100 * self.adx.update(divide(abs(dip - dim), dip + dim))
+        return {"atr": atr, "adx": adx}
+
+    def set_state(self, state):
+        super().set_state(state)
+        if self.previous:
+            self.previous = tuple(self.previous)
+
+class Change(Component):
+    '''
+    roc & mom
+    '''
+    def __init__(self):
+        self.close_10 = Lag(10)
+        self.close_12 = Lag(12)
+
+    def update(self, bar):
+        close = bar["close"]
+        close_12 = self.close_12.update(close)
+        return {"mom": close - self.close_10.update(close),
+                "roc": divide(close - close_12, close_12) * 100}
+
+class SimpleReturn(Component):
+    '''
+    as pct_change, the missing closes are replaced by the previous one
+    '''
+    def __init__(self):
+        self.previous_close = math.nan
+
+    def update(self, bar):
+        close = bar["close"]
+        if math.isnan(close):
+            close = self.previous_close
+        simple_rtn = divide(close, self.previous_close) - 1
+        self.previous_close = close
+        return {"simple_rtn": simple_rtn}
+
+class OnBalanceVolume(Component):
+    '''
+    the batch indicator is shifted by its minimum on the history : the minimum up to the current bar is used
+    '''
+    def __init__(self):
+        self.previous_close = math.nan
+        self.tally = 0.
+        self.minimum = 0.
+
+    def update(self, bar):
+        close = bar.get("adj_close", bar["close"])
+        if close > self.previous_close:
+            self.tally += bar["volume"]
+        elif close < self.previous_close:
+            self.tally -= bar["volume"]
+        self.previous_close = close
+        self.minimum = min(self.minimum, self.tally)
+        return {"on_balance_volume": math.log(self.tally - self.minimum + 1)}
+
+class OutlierFilter(Component):
+    '''
+    the simple return of a close beyond mean +/- n_sigmas * std of the simple returns of the last size bars
+    (rolling with moments="mam", exponentially weighted with moments="ema") is replaced by this boundary
+    update returns the filtered close and the simple return of the raw closes
+    '''
+    def __init__(self, n_sigmas, moments="mam", size=21):
+        self.n_sigmas = n_sigmas
+        self.simple_rtn = SimpleReturn()
+        if moments == "mam":
+            self.moments = RollingMoments(size)
+        elif moments == "ema":
+            self.moments = EwmMoments(span=size)
+        else:
+            raise ValueError("unknown moments : {}".format(moments))
+        self.previous_close = math.nan
+        self.count = 0
+
+    def update(self, bar):
+        close = bar["close"]
+        simple_rtn = self.simple_rtn.update(bar)["simple_rtn"]
+        mean, std = self.moments.update(simple_rtn)
+        boundary = std * self.n_sigmas
+        if simple_rtn > mean + boundary or simple_rtn < mean - boundary:
+            simple_rtn = mean + boundary * (1. if simple_rtn > 0 else -1.)
+
+        previous_close = self.previous_close
+        self.previous_close = close
+        self.count += 1
+        if self.count == 1:
+            return {"close": close, "simple_rtn": math.nan}
+        return {"close": previous_close + simple_rtn * previous_close,
+                "simple_rtn": divide(close - previous_close, previous_close)}
+
+    def filter(self, close):
+        '''
+        batch mode : update with each value of the array close
+        return the arrays of the filtered closes and of the simple returns
+        '''
+        filtered = [self.update({"close": float(value)}) for value in close]
+        return [values["close"] for values in filtered], [values["simple_rtn"] for values in filtered]
+
+# name of the indicator -> (key of the component computing it, function returning the component)
+g_components = {
+    "macd": ("macd", Macd), "macds": ("macd", Macd), "macdh": ("macd", Macd),
+    "stoch_%k": ("extrema", Extrema), "stoch_%d": ("extrema", Extrema), "williams_%r": ("extrema", Extrema),
+    "atr": ("adx", Adx), "adx": ("adx", Adx),
+    "roc": ("change", Change), "mom": ("change", Change),
+    "simple_rtn": ("simple_rtn", SimpleReturn),
+    "on_balance_volume": ("on_balance_volume", OnBalanceVolume)
+}
+
+g_parameterized_components = [("sma_{}", Sma), ("ema_{}", Ema), ("wma_{}", Wma), ("rsi_{}", Rsi)]
+
+def get_component(indicator):
+    if indicator in g_components:
+        return g_components[indicator]
+    for pattern, component in g_parameterized_components:
+        parsed = parse(pattern, indicator)
+        if parsed != None and parsed[0].isdigit() and int(parsed[0]) > 0:
+            return indicator, lambda: component(int(parsed[0]))
+    return None
+
+class StreamingIndicators:
+    '''
+    indicators of one ticker
+    '''
+    def __init__(self, indicators):
+        self.indicators = []
+        self.components = {}
+        for indicator in indicators:
+            component = get_component(indicator)
+            if component is None:
+                print("!!! StreamingIndicators !!! unknown indicator : {}".format(indicator))
+                continue
+            key, factory = component
+            if key not in self.components:
+                self.components[key] = factory()
+            self.indicators.append(indicator)
+
+    def update(self, bar):
+        '''
+        bar: dict (or Series) with open, high, low, close, volume (and adj_close)
+        return a dict with the values of the indicators after this bar
+        '''
+        bar = {str(key).lower().replace(' ', '_'): float(value) for key, value in dict(bar).items()}
+        values = {}
+        for component in self.components.values():
+            values.update(component.update(bar))
+        return {indicator: values[indicator] for indicator in self.indicators}
+
+    def get_state(self):
+        return {key: component.get_state() for key, component in self.components.items()}
+
+    def set_state(self, state):
+        for key, component_state in state.items():
+            self.components[key].set_state(component_state)
+
+class StreamingEngine:
+    '''
+    streaming indicators of several tickers
+    '''
+    def __init__(self, indicators):
+        self.indicators = indicators
+        self.tickers = {}
+
+    def get_ticker(self, ticker):
+        if ticker not in self.tickers:
+            self.tickers[ticker] = StreamingIndicators(self.indicators)
+        return self.tickers[ticker]
+
+    def update(self, ticker, bar):
+        return self.get_ticker(ticker).update(bar)
+
+    def warm_up(self, ticker, df):
+        '''
+        feed the bars of the history df of ticker (lower case columns) and return the values after the last bar
+        '''
+        values = None
+        stream = self.get_ticker(ticker)
+        for bar in df.to_dict('records'):
+            values = stream.update(bar)
+        return values
+
+    def save(self, filename):
+        state = {"indicators": self.indicators, "tickers": {ticker: stream.get_state() for ticker, stream in self.tickers.items()}}
+        with open(filename + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(filename + ".tmp", filename)
+
+    def load(self, filename):
+        with open(filename) as f:
+            state = json.load(f)
+        self.indicators = state["indicators"]
+        self.tickers = {}
+        for ticker, ticker_state in state["tickers"].items():
+            self.get_ticker(ticker).set_state(ticker_state)
@@ -1,42 +1,79 @@
+"""
+Volume spread analysis features
+the features of all the windows are computed on numpy arrays and written in one matrix
+"""
 import numpy as np
 import pandas as pd
 
-def create_hlcv(df, i):
+def _rolling(values, window, method):
+    # pandas rolling reduction : nan if a value of the window is missing
+    return getattr(pd.Series(values, copy=False).rolling(window), method)().to_numpy()
+
+def _full_windows(values, window):
+    # True on the rows whose window has no missing value
+    missing = np.concatenate([[0], np.cumsum(np.isnan(values))])
+    full = np.zeros(len(values), dtype=bool)
+    full[window - 1:] = missing[window:] - missing[:len(values) - window + 1] == 0
+    return full
+
+def _shift(values, periods):
+    result = np.full(len(values), np.nan)
+    if periods > 0:
+        result[periods:] = values[:max(len(values) - periods, 0)]
+    elif periods < 0:
+        result[:periods] = values[-periods:]
+    else:
+        result[:] = values
+    return result
+
+def _pct_change(values, periods=1):
+    # pandas pct_change : the missing values are filled with the previous ones
+    filled = values[np.maximum.accumulate(np.where(np.isnan(values), 0, np.arange(len(values))))]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return filled / _shift(filled, periods) - 1
+
+def get_hlcv(high, low, close, volume, i):
     '''
     #i: days
+    highest high, lowest low, close and sum of the volumes of the windows of i days
     '''
-    df[f'high_{i}D'] = df.high.rolling(i).max()
-    df[f'low_{i}D'] = df.low.rolling(i).min()
-    df[f'close_{i}D'] = df.close.rolling(i). \
-        apply(lambda x: x[-1])
-    df[f'volume_{i}D'] = df.volume.rolling(i).sum()
+    return _rolling(high, i, "max"), _rolling(low, i, "min"), np.where(_full_windows(close, i), close, np.nan), _rolling(volume, i, "sum")
 
-    return df
+def get_vsa_features(high, low, close, volume, i):
+    high, low, close, volume = get_hlcv(high, low, close, volume, i)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        close_loc = (high - close) / (high - low)
+    return [_pct_change(volume), _pct_change(high - low), close_loc, _pct_change(close, -i)]
 
+def get_vsa_columns(i):
+    return ['vsa_' + f'volume_{i}D', 'vsa_' + f'price_spread_{i}D', 'vsa_' + f'close_loc_{i}D', 'vsa_' + f'close_change_{i}D']
 
-def create_vsa_features(df, i):
-    df = create_hlcv(df, i)
-    high = df[f'high_{i}D']
-    low = df[f'low_{i}D']
-    close = df[f'close_{i}D']
-    volume = df[f'volume_{i}D']
+def _get_sources(df):
+    return [df[column].to_numpy(dtype=float) for column in ["high", "low", "close", "volume"]]
+
+def create_hlcv(df, i):
+    '''
+    #i: days
+    return the high, low, close and volume of the windows of i days (df is unchanged)
+    '''
+    values = get_hlcv(*_get_sources(df), i)
+    return pd.DataFrame(np.column_stack(values), index=df.index,
+                        columns=[f'high_{i}D', f'low_{i}D', f'close_{i}D', f'volume_{i}D'])
 
-    features = pd.DataFrame(index=df.index)
-    features['vsa_' + f'volume_{i}D'] = volume.pct_change()
-    features['vsa_' + f'price_spread_{i}D'] = (high - low).pct_change()
-    features['vsa_' + f'close_loc_{i}D'] = (high - close) / (high - low)
-    features['vsa_' + f'close_change_{i}D'] = close.pct_change(-i)
 
-    return features
+def create_vsa_features(df, i):
+    return pd.DataFrame(np.column_stack(get_vsa_features(*_get_sources(df), i)), index=df.index, columns=get_vsa_columns(i))
 
 
 def create_bunch_of_vsa_features(df, days):
-    df_close_copy = df.close.copy()
-    bunch_of_features = pd.DataFrame(index=df.index)
-    for day in days:
-        f = create_vsa_features(df, day)
-        bunch_of_features = bunch_of_features.join(f)
-
-    frames = [df_close_copy, bunch_of_features]
-    bunch_of_features = pd.concat(frames, axis=1)
-    return bunch_of_features
\ No newline at end of file
+    '''
+    return the close and the vsa features of the windows days (df is unchanged)
+    '''
+    sources = _get_sources(df)
+    features = np.empty((len(df), 1 + 4 * len(days)))
+    features[:, 0] = sources[2]
+    columns = ["close"]
+    for position, day in enumerate(days):
+        features[:, 1 + 4 * position:5 + 4 * position] = np.column_stack(get_vsa_features(*sources, day))
+        columns.extend(get_vsa_columns(day))
+    return pd.DataFrame(features, index=df.index, columns=columns)
@@ -65,26 +65,17 @@ class Classifier(metaclass = ABCMeta):
         results["accuracies"] = []
         results["average_accuracy"] = 0
 
-        lst_cv_splits = ds.split()
-
         # data for debug
         dump_analysis = pd.DataFrame(columns=dump_data_to_df)
         dump_predictions = pd.DataFrame(columns=['iteration','y_test','y_test_prob','y_test_pred'])
        
-        for index_lst_split in range(len(lst_cv_splits[0])):
-            split_index = len(lst_cv_splits[0][index_lst_split])
-            frames = [lst_cv_splits[0][index_lst_split], lst_cv_splits[1][index_lst_split]]
-            df_cv = pd.concat(frames)
-
-            self.X_train, self.y_train, self.X_test, self.y_test, self.x_normaliser = set_train_test_data(df_cv, self.seq_len, split_index, target)
-
-            ds_tmp=data_splitter.DataSplitterCustom()
-            ds_tmp.X_train = self.X_train
-            ds_tmp.y_train = self.y_train
-            ds_tmp.X_test = self.X_test
-            ds_tmp.y_test = self.y_test
-            ds_tmp.normalizer = self.x_normaliser
-            self.fit(ds_tmp)
+        for index_lst_split, ds_fold in enumerate(ds.get_fold_data_splitters(self.seq_len, target)):
+            self.X_train = ds_fold.X_train
+            self.y_train = ds_fold.y_train
+            self.X_test = ds_fold.X_test
+            self.y_test = ds_fold.y_test
+            self.x_normaliser = ds_fold.normalizer
+            self.fit(ds_fold)
 
             current_analysis = self.get_analysis()
             results["accuracies"].append(current_analysis["accuracy"])
@@ -1,4 +1,5 @@
 from . import toolbox,analysis,classifier
+from .data_splitter import flatten_windows
 from scikeras.wrappers import KerasClassifier
 import xml.etree.cElementTree as ET
 
@@ -16,6 +17,23 @@ from keras import Model
 from tensorflow import keras
 from tensorflow.keras import layers
 
+class WindowSequence(keras.utils.Sequence):
+    '''
+    keras view of data_splitter.WindowBatches : the windows are built batch by batch during the training
+    model: initialized KerasClassifier whose encoders are applied to the batches
+    '''
+    def __init__(self, batches, model):
+        super().__init__()
+        self.batches = batches
+        self.model = model
+
+    def __len__(self):
+        return len(self.batches)
+
+    def __getitem__(self, index):
+        x, y = self.batches[index]
+        return self.model.feature_encoder_.transform(x), self.model.target_encoder_.transform(y)
+
 #
 # Simple LSTM for Sequence Classification
 # https://machinelearningmastery.com/sequence-classification-lstm-recurrent-neural-networks-python-keras/
@@ -41,12 +59,19 @@ class ClassifierLSTM(classifier.Classifier):
     def fit(self, data_splitter):
         
         self.data_splitter = data_splitter
-        self.X_train = self.data_splitter.X_train
+        # lazy data splitter : the flattened windows are never built as a whole
+        self.lazy = getattr(self.data_splitter, 'lazy', False)
+        if self.lazy:
+            self.X_train = self.data_splitter.X_train_3d
+            self.X_test = self.data_splitter.X_test_3d
+            self.input_size = self.X_train.shape[1] * self.X_train.shape[2]
+        else:
+            self.X_train = self.data_splitter.X_train
+            self.X_test = self.data_splitter.X_test
+            self.input_size = self.X_train.shape[1]
         self.y_train = self.data_splitter.y_train
-        self.X_test = self.data_splitter.X_test
         self.y_test = self.data_splitter.y_test
         self.x_normaliser = self.data_splitter.normalizer
-        self.input_size = self.X_train.shape[1]
 
         self.n_classes = 2
         if hasattr(self.data_splitter, 'df'):
@@ -59,7 +84,16 @@ class ClassifierLSTM(classifier.Classifier):
         self.build()
 
         #print(self.model.summary())
-        self.history = self.model.fit(self.X_train, self.y_train, validation_data=(self.X_test, self.y_test), epochs=self.epochs, batch_size=self.batch_size, verbose=0)
+        if self.lazy:
+            # the model is initialized with one window per class so that the encoders know all the classes
+            _, first_indexes = np.unique(self.y_train, return_index=True)
+            self.model.initialize(flatten_windows(self.X_train[first_indexes]), self.y_train[first_indexes])
+            train_sequence = WindowSequence(self.data_splitter.get_train_batches(self.batch_size), self.model)
+            test_sequence = WindowSequence(self.data_splitter.get_test_batches(self.batch_size), self.model)
+            self.history = self.model.model_.fit(train_sequence, validation_data=test_sequence, epochs=self.epochs, verbose=0)
+            self.model.history_ = self.history.history
+        else:
+            self.history = self.model.fit(self.X_train, self.y_train, validation_data=(self.X_test, self.y_test), epochs=self.epochs, batch_size=self.batch_size, verbose=0)
 
     def get_model(self):
         return self.model
@@ -68,7 +102,11 @@ class ClassifierLSTM(classifier.Classifier):
         return self.param_grid
 
     def get_analysis(self):
-        self.y_test_prob = self.model.predict(self.X_test)
+        if self.lazy:
+            test_batches = self.data_splitter.get_test_batches(self.batch_size)
+            self.y_test_prob = np.concatenate([self.model.predict(test_batches[index][0]) for index in range(len(test_batches))])
+        else:
+            self.y_test_prob = self.model.predict(self.X_test)
 
         if self.n_classes == 2:
             self.threshold, self.y_test_pred = toolbox.get_classification_threshold("naive", self.y_test, self.y_test_prob)
@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+import math
 from sklearn import preprocessing
 from sklearn.model_selection import TimeSeriesSplit
 
@@ -7,6 +8,39 @@ from abc import ABCMeta, abstractmethod
 
 from tiase import findicators
 
+def get_windows(features, seq_len):
+    '''
+    zero-copy view (samples, seq_len, n_features) of the windows [i, i+seq_len[ of features (rows, n_features)
+    '''
+    features = np.asarray(features)
+    n_windows = max(features.shape[0] - seq_len + 1, 0)
+    return np.lib.stride_tricks.as_strided(features, shape=(n_windows, seq_len, features.shape[1]),
+                                           strides=(features.strides[0], features.strides[0], features.strides[1]), writeable=False)
+
+def flatten_windows(windows):
+    '''
+    (samples, seq_len, n_features) -> (samples, n_features*seq_len) with the seq_len values of the first feature, then the second feature...
+    '''
+    return windows.transpose(0, 2, 1).reshape(windows.shape[0], windows.shape[1] * windows.shape[2])
+
+class WindowBatches:
+    '''
+    batches (x, y) of flattened windows, built on demand from a view of the windows
+    '''
+    def __init__(self, windows, targets, batch_size=32):
+        self.windows = windows
+        self.targets = targets
+        self.batch_size = batch_size
+
+    def __len__(self):
+        return math.ceil(len(self.windows) / self.batch_size)
+
+    def __getitem__(self, index):
+        if index < 0 or index >= len(self):
+            raise IndexError("[WindowBatches] batch {} out of range".format(index))
+        batch = slice(index * self.batch_size, (index + 1) * self.batch_size)
+        return flatten_windows(self.windows[batch]), self.targets[batch]
+
 class DataSplitter(metaclass = ABCMeta):
 
     @abstractmethod
@@ -20,11 +54,23 @@ class DataSplitterCustom(DataSplitter):
 class DataSplitterTrainTest(DataSplitter):
 
     @abstractmethod
-    def split_train_test(self, features, targets):
+    def get_windows(self, features):
+        ''' will be defined in the inherited classes '''
+        pass
+
+    @abstractmethod
+    def get_targets(self, targets):
         ''' will be defined in the inherited classes '''
         pass
 
-    def split(self, train_size):
+    def split_train_test(self, features, targets):
+        return flatten_windows(self.get_windows(features)), self.get_targets(targets)
+
+    def split(self, train_size, lazy=False):
+        '''
+        lazy: the flattened windows are not built, they can be read by batches with get_train_batches & get_test_batches
+        (X_train & X_test are built when they are read)
+        '''
         if train_size <= 1:
             split_index = int(self.df.shape[0] * train_size)
         else:
@@ -45,11 +91,53 @@ class DataSplitterTrainTest(DataSplitter):
 
         self.normalizer = preprocessing.MinMaxScaler()
 
-        train_normalised_features = self.normalizer.fit_transform(train_features)
-        test_normalised_features = self.normalizer.transform(test_features)
+        self.train_normalised_features = self.normalizer.fit_transform(train_features)
+        self.test_normalised_features = self.normalizer.transform(test_features)
+
+        self.lazy = lazy
+        if self.lazy:
+            self.X_train = None
+            self.X_test = None
+            self.y_train = self.get_targets(train_target)
+            self.y_test = self.get_targets(test_target)
+        else:
+            self.X_train, self.y_train = self.split_train_test(self.train_normalised_features, train_target)
+            self.X_test, self.y_test = self.split_train_test(self.test_normalised_features, test_target)
+
+    @property
+    def X_train(self):
+        if self._X_train is None and self.lazy:
+            self._X_train = flatten_windows(self.X_train_3d)
+        return self._X_train
+
+    @X_train.setter
+    def X_train(self, value):
+        self._X_train = value
+
+    @property
+    def X_test(self):
+        if self._X_test is None and self.lazy:
+            self._X_test = flatten_windows(self.X_test_3d)
+        return self._X_test
+
+    @X_test.setter
+    def X_test(self, value):
+        self._X_test = value
+
+    def get_train_batches(self, batch_size=32):
+        return WindowBatches(self.X_train_3d, self.y_train, batch_size)
+
+    def get_test_batches(self, batch_size=32):
+        return WindowBatches(self.X_test_3d, self.y_test, batch_size)
 
-        self.X_train, self.y_train = self.split_train_test(train_normalised_features, train_target)
-        self.X_test, self.y_test = self.split_train_test(test_normalised_features, test_target)
+    # zero-copy views (samples, seq_len, n_features) of the windows of X_train & X_test
+    @property
+    def X_train_3d(self):
+        return self.get_windows(self.train_normalised_features)
+
+    @property
+    def X_test_3d(self):
+        return self.get_windows(self.test_normalised_features)
 
     def dump(self):
         df_x_train = pd.DataFrame(self.X_train)
@@ -93,22 +181,17 @@ class DataSplitterTrainTestWithLag(DataSplitterTrainTest):
         self.y_train = None
         self.X_test = None
         self.y_test = None
+        self.train_normalised_features = None
+        self.test_normalised_features = None
         self.normalizer = None
+        self.lazy = False
 
-    def split_train_test(self, features, targets):
-        n_features = features.shape[1]
-        x_train = []
-        for i in range(len(features) - self.seq_len):
-            seq = []
-            for j in range(n_features):
-                seq.extend(features[:,j][i : i + self.seq_len].flatten())
-            x_train.append(seq)
-        x_train = np.array(x_train)
+    def get_windows(self, features):
+        # the last window has no next row
+        return get_windows(features, self.seq_len)[:max(len(features) - self.seq_len, 0)]
 
-        y_train = np.array([targets["target"][i + self.seq_len] for i in range(len(targets) - self.seq_len)])
-        y_train = np.expand_dims(y_train, 1)
-        
-        return x_train, y_train
+    def get_targets(self, targets):
+        return np.expand_dims(targets["target"].to_numpy()[self.seq_len:], 1)
 
 
 class DataSplitterTrainTestSimple(DataSplitterTrainTest):
@@ -128,62 +211,64 @@ class DataSplitterTrainTestSimple(DataSplitterTrainTest):
         self.y_train = None
         self.X_test = None
         self.y_test = None
+        self.train_normalised_features = None
+        self.test_normalised_features = None
         self.normalizer = None
+        self.lazy = False
 
-    def split_train_test(self, features, targets):
-        n_features = features.shape[1]
-        x_train = []
-        for i in range(len(features) - self.seq_len + 1):
-            seq = []
-            for j in range(n_features):
-                seq.extend(features[:,j][i : i + self.seq_len].flatten())
-            x_train.append(seq)
-        x_train = np.array(x_train)
+    def get_windows(self, features):
+        return get_windows(features, self.seq_len)
 
-        y_train = np.array([targets["target"][i + self.seq_len - 1] for i in range(len(targets) - self.seq_len + 1)]).astype(int)
-        y_train = np.expand_dims(y_train, 1)
-        
-        return x_train, y_train
+    def get_targets(self, targets):
+        return np.expand_dims(targets["target"].to_numpy()[self.seq_len - 1:].astype(int), 1)
 
 
 class DataSplitterForCrossValidation(DataSplitter):
+    '''
+    walk-forward folds : each test set follows its training set
+    gap: number of rows between the end of the training set and the beginning of the test set (purge)
+    '''
 
-    def __init__(self, df, nb_splits, max_train_size=500, test_size=100):
+    def __init__(self, df, nb_splits, max_train_size=500, test_size=100, gap=0):
         self.df = df
         self.nb_splits = nb_splits
         self.test_size = test_size
         self.max_train_size = max_train_size
+        self.gap = gap
 
-    def split(self):
-        tscv = TimeSeriesSplit(gap=0, max_train_size=self.max_train_size, n_splits=self.nb_splits, test_size=self.test_size)
-
-        list_df_training = []
-        list_df_testing = []
-        for split_index in tscv.split(self.df):
-            print("df size: ", len(self.df))
-            print("TRAIN:", split_index[0][0]," -> ", split_index[0][len(split_index[0])-1], " Size: ", split_index[0][len(split_index[0])-1] - split_index[0][0])
-            print("TEST: ", split_index[1][0], " -> ", split_index[1][len(split_index[1]) - 1], " Size: ", split_index[1][len(split_index[1])-1] - split_index[1][0])
-            print(" ")
-
-            train = [-1] * split_index[0][0]
-            train.extend(split_index[0].tolist().copy())
-            train.extend([-1] * (len(self.df) - len(train)))
-
-            test = [-1] * split_index[1][0]
-            test.extend(split_index[1].tolist().copy())
-            test.extend([-1] * (len(self.df) - len(test)))
-
-            self.df['train'] = train
-            self.df['test']  = test
-            df_train = self.df[self.df['train'] != -1]
-            df_test = self.df[self.df['test'] != -1]
-            self.df.drop(columns=['train'], inplace=True)
-            self.df.drop(columns=['test'], inplace=True)
-            df_train.drop(columns=['train'], inplace=True)
-            df_train.drop(columns=['test'], inplace=True)
-            df_test.drop(columns=['test'], inplace=True)
-            df_test.drop(columns=['train'], inplace=True)
-            list_df_training.append(df_train)
-            list_df_testing.append(df_test)
+    def get_folds(self):
+        '''
+        return the (train, test) slices of the rows of each fold
+        '''
+        tscv = TimeSeriesSplit(gap=self.gap, max_train_size=self.max_train_size, n_splits=self.nb_splits, test_size=self.test_size)
+        return [(slice(train[0], train[-1] + 1), slice(test[0], test[-1] + 1)) for train, test in tscv.split(self.df)]
 
+    def split(self):
+        folds = self.get_folds()
+        list_df_training = [self.df.iloc[train] for train, _ in folds]
+        list_df_testing = [self.df.iloc[test] for _, test in folds]
         return list_df_training, list_df_testing
+
+    def get_fold_data_splitters(self, seq_len, target="target"):
+        '''
+        yield for each fold a data splitter with the same data as DataSplitterTrainTestSimple for the rows of the fold
+        the features & targets are extracted once, each fold only fits its normalizer and windows its own rows
+        '''
+        features = self.df.drop(target, axis=1)
+        values = features.to_numpy(dtype=float)
+        targets = np.expand_dims(self.df[target].to_numpy().astype(int), 1)
+
+        for train, test in self.get_folds():
+            ds = DataSplitterCustom()
+            ds.normalizer = preprocessing.MinMaxScaler()
+            ds.normalizer.fit(features.iloc[train])
+
+            # same operations as MinMaxScaler.transform
+            train_normalised_features = values[train] * ds.normalizer.scale_ + ds.normalizer.min_
+            test_normalised_features = values[test] * ds.normalizer.scale_ + ds.normalizer.min_
+
+            ds.X_train = flatten_windows(get_windows(train_normalised_features, seq_len))
+            ds.y_train = targets[train][seq_len - 1:]
+            ds.X_test = flatten_windows(get_windows(test_normalised_features, seq_len))
+            ds.y_test = targets[test][seq_len - 1:]
+            yield ds
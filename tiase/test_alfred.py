@@ -1,12 +1,20 @@
-from tiase.fimport import fimport
+from tiase.fimport import fimport,store
+from tiase.findicators import findicators
 from tiase import alfred
+from tiase.toolbox import cache
 import numpy as np
 import pytest
 import os
 import filecmp
+import shutil
+import threadpoolctl
 
 g_generate_references = False
 
+def get_worker_threads():
+    # called in a worker of alfred.get_workers_pool
+    return os.environ.get("OPENBLAS_NUM_THREADS"), [info["num_threads"] for info in threadpoolctl.threadpool_info()]
+
 # todo : to move into classifier.load
 import xml.etree.cElementTree as ET
 def read_xml(xmlfile):
@@ -80,6 +88,112 @@ class TestAlfred:
         if os.path.isfile(out_file):
             os.remove(out_file) 
 
+    def test_import_store_schema(self):
+        # the source of AI.PA doesn't have the columns of the store : AI.PA is skipped, BN.PA is imported
+        root, folder = "./tmp/store_schema", "./tmp/store_schema_source"
+        shutil.rmtree(root, ignore_errors=True)
+        os.makedirs(folder, exist_ok=True)
+        for value in ["AI.PA", "BN.PA"]:
+            df = fimport.get_dataframe_from_csv("./tiase/data/CAC40/" + value + ".csv")
+            df.head(1000).to_csv(folder + "/" + value + ".csv")
+        store.import_from_csv_folder(folder, root)
+        df.to_csv(folder + "/BN.PA.csv")
+        fimport.get_dataframe_from_csv("./tiase/data/CAC40/AI.PA.csv").drop(columns=["Adj Close"]).to_csv(folder + "/AI.PA.csv")
+        for filename in ["./tmp/AI.PA_schema.csv", "./tmp/BN.PA_schema.csv"]:
+            if os.path.isfile(filename):
+                os.remove(filename)
+
+        with open("./tmp/alfred_store_schema.xml", "w") as f:
+            f.write('<dings><ding export="./tmp/"><import value="AI.PA,BN.PA" store="{}" source="csv" folder="{}" export="schema.csv"/></ding></dings>'.format(root, folder))
+        alfred.execute("./tmp/alfred_store_schema.xml", use_cache=False)
+        assert(not os.path.isfile("./tmp/AI.PA_schema.csv"))
+        assert(len(fimport.get_dataframe_from_csv("./tmp/BN.PA_schema.csv").index) == len(df.index))
+
+    def test_workers_threads(self):
+        environ = os.environ.get("OPENBLAS_NUM_THREADS")
+        with alfred.get_workers_pool(2, 3) as executor:
+            variable, threads = executor.submit(get_worker_threads).result()
+        # the variable is inherited by the spawned worker and the thread pools loaded by the worker are limited
+        assert(variable == "3")
+        assert(len(threads) > 0 and all([thread == 3 for thread in threads]))
+        assert(os.environ.get("OPENBLAS_NUM_THREADS") == environ)
+
+    def test_workers(self):
+        store.import_from_csv_folder("./tiase/data/CAC40", "./tmp/store_workers")
+        xml_file = "./tiase/data/test/alfred_workers.xml"
+        alfred.execute(xml_file)
+        with open("./tmp/report.csv") as f:
+            report = f.readlines()
+
+        # same results as the sequential execution, in the order of the values
+        ding = ET.parse(xml_file).getroot().find('ding')
+        dict_values = {}
+        for value in ["AI.PA", "BN.PA", "CA.PA"]:
+            df = store.get_dataframe_from_store(value, {"start": "2015-01-01"}, "./tmp/store_workers")
+            dict_values[value] = findicators.normalize_column_headings(df)
+        results = alfred.execute_values(ding, dict_values, "./tmp/", workers=1)
+        assert(len(report) == 1 + 3 * 3)
+        assert(list(dict.fromkeys([line.split(';')[0] for line in report[1:]])) == list(results.keys()))
+        for line in report[1:]:
+            value, classifier_id, accuracy = line.split(';')[:3]
+            assert(float(accuracy) == pytest.approx(results[value]["classifiers"][classifier_id]["accuracy"]))
+
+    def test_stage_cache(self):
+        stage_cache = cache.StageCache("./tmp/cache_test", max_size=1)
+        stage_cache.clear()
+        df = fimport.get_dataframe_from_csv("./tiase/data/test/google_stocks_data.csv")
+        key = stage_cache.get_key("features", df)
+        assert(key == stage_cache.get_key("features", df.copy()))
+        assert(key != stage_cache.get_key("preprocessing", df))
+
+        # the results of another version of the code are not reused
+        other_cache = cache.StageCache("./tmp/cache_test", max_size=1)
+        assert(other_cache.version == stage_cache.version and key == other_cache.get_key("features", df))
+        other_cache.version = "another version"
+        assert(key != other_cache.get_key("features", df))
+
+        computed = []
+        def compute():
+            computed.append(1)
+            return df.head(10)
+        assert(stage_cache.run(key, compute).equals(df.head(10)))
+        assert(stage_cache.run(key, compute).equals(df.head(10)))
+        assert(len(computed) == 1)
+
+        # least recently used entries are evicted
+        stage_cache.max_size = 0
+        stage_cache.set("other", df)
+        assert(stage_cache.get(key) == (False, None))
+
+        # a second execution loads the stages from the cache and gives the same result
+        alfred.execute("./tiase/data/test/alfred_indicators.xml")
+        df_first = fimport.get_dataframe_from_csv("./tmp/out.csv")
+        alfred.execute("./tiase/data/test/alfred_indicators.xml")
+        df_second = fimport.get_dataframe_from_csv("./tmp/out.csv")
+        assert(df_first.equals(df_second))
+        alfred.execute("./tiase/data/test/alfred_indicators.xml", use_cache=False)
+        assert(df_first.equals(fimport.get_dataframe_from_csv("./tmp/out.csv")))
+
+    def test_run_dag(self):
+        done = []
+        def task(node):
+            done.append(node)
+            return node.upper()
+
+        dependencies = {"voting": ["dt", "svc"], "grid": ["dt"], "unknown": ["foobar"]}
+        for workers in [1, 3]:
+            done.clear()
+            results, timings = alfred.run_dag(["voting", "dt", "grid", "svc", "unknown"], dependencies, task, workers)
+            assert(results == {"voting": "VOTING", "dt": "DT", "grid": "GRID", "svc": "SVC", "unknown": "UNKNOWN"})
+            assert(list(timings.keys()) == ["voting", "dt", "grid", "svc", "unknown"])
+            assert(done.index("dt") < done.index("voting") and done.index("svc") < done.index("voting"))
+            assert(done.index("dt") < done.index("grid"))
+            if workers == 1:
+                assert(done == ["dt", "grid", "svc", "voting", "unknown"])
+
+        with pytest.raises(ValueError):
+            alfred.run_dag(["a", "b"], {"a": ["b"], "b": ["a"]}, task)
+
     def test_summary(self):
         classifiers_list = alfred.summary()
 
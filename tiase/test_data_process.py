@@ -1,8 +1,8 @@
 import pandas as pd
 import numpy as np
 from tiase.fimport import fimport,synthetic,visu
-from tiase.findicators import findicators
-from tiase.fdatapreprocessing import fdataprep
+from tiase.findicators import findicators,streaming
+from tiase.fdatapreprocessing import fdataprep,fprep,fdiscretize,fpipeline
 from . import alfred
 import pytest
 
@@ -29,8 +29,14 @@ class TestDataProcess:
         df["high"][3] = -np.inf
 
         assert(df.shape[0] == 5)
+        df_copy = df.copy()
+        df_report, report = fprep.missing_values(df, report=True)
+        assert(df.equals(df_copy))
+        assert(report == {"rows": 5, "dropped_rows": 3, "columns": {"open": {"nan": 1, "inf": 0}, "close": {"nan": 0, "inf": 1}, "high": {"nan": 0, "inf": 1}}})
+
         df = fdataprep.process_technical_indicators(df, ['missing_values'])
         assert(df.shape[0] == 2)
+        assert(df.equals(df_report))
 
     def test_duplicates(self):
         data = {'A':[20, 21, 13, 21, 18], 'B':[18, 19, 23, 19, 17]}
@@ -58,6 +64,16 @@ class TestDataProcess:
         expected_df = fimport.get_dataframe_from_csv(ref_file)
         assert(df.equals(expected_df))
 
+    def test_discretization_rules(self):
+        data = {'close':[10, 12, 11, 13, 9], 'rsi_14':[20, 50, 45, 80, 75], 'sma_2':[11, 11, 12, 12, 10], 'obv':[1, 2, 2, 3, 1]}
+        df = pd.DataFrame(data)
+        rules = {"rsi_14": {"test": "thresholds", "low": 30, "high": 70}, "obv": {"test": "rising"}}
+        df = fdiscretize.data_discretization(df, ["rsi_14", "sma", "obv"], rules)
+        assert(df["rsi_14"].tolist() == [1, 1, 0, 0, 0])
+        assert(df["sma_2"].tolist() == [0, 1, 0, 1, 0])
+        assert(df["obv"].tolist() == [0, 1, 0, 1, 0])
+        assert(df["close"].tolist() == data["close"])
+
     def test_discretization_with_alfred(self):
         alfred.execute("./tiase/data/test/datapreprocess_alfred_discretization_supervised.xml")
         df_generated = fimport.get_dataframe_from_csv("./tmp/out.csv")
@@ -191,6 +207,54 @@ class TestDataProcess:
         array_expected = expected_df['simple_rtn'].to_numpy()
         assert(np.allclose(array, array_expected))
 
+    def test_outliers_several_features(self):
+        df = self.get_real_dataframe()
+        df = df.head(200)
+        df = findicators.add_technical_indicators(df, ['simple_rtn', 'rsi_30', 'atr'])
+        features = ['simple_rtn', 'rsi_30', 'atr']
+
+        # same values as the features processed one by one with pandas (missing values included)
+        df_clipped = fprep.normalize_outliers_std_cutoff(df.copy(), features, 2)
+        df_winsorized = fprep.normalize_outliers_winsorize(df.copy(), features, 0.03)
+        for feature in features:
+            mu, sigma = df[feature].mean(), df[feature].std()
+            assert(np.allclose(df_clipped[feature].to_numpy(), df[feature].clip(mu - 2 * sigma, mu + 2 * sigma).to_numpy(), equal_nan=True))
+            expected = df[feature].clip(df[feature].quantile(0.03), df[feature].quantile(0.97))
+            assert(np.allclose(df_winsorized[feature].to_numpy(), expected.to_numpy(), equal_nan=True))
+
+        # the rows with one of the features beyond its bounds are dropped at once
+        df_cut = fprep.cut_outliers_std_cutoff(df.copy(), features, 2)
+        outliers = np.zeros(len(df.index), dtype=bool)
+        for feature in features:
+            mu, sigma = df[feature].mean(), df[feature].std()
+            outliers |= ((df[feature] > mu + 2 * sigma) | (df[feature] < mu - 2 * sigma)).to_numpy()
+        assert(outliers.any())
+        assert(df_cut.index.equals(df.index[~outliers]))
+
+        # the features without values beyond their bounds keep their dtype
+        df['up'] = (df['simple_rtn'] > 0).astype(int)
+        for df_processed in [fprep.normalize_outliers_std_cutoff(df.copy(), features + ['up'], 2), fprep.normalize_outliers_winsorize(df.copy(), features + ['up'], 0.03)]:
+            assert(df_processed['up'].dtype == df['up'].dtype and df_processed['up'].equals(df['up']))
+            assert(df_processed['volume'].dtype == df['volume'].dtype)
+
+    def test_cut_outliers_std_cutoff_several_features(self):
+        df = self.get_real_dataframe()
+        df = df.head(200)
+
+        df = findicators.add_technical_indicators(df, ['simple_rtn', 'rsi_30', 'atr'])
+        df = fdataprep.process_technical_indicators(df, ['missing_values']) # shit happens
+        # the statistics of each feature are computed on all the rows
+        df = fdataprep.process_technical_indicators(df, ['outliers_cut_stdcutoff'], ['simple_rtn', 'rsi_30', 'atr'])
+        df = findicators.remove_features(df, ["high", "low", "open", "close", "adj_close", "volume"])
+
+        if g_generate_references:
+            df.to_csv("./tiase/data/test/datapreprocess_cut_outliers_std_cutoff_several_features_reference.csv")
+        expected_df = fimport.get_dataframe_from_csv("./tiase/data/test/datapreprocess_cut_outliers_std_cutoff_several_features_reference.csv")
+
+        assert(df.index.equals(expected_df.index))
+        for column in ['simple_rtn', 'rsi_30', 'atr']:
+            assert(np.allclose(df[column].to_numpy(), expected_df[column].to_numpy()))
+
     def test_normalize_outliers_normalize_mam(self):
         df = self.get_real_dataframe()
         df = df.head(200)
@@ -225,6 +289,32 @@ class TestDataProcess:
         array_expected = expected_df['close'].to_numpy()
         assert(np.allclose(array, array_expected))
 
+    def test_normalize_outliers_streaming(self):
+        df = self.get_real_dataframe()
+        df = df.head(200)
+        close = df['close'].to_numpy(dtype=float)
+
+        for moments in ["mam", "ema"]:
+            df_batch = fprep._normalize_outliers(df.copy(), 2.5, moments)
+
+            # bar by bar, the state being saved and reloaded halfway : same values as the batch
+            outlier_filter = streaming.OutlierFilter(2.5, moments)
+            values = [outlier_filter.update({"close": value}) for value in close[:100]]
+            state = outlier_filter.get_state()
+            outlier_filter = streaming.OutlierFilter(2.5, moments)
+            outlier_filter.set_state(state)
+            values.extend([outlier_filter.update({"close": value}) for value in close[100:]])
+
+            assert(np.array_equal([value["close"] for value in values], df_batch['close'].to_numpy(), equal_nan=True))
+            assert(np.array_equal([value["simple_rtn"] for value in values], df_batch['simple_rtn'].to_numpy(), equal_nan=True))
+
+        # the moments are the ones of pandas
+        simple_rtn = df['close'].pct_change()
+        rolling = streaming.RollingMoments(21)
+        assert(np.allclose([rolling.update(value) for value in simple_rtn], simple_rtn.rolling(21).agg(['mean', 'std']).to_numpy(), equal_nan=True))
+        ewm = streaming.EwmMoments(span=21)
+        assert(np.allclose([ewm.update(value) for value in simple_rtn], simple_rtn.ewm(span=21).agg(['mean', 'std']).to_numpy(), equal_nan=True))
+
     #
     # Transformations
     # 
@@ -266,3 +356,46 @@ class TestDataProcess:
         array = df['simple_rtn'].to_numpy()
         array_expected = expected_df['simple_rtn'].to_numpy()
         assert(np.allclose(array, array_expected))
+
+    #
+    # Fitted preprocessing
+    #
+
+    def test_pipeline(self):
+        df = self.get_real_dataframe()
+        technical_indicators = ['atr', 'mom', 'roc', 'rsi_30', 'simple_rtn']
+        df = findicators.add_technical_indicators(df, technical_indicators)
+        df = fdataprep.process_technical_indicators(df, ['missing_values'])
+        df_train = df.head(1000)
+
+        # same results as the preprocessing on the training data
+        preprocessing = ['outliers_normalize_stdcutoff', 'outliers_normalize_winsorize', 'discretization_unsupervised']
+        states_cache = {}
+        pipeline = fpipeline.get_pipeline(preprocessing, technical_indicators, states_cache)
+        df_fitted = pipeline.fit_transform(df_train)
+        df_expected = fdataprep.process_technical_indicators(df_train.copy(), preprocessing, technical_indicators)
+        assert(df_fitted.equals(df_expected))
+
+        # the statistics of the training data are applied to the new rows
+        df_transformed = pipeline.transform(df)
+        assert(df_transformed.head(1000).equals(df_expected))
+        row = pipeline.transform_row(df.iloc[-1])
+        assert(np.array_equal(row, df_transformed[pipeline.columns].iloc[-1].to_numpy()))
+
+        pipeline.save("./tmp/pipeline.joblib")
+        pipeline_loaded = fpipeline.Pipeline.load("./tmp/pipeline.joblib")
+        assert(np.array_equal(pipeline_loaded.transform_row(df.iloc[-1].to_dict()), row))
+        # the states of the other fits aren't saved
+        assert(pipeline_loaded.states_cache is None)
+
+        # fitted again on the same data, the states are reused
+        n_states = len(states_cache)
+        pipeline.fit(df_train)
+        assert(len(states_cache) == n_states)
+        pipeline.fit(df.tail(1000))
+        assert(len(states_cache) == 2 * n_states)
+        assert(pipeline.states_cache is states_cache)
+
+        # without cache, same results
+        pipeline_alone = fpipeline.get_pipeline(preprocessing, technical_indicators).fit(df.tail(1000))
+        assert(pipeline_alone.transform(df).equals(pipeline.transform(df)))
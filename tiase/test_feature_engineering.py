@@ -4,7 +4,7 @@ import os
 from tiase.fimport import fimport
 from tiase.findicators import findicators
 from tiase.fdatapreprocessing import fdataprep
-from tiase.featureengineering import fbalance,fprocessfeature
+from tiase.featureengineering import fbalance,fprocessfeature,fselection,fstationary
 from . import alfred
 import pytest
 
@@ -54,6 +54,31 @@ class TestFeatureEngineering:
                 assert(np.allclose(array, array_expected))
 
 
+    def test_correlation_reduction(self):
+        df = self.get_real_dataframe()
+        df = df.head(300)
+        df = findicators.add_technical_indicators(df, ['simple_rtn', 'target', 'rsi_30', 'atr', 'williams_%r', 'macd', 'macds', 'stoch_%k', 'stoch_%d', 'sma_5', 'ema_10', 'wma_15'])
+        df = fdataprep.process_technical_indicators(df, ['missing_values']) # shit happens
+        features = [column for column in df.columns if column not in ['simple_rtn', 'target']]
+
+        for method in ["pearson", "spearman"]:
+            for threshold in [0.95, 0.8]:
+                df_reduction, dropped = fselection.correlation_reduction(df, threshold, method, report=True)
+
+                # greedy clustering on the float64 correlation matrix of pandas
+                corr = df[features].corr(method=method).abs()
+                kept = []
+                for feature in features:
+                    if not any(corr.loc[feature, kept] > threshold):
+                        kept.append(feature)
+                assert(df_reduction.columns.to_list() == ['simple_rtn', 'target'] + kept)
+                assert(sorted(dropped) == sorted(set(features) - set(kept)))
+                for feature, kept_feature in dropped.items():
+                    assert(kept_feature in kept and corr.loc[feature, kept_feature] > threshold)
+
+        # same clusters computed by blocks
+        assert(fselection.get_correlated_features(df[features], block_size=3) == fselection.get_correlated_features(df[features]))
+
     def test_reduction_vsa(self):
         df = self.get_real_dataframe()
         df = df.head(200)
@@ -70,3 +95,69 @@ class TestFeatureEngineering:
             array = df_reduction[column].to_numpy()
             array_expected = expected_df_reduction[column].to_numpy()
             assert(np.allclose(array, array_expected))
+
+    def test_frac_diff_FFD(self):
+        df = self.get_real_dataframe()
+        df = np.log(df[["open", "close", "volume"]].head(1000).astype(float))
+        df.iloc[600, 1] = np.nan
+
+        # short windows (sum of shifted columns) and long windows (fft)
+        for d in [0.9, 0.3]:
+            w = fstationary.getWeights_FFD(d, 1e-4)
+            width = len(w) - 1
+            df_ffd = fstationary.trans_a_bunch_of_data_FFD(df, d=d, thres=1e-4)
+            assert(df_ffd.index.equals(df.index[width:]))
+            for column in df.columns:
+                expected = [np.dot(w.T, df[column].to_numpy()[i - width:i + 1])[0] for i in range(width, len(df))]
+                assert(np.allclose(df_ffd[column].to_numpy(), expected, equal_nan=True))
+                series = fstationary.transfer_data_by_frac_diff_FFD(df[column], d=d, thres=1e-4)
+                assert(np.allclose(series.to_numpy(), expected, equal_nan=True))
+
+        # memoized weights
+        w = fstationary.getWeights_FFD(0.5, 1e-4)
+        w[0] = 0.
+        assert(fstationary.getWeights_FFD(0.5, 1e-4)[0] != 0.)
+
+    def test_min_d_FFD(self):
+        df = self.get_real_dataframe()
+        df_log = np.log(df[["open", "close"]])
+        min_d = fstationary.get_min_d_FFD(df_log, precision=0.01)
+        for column, d in min_d.items():
+            assert(fstationary.get_adf_stats(df_log[column].to_numpy(), d)[1] <= 0.05)
+            assert(fstationary.get_adf_stats(df_log[column].to_numpy(), d - 0.01)[1] > 0.05)
+
+        # same d with the candidates evaluated by a process pool
+        assert(fstationary.get_min_d_FFD(df_log, precision=0.01, workers=2) == min_d)
+
+        # short series : the values of d whose window is too long aren't evaluated
+        df_short = df_log[["close"]].head(300)
+        with pytest.raises(ValueError):
+            fstationary.get_frac_diff_FFD(df_short.to_numpy()[:50], d=0.1)
+        d = fstationary.get_min_d_FFD(df_short, precision=0.01)["close"]
+        assert(d is not None and fstationary.get_width_FFD(d) < len(df_short))
+        assert(fstationary.get_adf_stats(df_short["close"].to_numpy(), d)[1] <= 0.05)
+
+    def test_stationary_transform(self):
+        df = self.get_real_dataframe()
+        df_stationary = fprocessfeature.process_features(df.copy(), ["stationary_transform"], {"stationary_precision": "0.05"})
+        assert(list(df_stationary.columns) == list(df.columns))
+        assert(df_stationary.index.equals(df.index[len(df) - len(df_stationary):]))
+        assert(not df_stationary.isnull().values.any())
+        assert(df_stationary["adj_close"].equals(df["adj_close"].iloc[len(df) - len(df_stationary):]))
+
+    def test_frac_diff(self):
+        df = self.get_real_dataframe()
+        df = np.log(df[["open", "close"]].head(1000).astype(float))
+        df.iloc[900, 1] = np.nan
+
+        # expanding window : all the weights of the series from the skip-th row
+        d, thres = 0.4, .01
+        w = fstationary.getWeights(d, len(df))
+        skip = fstationary.get_skip(df, d, thres)
+        df_fd = fstationary.trans_a_bunch_of_data(df, d=d, thres=thres)
+        assert(df_fd.index.equals(df.index[skip:]))
+        for column in df.columns:
+            expected = [np.dot(w[-(i + 1):, :].T, df[column].to_numpy()[:i + 1])[0] for i in range(skip, len(df))]
+            assert(np.allclose(df_fd[column].to_numpy(), expected, equal_nan=True))
+            series = fstationary.transfor_data_by_frac_diff(df[column], d=d, thres=thres)
+            assert(np.allclose(series.to_numpy(), expected, equal_nan=True))
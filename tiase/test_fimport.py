@@ -1,7 +1,8 @@
-from tiase.fimport import fimport,synthetic
+from tiase.fimport import fimport,synthetic,store,datasource
 import pandas as pd
 import numpy as np
 import os
+import shutil
 import pytest
 
 class TestFImport:
@@ -18,6 +19,62 @@ class TestFImport:
         df = fimport.get_dataframe_from_yahoo('AI.PA')
         assert(df.at["2000-01-03",'Close'] == pytest.approx(18.313592, 0.00001))
 
+    def test_store(self):
+        root = "./tmp/store"
+        tickers = store.import_from_csv_folder("./tiase/data/CAC40", root)
+        assert(len(tickers) == 40)
+        assert(store.Store(root).get_tickers() == tickers)
+
+        params = {"start": "2010-01-01", "end": "2010-12-31"}
+        df_expected = fimport.get_dataframe_from_csv("./tiase/data/CAC40/AI.PA.csv", params)
+        df = store.get_dataframe_from_store("AI.PA", params, root)
+        assert(df.equals(df_expected))
+
+        df = store.Store(root).read("AI.PA", columns=["Close"])
+        assert(list(df.columns) == ["Close"])
+        assert(df.shape[0] == fimport.get_dataframe_from_csv("./tiase/data/CAC40/AI.PA.csv").shape[0])
+
+        assert(store.get_dataframe_from_store("FOOBAR", params, root) is None)
+
+    def test_store_update(self):
+        root = "./tmp/store_update"
+        folder = "./tmp/store_update_source"
+        shutil.rmtree(root, ignore_errors=True)
+        os.makedirs(folder, exist_ok=True)
+        df_full = fimport.get_dataframe_from_csv("./tiase/data/CAC40/AI.PA.csv")
+        source = datasource.get_data_source("csv", {"folder": folder})
+        s = store.Store(root)
+
+        df_full.loc[:"2010-12-31"].to_csv(folder + "/AI.PA.csv")
+        assert(store.update("AI.PA", source, root) == "created")
+        assert(store.update("AI.PA", source, root) == "up to date")
+
+        df_full.to_csv(folder + "/AI.PA.csv")
+        assert(store.update("AI.PA", source, root) == "appended")
+        df = s.read("AI.PA")
+        assert(np.allclose(df.to_numpy(), df_full.to_numpy(), equal_nan=True))
+        assert(df.index.equals(pd.DatetimeIndex(df_full.index)))
+
+        # restatement of the history (split)
+        df_split = df_full.copy()
+        df_split[["Open", "High", "Low", "Close", "Adj Close"]] /= 2
+        df_split.to_csv(folder + "/AI.PA.csv")
+        assert(store.update("AI.PA", source, root) == "refreshed")
+        df = store.get_dataframe_from_store("AI.PA", {"start": "2010-01-01", "end": "2010-12-31"}, root, source)
+        assert(df["Close"].to_numpy() == pytest.approx(df_split.loc["2010-01-01":"2010-12-31", "Close"].to_numpy()))
+
+        assert(store.update("FOOBAR", source, root) is None)
+
+        # a source without the stored columns (adjusted prices without Adj Close) doesn't replace the stored data
+        df_adjusted = df_full[["Open", "High", "Low", "Close", "Volume"]].copy()
+        df_adjusted["Dividends"] = 0.
+        df_adjusted.to_csv(folder + "/AI.PA.csv")
+        with pytest.raises(ValueError):
+            store.update("AI.PA", source, root)
+        df = s.read("AI.PA")
+        assert(list(df.columns) == list(df_split.columns))
+        assert(np.allclose(df.to_numpy(), df_split.to_numpy(), equal_nan=True))
+
     def test_synthetic_data_constant(self):
         expected_data = [5.5, 5.5, 5.5, 5.5, 5.5]
         y = synthetic.get_constant(amplitude=5.5, length = 5)
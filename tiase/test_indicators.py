@@ -1,5 +1,5 @@
 from tiase.fimport import fimport
-from tiase.findicators import findicators
+from tiase.findicators import findicators,flabeling,registry,streaming,panel,vsa
 from tiase.fdatapreprocessing import fdataprep
 from . import alfred
 import pandas as pd
@@ -8,6 +8,8 @@ import numpy as np
 import pytest
 import os
 import datetime
+from stockstats import StockDataFrame as Sdf
+from finta import TA
 
 g_generate_references = False
 
@@ -76,6 +78,121 @@ class TestIndicators:
         equal = np.allclose(target, [1, 1, 0, 0, 1, 1, 1, 0, 0, 0, 0, 1, 1, np.nan], equal_nan=True)
         assert(equal)
 
+    def test_on_balance_volume(self):
+        data = {'close':[20, 21, 23, 23, 19, 24], 'volume':[5, 10, 20, 30, 40, 50]}
+        df = pd.DataFrame(data)
+        df = findicators.add_technical_indicators(df, ["on_balance_volume"])
+        # tally : 0, 10, 30, 30, -10, 40
+        equal = np.allclose(df.loc[:,'on_balance_volume'].values, np.log(np.array([10, 20, 40, 40, 0, 50]) + 1))
+        assert(equal)
+
+        # adj_close is used if present
+        df = pd.DataFrame(data)
+        df["adj_close"] = [20, 19, 23, 23, 19, 24]
+        df = findicators.add_technical_indicators(df, ["on_balance_volume"])
+        equal = np.allclose(df.loc[:,'on_balance_volume'].values, np.log(np.array([30, 20, 40, 40, 0, 50]) + 1))
+        assert(equal)
+
+        # without volume, the other indicators are computed
+        df = pd.DataFrame({'close':data['close']})
+        df = findicators.add_technical_indicators(df, ["on_balance_volume", "trend_1d", "sma_2"])
+        assert(list(df.columns) == ["close", "trend_1d", "sma_2"])
+
+    def test_registry(self):
+        # the intermediate nodes are computed once and each node is after its inputs
+        order, nodes = registry.get_graph(["macd", "macds", "macdh", "stoch_%k", "stoch_%d", "atr", "adx", "ema_12"])
+        assert(len(order) == len(set(order)))
+        for name in order:
+            if nodes[name]:
+                assert(all([order.index(node_input) < order.index(name) for node_input in nodes[name].inputs]))
+        assert(registry.get_outputs("bbands") == ["bb_upper", "bb_middle", "bb_lower"])
+        assert(registry.get_outputs("labeling") == None)
+
+        # same results as stockstats & finta
+        df = self.get_real_dataframe()
+        df = df.head(500)
+        stock = Sdf.retype(df.copy())
+        df = findicators.add_technical_indicators(df, ["macd", "macds", "macdh", "rsi_30", "cci_30", "dx_30", "williams_%r", "stoch_%k", "stoch_%d", "stc", "atr", "adx", "wma_10", "bbands"])
+        for column in ["macd", "macds", "macdh", "rsi_30", "cci_30", "dx_30"]:
+            assert(np.allclose(df[column].to_numpy(), stock.get(column).to_numpy(), equal_nan=True))
+        expected = {"williams_%r": TA.WILLIAMS(stock), "stoch_%k": TA.STOCH(stock), "stoch_%d": TA.STOCHD(stock), "stc": TA.STC(stock),
+                    "atr": TA.ATR(stock), "adx": TA.ADX(stock), "wma_10": TA.WMA(stock, period=10), "bb_upper": TA.BBANDS(stock)["BB_UPPER"]}
+        for column in expected:
+            assert(np.allclose(df[column].to_numpy(), expected[column].to_numpy(), equal_nan=True))
+
+    def test_float32(self):
+        technical_indicators = ["trend_1d", "macd", "bbands", "rsi_30", "atr", "adx", "on_balance_volume"]
+        df = self.get_real_dataframe()
+        df_float64 = findicators.add_technical_indicators(df.copy(), technical_indicators)
+        df_float32 = findicators.add_technical_indicators(df.copy(), technical_indicators, dtype=np.float32)
+        assert(list(df_float32.columns) == list(df_float64.columns))
+        assert(df_float32["trend_1d"].dtype == np.int64)
+        for column in ["macd", "bb_upper", "bb_middle", "bb_lower", "rsi_30", "atr", "adx", "on_balance_volume"]:
+            assert(df_float32[column].dtype == np.float32)
+            assert(np.allclose(df_float32[column].to_numpy(), df_float64[column].to_numpy(), rtol=1e-6, equal_nan=True))
+
+        # the outputs are written in the result of the panel
+        result, columns = panel.compute_panel({"close": df["close"].to_numpy()[:, None]}, ["trend_1d", "macd"], dtype=np.float32)
+        assert(result.dtype == np.float32 and columns == ["close", "trend_1d", "macd"])
+        assert(np.allclose(result[:, 2, 0], df_float64["macd"].to_numpy(), rtol=1e-6, equal_nan=True))
+
+    def test_streaming(self):
+        technical_indicators = ["sma_5", "ema_10", "wma_15", "macd", "macds", "macdh", "rsi_30", "atr", "adx", "stoch_%k", "stoch_%d", "williams_%r", "roc", "mom", "simple_rtn", "on_balance_volume"]
+        df = self.get_real_dataframe()
+        df = df.head(300)
+        df_batch = findicators.add_technical_indicators(df.copy(), technical_indicators)
+
+        engine = streaming.StreamingEngine(technical_indicators)
+        engine.warm_up("GOOG", df.head(150))
+
+        # the state is saved and reloaded in a new engine
+        os.makedirs("./tmp", exist_ok=True)
+        engine.save("./tmp/streaming_state.json")
+        engine = streaming.StreamingEngine([])
+        engine.load("./tmp/streaming_state.json")
+
+        for i, bar in enumerate(df.iloc[150:].to_dict('records')):
+            values = engine.update("GOOG", bar)
+            row = 150 + i
+            for indicator in technical_indicators:
+                if indicator == "on_balance_volume":
+                    continue
+                assert(np.isclose(values[indicator], df_batch[indicator].iloc[row], equal_nan=True))
+
+        # on_balance_volume depends on the minimum of the history : same value as the last row of the batch
+        df_batch = findicators.add_technical_indicators(df.copy(), ["on_balance_volume"])
+        assert(values["on_balance_volume"] == pytest.approx(df_batch["on_balance_volume"].iloc[-1]))
+
+    def test_panel(self):
+        technical_indicators = ["trend_1d", "macd", "macds", "macdh", "bbands", "rsi_30", "cci_30", "dx_30", "williams_%r", "stoch_%k", "stoch_%d", "er", "stc", "atr", "adx", "roc", "mom", "simple_rtn", "wma_5", "sma_5", "ema_10", "target"]
+        dfs = {}
+        for value in ["AI.PA", "BN.PA", "CA.PA"]:
+            dfs[value] = findicators.normalize_column_headings(fimport.get_dataframe_from_csv("./tiase/data/CAC40/" + value + ".csv").head(400))
+        # ragged start, ragged end, missing values
+        dfs["AI.PA"] = dfs["AI.PA"].iloc[50:]
+        dfs["BN.PA"] = dfs["BN.PA"].iloc[:-30]
+        dfs["CA.PA"].iloc[200:203] = np.nan
+        # different calendars : dates missing in one ticker only
+        dfs["BN.PA"] = dfs["BN.PA"].drop(dfs["BN.PA"].index[100:110])
+        dfs["CA.PA"] = dfs["CA.PA"].drop(dfs["CA.PA"].index[[150, 151, 300]])
+
+        df_wide = panel.add_technical_indicators_panel(dfs, technical_indicators)
+        df_long = panel.add_technical_indicators_panel(dfs, technical_indicators, output="long")
+
+        for value in dfs:
+            # same values as the dataframe of the value alone, on its own dates
+            df = dfs[value].copy()
+            valid = np.where(~np.isnan(df["close"].to_numpy()))[0]
+            df = df.iloc[valid[0]:valid[-1] + 1]
+            df = findicators.add_technical_indicators(df, technical_indicators)
+            assert(df_wide[("close", value)].drop(df.index).isna().all())
+
+            df_value = df_long.xs(value, level="ticker")
+            assert(len(df_value.index) == len(df.index))
+            for column in df_value.columns:
+                assert(np.allclose(df_wide[(column, value)].loc[df.index].to_numpy(), df[column].to_numpy(dtype=float), equal_nan=True))
+                assert(np.allclose(df_value[column].to_numpy(), df[column].to_numpy(dtype=float), equal_nan=True))
+
     def test_get_trend_ratio(self):
         data = {'close':[20, 21, 23, 19, 18, 24, 25, 26, 27, 28]}
         df = pd.DataFrame(data)
@@ -116,6 +233,21 @@ class TestIndicators:
             array_expected = expected_df[column].to_numpy()
             assert(np.allclose(array, array_expected))
 
+    def test_vsa_features(self):
+        df = self.get_real_dataframe()
+        df = df.head(200)
+        df_copy = df.copy()
+        df_vsa = vsa.create_bunch_of_vsa_features(df, [1, 5])
+        assert(df.equals(df_copy))
+        assert(list(df_vsa.columns) == ["close"] + vsa.get_vsa_columns(1) + vsa.get_vsa_columns(5))
+
+        # close of the windows : close on the rows with a full window
+        df_hlcv = vsa.create_hlcv(df, 5)
+        assert(np.isnan(df_hlcv["close_5D"].to_numpy()[:4]).all())
+        assert(np.array_equal(df_hlcv["close_5D"].to_numpy()[4:], df["close"].to_numpy()[4:]))
+        assert(np.allclose(df_hlcv["high_5D"].to_numpy(), df["high"].rolling(5).max().to_numpy(), equal_nan=True))
+        assert(np.allclose(df_vsa["vsa_close_change_5D"].to_numpy(), df_hlcv["close_5D"].pct_change(-5).to_numpy(), equal_nan=True))
+
     def labeling_common(self, dict_params, ref_csvfile, ref_barriers_csvfile):
         df = self.get_real_dataframe()
         df = df.head(150)
@@ -172,6 +304,48 @@ class TestIndicators:
         self.labeling_common(dict_params, ref_csvfile, ref_barriers_csvfile)
 
 
+    def test_labeling_first_touch(self):
+        values = np.array([10., 11., 9., 12., 8., 10.])
+        barriers = np.array([11.5, 13., 11.5, 11.5, 9.5, np.nan])
+
+        first_touch = flabeling.get_first_touch(values, barriers, 3, upward=True)
+        assert(np.array_equal(first_touch, [3, 3, 1, 0]))
+
+        first_touch = flabeling.get_first_touch(values, barriers, 3, upward=False)
+        assert(np.array_equal(first_touch, [0, 0, 0, 1]))
+
+    def test_labeling_floating(self):
+        index = pd.date_range("20210101", periods=6)
+        prices = pd.Series([10., 10.5, 10.2, 10.4, 11.5, 10.6], index=index)
+        daily_volatility = pd.Series([.1] * 6, index=index)
+        barriers = flabeling.get_3_barriers(prices, prices, prices, daily_volatility, 2, [1, 2])
+        barriers = flabeling.get_labels(barriers, 0, 1, 2, floating=True)
+
+        expected_out = [0.4, 0.9524, 2, np.nan, np.nan, np.nan]
+        assert(np.allclose(barriers['out'].to_numpy(), expected_out, atol=1e-4, equal_nan=True))
+
+    def test_labeling_balanced_search(self):
+        df = self.get_real_dataframe()
+        df = df.head(150)
+        daily_volatility = flabeling.get_daily_volatility_for_daily_data(df['close'])
+        prices = df['close'][daily_volatility.index]
+        highs = df['high'][daily_volatility.index]
+        lows = df['low'][daily_volatility.index]
+
+        upper_multiplier, report = flabeling.search_balanced_upper_multiplier(prices, highs, lows, daily_volatility, 10, 2., 2., 0, 0, 1, False)
+        assert(report['converged'])
+        assert(report['upper_multiplier'] == upper_multiplier)
+        assert(report['iterations'] == len(report['history']))
+
+        # each candidate is scored without relabeling : check the scores against a full labeling
+        for candidate, labels_sum in report['history']:
+            barriers = flabeling.get_3_barriers(prices, highs, lows, daily_volatility, 10, [candidate, 2.])
+            barriers = flabeling.get_labels(barriers, 0, 0, 1)
+            assert(barriers['out'].sum() == labels_sum)
+
+        upper_multiplier, report = flabeling.search_balanced_upper_multiplier(prices, highs, lows, daily_volatility, 10, 2., 2., 0, 0, 1, False, max_iterations=3)
+        assert(report['iterations'] <= 3)
+
     def test_labeling_with_alfred(self):
         alfred.execute("./tiase/data/test/findicators_alfred_data_labeling.xml")
         df_generated = fimport.get_dataframe_from_csv("./tmp/out.csv")
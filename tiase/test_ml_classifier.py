@@ -91,6 +91,18 @@ class TestMlClassifier:
         model = classifiers_factory.ClassifiersFactory.get_classifier("lstm1", {'epochs': 20})
         self._test_classifier_common(model, {"precision":0.992647, "recall":1., "f1_score":0.996309}, 0.00001)
 
+    def test_classifier_lstm1_lazy(self):
+        model = classifiers_factory.ClassifiersFactory.get_classifier("lstm1", {'epochs': 20})
+        ds = data_splitter.DataSplitterTrainTestSimple(self.get_dataframe(), target="target", seq_len=21)
+        ds.split(0.7, lazy=True)
+        model.fit(ds)
+        model_analysis = model.get_analysis()
+
+        assert(ds._X_train is None)
+        assert(model_analysis["test_size"] == len(ds.y_test))
+        assert(model_analysis["precision"] == pytest.approx(0.99, 0.05))
+        assert(model_analysis["recall"] == pytest.approx(0.99, 0.05))
+
     def test_classifier_lstm2(self):
         model = classifiers_factory.ClassifiersFactory.get_classifier("lstm2", {'epochs': 20})
         self._test_classifier_common(model, {"precision":1., "recall":0.985185, "f1_score":0.992537}, 0.00001)
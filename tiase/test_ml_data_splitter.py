@@ -80,6 +80,48 @@ class TestMlDataSplitter:
         y_test_expected = np.array([[0], [1]])
         np.testing.assert_allclose(ds.y_test, y_test_expected, 0.00001)     
 
+    def test_data_splitter_windows(self):
+        df = pd.DataFrame(np.random.RandomState(1).rand(50, 4), columns = ['A', 'B', 'C', 'target'])
+        df['target'] = (df['target'] > .5).astype(int)
+
+        for splitter, offset in [(data_splitter.DataSplitterTrainTestSimple, 1), (data_splitter.DataSplitterTrainTestWithLag, 0)]:
+            ds = splitter(df, target='target', seq_len=5)
+            ds.split(0.7)
+
+            # reference layout : for each window, the seq_len values of the first feature, then the second feature...
+            features = ds.train_normalised_features
+            n_windows = len(features) - 5 + offset
+            x_expected = np.array([np.concatenate([features[i:i+5, j] for j in range(3)]) for i in range(n_windows)])
+            y_expected = np.array([[df['target'][i + 5 - offset]] for i in range(n_windows)])
+            np.testing.assert_array_equal(ds.X_train, x_expected)
+            np.testing.assert_array_equal(ds.y_train, y_expected)
+
+            assert(ds.X_train_3d.shape == (n_windows, 5, 3))
+            assert(np.shares_memory(ds.X_train_3d, ds.train_normalised_features))
+            np.testing.assert_array_equal(data_splitter.flatten_windows(ds.X_train_3d), ds.X_train)
+            np.testing.assert_array_equal(data_splitter.flatten_windows(ds.X_test_3d), ds.X_test)
+
+    def test_data_splitter_lazy(self):
+        df = pd.DataFrame(np.random.RandomState(1).rand(50, 4), columns = ['A', 'B', 'C', 'target'])
+        df['target'] = (df['target'] > .5).astype(int)
+        ds_expected = data_splitter.DataSplitterTrainTestSimple(df, target='target', seq_len=5)
+        ds_expected.split(0.7)
+
+        ds = data_splitter.DataSplitterTrainTestSimple(df, target='target', seq_len=5)
+        ds.split(0.7, lazy=True)
+        assert(ds._X_train is None and ds._X_test is None)
+        np.testing.assert_array_equal(ds.y_train, ds_expected.y_train)
+
+        batches = ds.get_train_batches(batch_size=8)
+        assert(len(batches) == 4)
+        np.testing.assert_array_equal(np.concatenate([batches[i][0] for i in range(len(batches))]), ds_expected.X_train)
+        np.testing.assert_array_equal(np.concatenate([batches[i][1] for i in range(len(batches))]), ds_expected.y_train)
+        assert(batches[3][0].shape == (7, 15))
+
+        # the in-memory arrays are built when they are read
+        np.testing.assert_array_equal(ds.X_test, ds_expected.X_test)
+        assert(ds._X_test is not None and ds._X_train is None)
+
     def test_data_splitter_export(self):
         df = self.get_dataframe()
         ds = data_splitter.DataSplitterTrainTestSimple(df, target='target', seq_len=3)
@@ -171,3 +213,27 @@ class TestMlDataSplitter:
         print(list_df_training)
         print("list_df_testing")
         print(list_df_testing)
+
+    def test_data_splitter_for_cross_validation_folds(self):
+        df = pd.DataFrame(np.random.RandomState(2).rand(200, 4), columns = ['A', 'B', 'C', 'target'])
+        df['target'] = (df['target'] > .5).astype(int)
+
+        ds = data_splitter.DataSplitterForCrossValidation(df, nb_splits=6, max_train_size=80, test_size=20)
+        list_df_training, list_df_testing = ds.split()
+        folds = list(ds.get_fold_data_splitters(seq_len=5, target='target'))
+        assert(len(folds) == 6)
+        for df_training, df_testing, ds_fold in zip(list_df_training, list_df_testing, folds):
+            # same data as a simple data splitter on the rows of the fold
+            ds_expected = data_splitter.DataSplitterTrainTestSimple(pd.concat([df_training, df_testing]), target='target', seq_len=5)
+            ds_expected.split(len(df_training))
+            np.testing.assert_allclose(ds_fold.X_train, ds_expected.X_train, 1e-12)
+            np.testing.assert_array_equal(ds_fold.y_train, ds_expected.y_train)
+            np.testing.assert_allclose(ds_fold.X_test, ds_expected.X_test, 1e-12)
+            np.testing.assert_array_equal(ds_fold.y_test, ds_expected.y_test)
+        assert(list(df.columns) == ['A', 'B', 'C', 'target'])
+
+        # purge between the training and the test sets
+        ds = data_splitter.DataSplitterForCrossValidation(df, nb_splits=6, max_train_size=80, test_size=20, gap=10)
+        for train, test in ds.get_folds():
+            assert(test.start - train.stop == 10)
+            assert(train.stop - train.start <= 80)
@@ -1,3 +1,3 @@
-__all__ = ["export_csv","export_mail","export_pdf"]
+__all__ = ["export_csv","export_mail","export_pdf","cache"]
 __version__ = '0.1'
 __author__ = 'cedfactory'
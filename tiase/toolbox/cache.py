@@ -0,0 +1,138 @@
+"""
+On-disk cache for the results of the pipeline stages
+the key of a stage is a hash of its inputs (dataframe, xml node, key of the previous stage, ...) and of the code
+computing it (sources of the tiase package, versions of python and of the libraries) : the results of a previous
+version of the code are not reused
+the least recently used entries are removed when the size of the cache exceeds max_size
+"""
+import os
+import sys
+import glob
+import hashlib
+import functools
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+import xml.etree.cElementTree as ET
+
+default_root = "./tmp/cache"
+default_max_size = 1024 # MB
+
+@functools.lru_cache(maxsize=None)
+def get_code_fingerprint():
+    '''
+    hash of the sources of the tiase package (the tests excepted) and of the versions of python, numpy, pandas
+    and scikit-learn
+    '''
+    fingerprint = hashlib.sha1()
+    fingerprint.update(" ".join([sys.version, np.__version__, pd.__version__, sklearn.__version__]).encode())
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for root, dirs, files in os.walk(package_root):
+        dirs[:] = sorted([directory for directory in dirs if directory not in ["data", "__pycache__"]])
+        for filename in sorted(files):
+            if filename.endswith(".py") and not filename.startswith("test_"):
+                path = os.path.join(root, filename)
+                fingerprint.update(os.path.relpath(path, package_root).encode())
+                with open(path, "rb") as f:
+                    fingerprint.update(f.read())
+    return fingerprint.hexdigest()
+
+class StageCache:
+
+    def __init__(self, root=default_root, max_size=default_max_size, enabled=True):
+        '''
+        max_size: size of the cache in MB
+        '''
+        self.root = root
+        self.max_size = max_size
+        self.enabled = enabled
+        self.version = get_code_fingerprint() if enabled else None
+
+    def get_key(self, *items):
+        if not self.enabled:
+            return None
+        key = hashlib.sha1()
+        key.update(self.version.encode())
+        key.update(b'|')
+        for item in items:
+            if isinstance(item, pd.DataFrame):
+                key.update(str(list(item.columns)).encode())
+                key.update(str(list(item.dtypes)).encode())
+                key.update(pd.util.hash_pandas_object(item, index=True).values.tobytes())
+            elif isinstance(item, ET.Element):
+                key.update(ET.tostring(item))
+            elif isinstance(item, bytes):
+                key.update(item)
+            else:
+                key.update(str(item).encode())
+            key.update(b'|')
+        return key.hexdigest()
+
+    def get_filename(self, key):
+        return os.path.join(self.root, key + ".joblib")
+
+    def get(self, key):
+        '''
+        return (True, value) if key is in the cache, (False, None) otherwise
+        '''
+        if not self.enabled:
+            return False, None
+        filename = self.get_filename(key)
+        if not os.path.isfile(filename):
+            return False, None
+        try:
+            value = joblib.load(filename)
+        except (OSError, EOFError, ValueError):
+            return False, None
+        # the modification time gives the last use for the eviction
+        try:
+            os.utime(filename)
+        except FileNotFoundError:
+            # evicted by another worker since the load
+            pass
+        return True, value
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        filename = self.get_filename(key)
+        tmp_filename = "{}.{}.tmp".format(filename, os.getpid())
+        joblib.dump(value, tmp_filename)
+        os.replace(tmp_filename, filename)
+        self.evict()
+
+    def run(self, key, compute):
+        '''
+        return the cached value for key or compute it and cache it
+        '''
+        found, value = self.get(key)
+        if found:
+            return value
+        value = compute()
+        self.set(key, value)
+        return value
+
+    def evict(self):
+        entries = []
+        for filename in glob.glob(os.path.join(self.root, "*.joblib")):
+            try:
+                stat = os.stat(filename)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filename))
+
+        size = sum([entry[1] for entry in entries])
+        for _, entry_size, filename in sorted(entries):
+            if size <= self.max_size * 1024 * 1024:
+                break
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+    def clear(self):
+        for filename in glob.glob(os.path.join(self.root, "*.joblib")):
+            os.remove(filename)